@@ -17,19 +17,38 @@ from neutron.common import rpc as n_rpc
 
 import oslo_messaging as messaging
 
+from networking_l2gw.services.l2gateway.common import ovsdb_payload
+
 
 class L2GatewayAgentApi(object):
     """Agent side of the Agent to Plugin RPC API."""
 
     API_VERSION = '1.0'
+    # 1.1 - update_ovsdb_changes accepts the compact payload of
+    #       ovsdb_payload.encode, the modified ports without their vlan
+    #       bindings when these did not change and the physical switches
+    #       without a tunnel ip.
+    COMPACT_PAYLOAD_VERSION = '1.1'
 
-    def __init__(self, topic, host):
+    def __init__(self, topic, host, compact_payload=False):
         self.host = host
+        self.compact_payload = compact_payload
         target = messaging.Target(topic=topic, version=self.API_VERSION)
         self.client = n_rpc.get_client(target)
 
+    def can_send_compact_payload(self):
+        """Whether the plugin is sent the payload of version 1.1."""
+        return bool(self.compact_payload and self.client.can_send_version(
+            self.COMPACT_PAYLOAD_VERSION))
+
     def update_ovsdb_changes(self, context, activity, ovsdb_data):
-        cctxt = self.client.prepare()
+        # The compact payload is only understood by the plugins which
+        # implement 1.1, the others are sent the dictionary of rows.
+        if self.can_send_compact_payload():
+            cctxt = self.client.prepare(version=self.COMPACT_PAYLOAD_VERSION)
+            ovsdb_data = ovsdb_payload.encode(ovsdb_data)
+        else:
+            cctxt = self.client.prepare()
         return cctxt.cast(context,
                           'update_ovsdb_changes',
                           activity=activity,
@@ -12,6 +12,10 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import copy
+
+import six
+
 from networking_l2gw.services.l2gateway.common import constants as n_const
 
 OVSDB_IP = 'ovsdb_ip'
@@ -20,6 +24,14 @@ PRIVATE_KEY = 'private_key'
 USE_SSL = 'use_ssl'
 CERTIFICATE = 'certificate'
 CA_CERT = 'ca_cert'
+UNIX_SOCKET_PREFIX = 'unix:'
+
+
+def unix_socket_path(ovsdb_ip):
+    """Returns the path of a unix:/path address, None for other ones."""
+    if (isinstance(ovsdb_ip, six.string_types) and
+            ovsdb_ip.startswith(UNIX_SOCKET_PREFIX)):
+        return ovsdb_ip[len(UNIX_SOCKET_PREFIX):]
 
 
 class L2GatewayConfig(object):
@@ -35,3 +47,24 @@ class L2GatewayConfig(object):
         self.ovsdb_ip = ovsdb_config[OVSDB_IP]
         self.ovsdb_port = ovsdb_config[OVSDB_PORT]
         self.ovsdb_fd = None
+        # Members of a clustered OVSDB server, the first one is ovsdb_ip.
+        self.endpoints = [(self.ovsdb_ip, self.ovsdb_port)]
+        # Index of the member last known to be the leader, and count of
+        # the leadership changes seen.
+        self.leader = None
+        self.leader_epoch = 0
+        # Rows monitored on the OVSDB server, kept across the connections.
+        self.monitored_rows = {}
+
+    def add_endpoint(self, ovsdb_ip, ovsdb_port):
+        """Adds a member of the clustered OVSDB server."""
+        self.endpoints.append((ovsdb_ip, ovsdb_port))
+
+    def member(self, index):
+        """Returns the configuration of a member of the OVSDB server."""
+        member = copy.copy(self)
+        member.ovsdb_ip, member.ovsdb_port = self.endpoints[index]
+        # Local unix sockets are not encrypted.
+        member.use_ssl = (self.use_ssl and
+                          unix_socket_path(member.ovsdb_ip) is None)
+        return member
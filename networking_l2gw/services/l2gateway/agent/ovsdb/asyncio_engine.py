@@ -0,0 +1,547 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import random
+import socket
+import sys
+
+import eventlet
+from eventlet import event
+from eventlet import hubs
+from eventlet import patcher
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import excutils
+
+from networking_l2gw._i18n import _LE, _LW
+from networking_l2gw.services.l2gateway.agent import l2gateway_config
+from networking_l2gw.services.l2gateway.agent.ovsdb import base_connection
+from networking_l2gw.services.l2gateway.agent.ovsdb import cluster
+from networking_l2gw.services.l2gateway.agent.ovsdb import connection_state
+from networking_l2gw.services.l2gateway.agent.ovsdb import framer
+from networking_l2gw.services.l2gateway.agent.ovsdb import inactivity
+from networking_l2gw.services.l2gateway.agent.ovsdb import (
+    ovsdb_common_class)
+from networking_l2gw.services.l2gateway import exceptions
+
+try:
+    import asyncio
+except ImportError:
+    # Python 2
+    asyncio = None
+
+LOG = logging.getLogger(__name__)
+
+# The event loop runs in a native thread, which must not use the modules
+# monkey patched by eventlet.
+_socket = patcher.original('socket')
+_threading = patcher.original('threading')
+
+
+def _original_selectors():
+    # patcher.original would import selectors with the patched select
+    # module, which offers no epoll.
+    saver = patcher.SysModulesSaver(('select', 'selectors'))
+    sys.modules.pop('selectors', None)
+    sys.modules['select'] = patcher.original('select')
+    try:
+        return __import__('selectors')
+    finally:
+        saver.restore()
+
+
+if asyncio is not None:
+    _selectors = _original_selectors()
+    _Protocol = asyncio.Protocol
+else:
+    _Protocol = object
+
+
+def is_supported():
+    return asyncio is not None
+
+
+def _copy_outcome(source, target):
+    """Fails target with the exception or the cancellation of source."""
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    else:
+        target.set_exception(source.exception())
+
+
+def open_connection(loop, protocol_factory, family, address,
+                    ssl_context=None, server_hostname=None, setup=None):
+    """Connects to address and runs the protocol on the connection.
+
+       Must be called from loop. Returns a future of the protocol, which
+       can be cancelled to abort the connection. setup, when given, is
+       called with the socket before it is connected.
+    """
+    sock = _socket.socket(family, _socket.SOCK_STREAM)
+    sock.setblocking(False)
+    if setup is not None:
+        setup(sock)
+    result = asyncio.Future(loop=loop)
+
+    def on_created(task):
+        if task.cancelled() or task.exception() is not None:
+            sock.close()
+            _copy_outcome(task, result)
+            return
+        transport, protocol = task.result()
+        if result.done():
+            transport.close()
+            return
+        result.set_result(protocol)
+
+    def on_connected(task):
+        if task.cancelled() or task.exception() is not None:
+            sock.close()
+            _copy_outcome(task, result)
+            return
+        if result.done():
+            sock.close()
+            return
+        creating = loop.create_task(loop.create_connection(
+            protocol_factory, sock=sock, ssl=ssl_context,
+            server_hostname=server_hostname))
+        creating.add_done_callback(on_created)
+
+    connecting = loop.create_task(loop.sock_connect(sock, address))
+    connecting.add_done_callback(on_connected)
+    result.add_done_callback(
+        lambda future: future.cancelled() and connecting.cancel())
+    return result
+
+
+class OVSDBProtocol(_Protocol):
+    """Speaks OVSDB JSON-RPC on a connection of an asyncio event loop.
+
+       The reply to a request sent with request is delivered to the
+       future it returns. The echo requests of the OVSDB server are
+       answered at once, and the other messages, the updates of the
+       monitors, are handed to on_notifications in the order they were
+       received. on_close is called once the connection is closed.
+
+       The connection is probed with an echo request once it has been
+       idle for probe_interval seconds, and closed after
+       max_missed_probes unanswered probes. With a probe_interval of 0,
+       it is closed once it has been idle for idle_timeout seconds, if
+       not 0.
+    """
+    def __init__(self, loop, on_notifications, on_close, probe_interval=0,
+                 max_missed_probes=0, idle_timeout=0,
+                 buffer_size=framer.BUFFER_SIZE):
+        self.loop = loop
+        self.on_notifications = on_notifications
+        self.on_close = on_close
+        self.probe_interval = probe_interval
+        self.max_missed_probes = max_missed_probes
+        self.idle_timeout = idle_timeout
+        self.framer = framer.MessageFramer(buffer_size=buffer_size)
+        self.transport = None
+        self.stats = collections.Counter()
+        # Futures of the requests waiting for their reply, by request id.
+        self._futures = {}
+        self._paused = False
+        self._last_received = loop.time()
+        self._missed_probes = 0
+        self._timer = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._last_received = self.loop.time()
+        self._schedule_check(self.probe_interval or self.idle_timeout)
+
+    def connection_lost(self, exc):
+        self.transport = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        futures, self._futures = self._futures, {}
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(exceptions.OVSDBError(
+                    message="Connection to the OVSDB server was closed"))
+        # After the notifications received before.
+        self.loop.call_soon(self.on_close)
+
+    def data_received(self, data):
+        self._last_received = self.loop.time()
+        self._missed_probes = 0
+        self.stats['bytes_received'] += len(data)
+        try:
+            messages = self.framer.feed(data)
+        except exceptions.OVSDBError as ex:
+            LOG.error(_LE("Closing the connection to the OVSDB server: "
+                          "%s"), ex)
+            self.transport.abort()
+            return
+        notifications = []
+        for message in messages:
+            method = message.get('method')
+            if method == 'echo':
+                self.write({"result": message.get("params", None),
+                            "error": None, "id": message.get('id')})
+            elif method is not None:
+                notifications.append(message)
+            else:
+                if notifications:
+                    # The callbacks of the futures are scheduled, the
+                    # notifications are scheduled too to keep the order.
+                    self.loop.call_soon(self.on_notifications,
+                                        notifications)
+                    notifications = []
+                self._complete(message)
+        if notifications:
+            self.loop.call_soon(self.on_notifications, notifications)
+
+    def write(self, message):
+        """Sends message, returns False if the connection is closed."""
+        if self.transport is None:
+            return False
+        data = jsonutils.dump_as_bytes(message)
+        self.transport.write(data)
+        self.stats['bytes_sent'] += len(data)
+        return True
+
+    def request(self, message, timeout=None):
+        """Sends the request message and returns the future of its reply.
+
+           The future fails with OVSDBError if the reply does not arrive
+           within timeout seconds, or if the connection is closed.
+        """
+        future = asyncio.Future(loop=self.loop)
+        if self.transport is None:
+            future.set_exception(exceptions.OVSDBError(
+                message="Not connected to the OVSDB server"))
+            return future
+        operation_id = message['id']
+        self._futures[operation_id] = future
+        if timeout:
+            expiry = self.loop.call_later(timeout, self._expire,
+                                          operation_id, timeout)
+            future.add_done_callback(lambda _future: expiry.cancel())
+        self.write(message)
+        return future
+
+    def pause_reading(self):
+        if self.transport is not None and not self._paused:
+            self._paused = True
+            self.transport.pause_reading()
+
+    def resume_reading(self):
+        if self.transport is not None and self._paused:
+            self._paused = False
+            self._last_received = self.loop.time()
+            self.transport.resume_reading()
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    def _complete(self, message):
+        future = self._futures.pop(message.get('id'), None)
+        if future is None:
+            if message.get('id') != inactivity.PROBE_ID:
+                # Either nobody asked for it or the request has expired.
+                self.stats['unmatched_responses'] += 1
+            return
+        if not future.done():
+            future.set_result(message)
+
+    def _expire(self, operation_id, timeout):
+        future = self._futures.pop(operation_id, None)
+        if future is not None and not future.done():
+            self.stats['expired_requests'] += 1
+            future.set_exception(exceptions.OVSDBError(
+                message="OVSDB server did not respond within %s "
+                "seconds." % timeout))
+
+    def _schedule_check(self, delay):
+        if delay > 0:
+            self._timer = self.loop.call_later(delay, self._check_idle)
+
+    def _check_idle(self):
+        self._timer = None
+        if self.transport is None:
+            return
+        if self._paused:
+            # The messages of the server are not read.
+            self._last_received = self.loop.time()
+        limit = self.probe_interval or self.idle_timeout
+        idle = self.loop.time() - self._last_received
+        if idle < limit:
+            self._schedule_check(limit - idle)
+            return
+        if (not self.probe_interval or
+                self._missed_probes >= self.max_missed_probes):
+            LOG.warning(_LW("OVSDB server has been silent for %d seconds, "
+                            "closing the connection"), idle)
+            self.transport.abort()
+            return
+        self._missed_probes += 1
+        self.write({"method": "echo", "params": [],
+                    "id": inactivity.PROBE_ID})
+        self._schedule_check(self.probe_interval)
+
+
+class GreenBridge(object):
+    """Runs callables in the eventlet hub on behalf of another thread.
+
+       call may be used from any thread. The callables are run in the
+       order they were passed, by a single greenthread which is woken up
+       through a socket pair, so they must not block.
+    """
+    def __init__(self):
+        self._calls = collections.deque()
+        self._rsock, self._wsock = _socket.socketpair()
+        self._rsock.setblocking(False)
+        self._wsock.setblocking(False)
+        # Obsoletes the greenthreads still waiting on a closed socket
+        # whose file descriptor is reused, as green sockets do.
+        hubs.notify_opened(self._rsock.fileno())
+        self._pump = eventlet.spawn(self._run)
+
+    def call(self, func, *args):
+        self._calls.append((func, args))
+        try:
+            self._wsock.send(b'x')
+        except socket.error:
+            # The socket buffer is full, the pump is awake anyway.
+            pass
+
+    def _run(self):
+        while True:
+            hubs.trampoline(self._rsock.fileno(), read=True)
+            try:
+                self._rsock.recv(4096)
+            except socket.error:
+                pass
+            while self._calls:
+                func, args = self._calls.popleft()
+                try:
+                    func(*args)
+                except Exception as ex:
+                    LOG.exception(_LE("Exception [%s] while handling an "
+                                      "OVSDB event"), ex)
+
+
+class EventLoopThread(object):
+    """Runs an asyncio event loop in a native thread.
+
+       The greenthreads hand work over to the loop with call and run, and
+       the loop hands the results back to them through bridge.
+    """
+    def __init__(self):
+        self.loop = None
+        self.bridge = None
+
+    def start(self):
+        if self.loop is not None:
+            return
+        self.bridge = GreenBridge()
+        loop = asyncio.SelectorEventLoop(_selectors.DefaultSelector())
+        thread = _threading.Thread(target=self._run, args=(loop,),
+                                   name='ovsdb-asyncio')
+        thread.daemon = True
+        thread.start()
+        self.loop = loop
+
+    def _run(self, loop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def call(self, func, *args):
+        """Has the event loop run func(*args), does not wait for it."""
+        self.loop.call_soon_threadsafe(func, *args)
+
+    def run(self, func, timeout, *args):
+        """Returns the result of the future returned by func(*args).
+
+           func is called from the event loop, and the current greenthread
+           waits up to timeout seconds for the future, which is cancelled
+           if it does not complete in time. The exception of the future is
+           raised, OVSDBError if it was cancelled.
+        """
+        done = event.Event()
+        futures = []
+
+        def start():
+            try:
+                future = func(*args)
+            except Exception as ex:
+                self.bridge.call(done.send_exception, ex)
+                return
+            futures.append(future)
+            future.add_done_callback(
+                lambda future: self._settle(done, future))
+
+        self.call(start)
+        with eventlet.Timeout(timeout, False):
+            return done.wait()
+        self.call(lambda: futures and futures[0].cancel())
+        raise exceptions.OVSDBError(
+            message="Timed out after %s seconds" % timeout)
+
+    def _settle(self, done, future):
+        if future.cancelled():
+            self.bridge.call(done.send_exception, exceptions.OVSDBError(
+                message="Cancelled"))
+        elif future.exception() is not None:
+            self.bridge.call(done.send_exception, future.exception())
+        else:
+            self.bridge.call(done.send, future.result())
+
+
+class AsyncioOVSDBSession(ovsdb_common_class.OVSDB_commom_class):
+    """Monitors an OVSDB server and transacts on the same session.
+
+       The connection is served by an OVSDBProtocol, in the event loop
+       shared by all the sessions, instead of by greenthreads. Requests
+       are handed to the loop, and the replies and the updates are handed
+       back to the greenthreads, so the rest of the agent is unchanged:
+       the updates are processed in order by the dispatcher, which pauses
+       the reads of the connection while too many of them wait, and up to
+       transact_window transactions are outstanding at once.
+    """
+    engine = EventLoopThread()
+
+    def _open_endpoint(self, gw_config, max_retries):
+        self.engine.start()
+        self._protocol = None
+        self._reads_paused = False
+        ssl_context = None
+        server_hostname = None
+        setup = None
+        path = l2gateway_config.unix_socket_path(gw_config.ovsdb_ip)
+        if path is not None:
+            family, address = socket.AF_UNIX, path
+            if gw_config.use_ssl:
+                server_hostname = ''
+        else:
+            family, _type, _proto, _name, address = socket.getaddrinfo(
+                str(gw_config.ovsdb_ip), int(gw_config.ovsdb_port), 0,
+                socket.SOCK_STREAM)[0]
+            if gw_config.use_ssl:
+                server_hostname = str(gw_config.ovsdb_ip)
+            setup = self._set_keepalive
+        if gw_config.use_ssl:
+            ssl_context = self.ssl_contexts.get_context(
+                gw_config.ovsdb_identifier, gw_config.private_key,
+                gw_config.certificate, gw_config.ca_cert)
+        retry_count = 0
+        while True:
+            try:
+                self._protocol = self.engine.run(
+                    open_connection, cfg.CONF.ovsdb.connect_timeout,
+                    self.engine.loop, self._create_protocol, family,
+                    address, ssl_context, server_hostname, setup)
+                return
+            except (socket.error, exceptions.OVSDBError):
+                LOG.warning(base_connection.OVSDB_UNREACHABLE_MSG,
+                            gw_config.ovsdb_ip)
+                if retry_count >= max_retries:
+                    with excutils.save_and_reraise_exception(reraise=True):
+                        LOG.exception(_LE("Socket error in connecting to "
+                                          "the OVSDB server"))
+            eventlet.greenthread.sleep(connection_state.backoff_delay(
+                retry_count, cfg.CONF.ovsdb.connection_backoff_initial,
+                cfg.CONF.ovsdb.connection_backoff_max))
+            retry_count += 1
+
+    def _server_role(self):
+        op_id = str(random.getrandbits(128))
+        reply = self.engine.run(
+            self._protocol.request, self.response_timeout,
+            cluster.server_monitor_request(op_id), self.response_timeout)
+        return self._reply_role(reply)
+
+    def _create_protocol(self):
+        return OVSDBProtocol(
+            self.engine.loop, self._on_notifications, self._on_closed,
+            cfg.CONF.ovsdb.inactivity_probe_interval,
+            cfg.CONF.ovsdb.max_missed_probes, cfg.CONF.ovsdb.socket_timeout,
+            cfg.CONF.ovsdb.recv_buffer_size)
+
+    def _close(self):
+        protocol, self._protocol = self._protocol, None
+        if protocol is not None:
+            self.engine.call(protocol.close)
+
+    def _rcv_thread(self):
+        # The connection is read by the event loop.
+        pass
+
+    def _start_probing(self, addr=None):
+        # The connection is probed by the protocol.
+        pass
+
+    def send(self, message, callback=None, addr=None):
+        """Sends a message to the OVSDB server."""
+        protocol = self._protocol
+        if not self.connected or protocol is None:
+            LOG.warning(_LW("Could not send message to the "
+                            "OVSDB server."))
+            return False
+        if callback:
+            self.callbacks[message['id']] = callback
+        if message.get('id') in self.requests:
+            self.engine.call(self._request, protocol, message)
+        else:
+            self.engine.call(protocol.write, message)
+        return True
+
+    def _request(self, protocol, message):
+        # Runs in the event loop.
+        future = protocol.request(message, self.response_timeout)
+        future.add_done_callback(self._on_reply)
+
+    def _on_reply(self, future):
+        # Runs in the event loop. The requests which failed are failed in
+        # the greenthreads by the response timeout or by disconnect.
+        if not future.cancelled() and future.exception() is None:
+            self.engine.bridge.call(self._complete_request, future.result())
+
+    def _on_notifications(self, messages):
+        # Runs in the event loop.
+        self.engine.bridge.call(self._deliver, messages)
+
+    def _on_closed(self):
+        # Runs in the event loop.
+        self.engine.bridge.call(self._closed)
+
+    def _deliver(self, messages):
+        if not self.connected:
+            return
+        self.dispatcher.dispatch(None, messages)
+        if self.dispatcher.is_full(None) and not self._reads_paused:
+            self._reads_paused = True
+            protocol = self._protocol
+            self.engine.call(protocol.pause_reading)
+            eventlet.spawn_n(self._resume_reading, protocol)
+
+    def _resume_reading(self, protocol):
+        self.dispatcher.wait_for_room(None)
+        self._reads_paused = False
+        self.engine.call(protocol.resume_reading)
+
+    def _closed(self):
+        if self.connected:
+            self.disconnect()
@@ -13,37 +13,93 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import copy
+import collections
+import contextlib
 import os.path
+import random
 import socket
-import ssl
-import time
 
 import eventlet
+from eventlet import event
+from eventlet import semaphore
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import excutils
 
-from networking_l2gw._i18n import _LE, _LW
+from networking_l2gw._i18n import _LE, _LI, _LW
+from networking_l2gw.services.l2gateway.agent import l2gateway_config
+from networking_l2gw.services.l2gateway.agent.ovsdb import cluster
+from networking_l2gw.services.l2gateway.agent.ovsdb import connection_state
+from networking_l2gw.services.l2gateway.agent.ovsdb import dispatcher
+from networking_l2gw.services.l2gateway.agent.ovsdb import framer
+from networking_l2gw.services.l2gateway.agent.ovsdb import handshake
+from networking_l2gw.services.l2gateway.agent.ovsdb import inactivity
+from networking_l2gw.services.l2gateway.agent.ovsdb import multiplexer
+from networking_l2gw.services.l2gateway.agent.ovsdb import ssl_context
 from networking_l2gw.services.l2gateway.common import constants as n_const
+from networking_l2gw.services.l2gateway import exceptions
 
 LOG = logging.getLogger(__name__)
 OVSDB_UNREACHABLE_MSG = _LW('Unable to reach OVSDB server %s')
 OVSDB_CONNECTED_MSG = 'Connected to OVSDB server %s'
 
 
+class _Batch(object):
+    """Encoded messages written together to a connection."""
+
+    def __init__(self):
+        self.data = []
+        self.sent = False
+
+
 class BaseConnection(object):
     """Connects to OVSDB server.
 
        Connects to an ovsdb server with/without SSL
        on a given host and TCP port.
     """
-    def __init__(self, conf, gw_config, mgr=None):
-        self.responses = []
+    # Shared by all the connections, so that the SSL contexts are loaded
+    # once and TLS sessions are resumed across connections.
+    ssl_contexts = ssl_context.SSLContextCache()
+    # Shared by all the connections, so that a single greenthread runs the
+    # inactivity probes of every OVSDB server.
+    timer_wheel = inactivity.TimerWheel()
+
+    def __init__(self, conf, gw_config, mgr=None, connect_retries=None):
+        # Outstanding requests keyed by request id. Each entry holds the
+        # address the request was sent to and the event its reply is
+        # delivered to.
+        self.requests = {}
+        self.response_timeout = cfg.CONF.ovsdb.response_timeout
+        self.stats = collections.Counter()
+        self.framers = {}
         self.connected = False
         self.mgr = mgr
+        # Serializes the messages sent on each connection, which may be
+        # shared by several greenthreads. The messages sent while the
+        # connection is being written to are queued in a batch, written
+        # at once by the next greenthread which gets the lock.
+        self._send_locks = collections.defaultdict(semaphore.Semaphore)
+        self._outgoing = {}
         self.enable_manager = cfg.CONF.ovsdb.enable_manager
+        # Member of a clustered OVSDB server the session is connected to,
+        # with its role and the leader epoch it was last seen in.
+        self.endpoint = None
+        self.cluster_role = None
+        self.leader_epoch = None
+        # The messages received in manager mode come from many OVSDB
+        # servers, and are processed by several workers.
+        self.dispatcher = dispatcher.Dispatcher(
+            self, cfg.CONF.ovsdb.manager_worker_pool_size
+            if self.enable_manager else 1,
+            cfg.CONF.ovsdb.dispatch_queue_size)
+        self.probes = None
+        if cfg.CONF.ovsdb.inactivity_probe_interval > 0:
+            self.probes = inactivity.InactivityProbes(
+                self.timer_wheel, cfg.CONF.ovsdb.inactivity_probe_interval,
+                cfg.CONF.ovsdb.max_missed_probes, self._send_probe,
+                self._on_inactive, self.dispatcher.queue_depth)
         if self.enable_manager:
             self.manager_table_listening_port = (
                 cfg.CONF.ovsdb.manager_table_listening_port)
@@ -53,44 +109,264 @@ class BaseConnection(object):
             self.check_sock_rcv = False
             self.ovsdb_dicts = {}
             self.ovsdb_fd_states = {}
-            self.ovsdb_conn_list = []
+            # Addresses of the OVSDB servers which answered the first echo.
+            self.ovsdb_conn_list = set()
+            self.multiplexer = None
+            self.handshakes = handshake.Handshakes(
+                self.timer_wheel, cfg.CONF.ovsdb.max_concurrent_handshakes,
+                cfg.CONF.ovsdb.handshake_timeout, self._on_handshake_expired)
             eventlet.greenthread.spawn(self._rcv_socket)
         else:
             self.gw_config = gw_config
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            if gw_config.use_ssl:
-                ssl_sock = ssl.wrap_socket(
-                    self.socket,
-                    server_side=False,
-                    keyfile=gw_config.private_key,
-                    certfile=gw_config.certificate,
-                    cert_reqs=ssl.CERT_REQUIRED,
-                    ssl_version=ssl.PROTOCOL_TLSv1,
-                    ca_certs=gw_config.ca_cert)
-                self.socket = ssl_sock
-            retryCount = 0
-            while True:
-                try:
-                    self.socket.connect((str(gw_config.ovsdb_ip),
-                                         int(gw_config.ovsdb_port)))
-                    break
-                except (socket.error, socket.timeout):
-                    LOG.warning(OVSDB_UNREACHABLE_MSG, gw_config.ovsdb_ip)
-                    if retryCount == conf.max_connection_retries:
-                        # Retried for max_connection_retries times.
-                        # Give up and return so that it can be tried in
-                        # the next periodic interval.
-                        with excutils.save_and_reraise_exception(reraise=True):
-                            LOG.exception(_LE("Socket error in connecting to "
-                                              "the OVSDB server"))
-                    else:
-                        time.sleep(1)
-                        retryCount += 1
+            if connect_retries is None:
+                connect_retries = conf.max_connection_retries
+            self._open(gw_config, connect_retries)
 
             # Successfully connected to the socket
             LOG.debug(OVSDB_CONNECTED_MSG, gw_config.ovsdb_ip)
             self.connected = True
 
+    def _open(self, gw_config, max_retries):
+        """Opens the connection to the OVSDB server of gw_config."""
+        if cluster.is_clustered(gw_config):
+            self._open_cluster(gw_config, max_retries)
+        else:
+            self._open_endpoint(gw_config, max_retries)
+
+    def _open_cluster(self, gw_config, max_retries):
+        """Connects to a member of the clustered OVSDB server.
+
+           The members are tried in turn until one is in the role the
+           session prefers. Failing that, the session connects to the
+           first member which answered, as the followers forward the
+           transactions to the leader. All the members are
+           tried again after a backoff delay, up to max_retries times.
+        """
+        preferred_role = self._preferred_role()
+        retry_count = 0
+        while True:
+            fallback = None
+            for index in cluster.candidates(gw_config, preferred_role):
+                member_role = self._open_member(gw_config, index)
+                if member_role == preferred_role:
+                    return
+                if member_role is not None:
+                    self._close_member()
+                    if fallback is None:
+                        fallback = index
+            if (fallback is not None and
+                    self._open_member(gw_config, fallback) is not None):
+                return
+            if retry_count >= max_retries:
+                raise exceptions.OVSDBError(
+                    message="No member of the OVSDB server %s is "
+                    "reachable" % gw_config.ovsdb_identifier)
+            eventlet.greenthread.sleep(connection_state.backoff_delay(
+                retry_count, cfg.CONF.ovsdb.connection_backoff_initial,
+                cfg.CONF.ovsdb.connection_backoff_max))
+            retry_count += 1
+
+    def _open_member(self, gw_config, index):
+        """Connects to a member of the OVSDB server, returns its role.
+
+           Returns None, with the connection closed, if the member cannot
+           be reached or is not connected to the cluster.
+        """
+        member = gw_config.member(index)
+        try:
+            self._open_endpoint(member, 0)
+        except (IOError, OSError, socket.error, socket.timeout,
+                exceptions.OVSDBError):
+            return None
+        self.endpoint = index
+        try:
+            member_role = self._server_role()
+        except (IOError, OSError, socket.error, socket.timeout,
+                exceptions.OVSDBError) as ex:
+            LOG.warning(_LW("Could not get the role of the OVSDB server "
+                            "%(ip)s: %(ex)s"),
+                        {'ip': member.ovsdb_ip, 'ex': ex})
+            member_role = None
+        if member_role is None:
+            self._close_member()
+            return None
+        cluster.set_role(self, gw_config, member_role)
+        LOG.debug("OVSDB server %(ip)s of %(id)s is a %(role)s",
+                  {'ip': member.ovsdb_ip,
+                   'id': gw_config.ovsdb_identifier, 'role': member_role})
+        return member_role
+
+    def _close_member(self):
+        self._close()
+        # Data of the closed connection may be left in its framer.
+        self.framers.pop(None, None)
+        self.endpoint = None
+        self.cluster_role = None
+
+    def _preferred_role(self):
+        """Role of the member of a clustered OVSDB server to connect to."""
+        return cluster.LEADER
+
+    def _server_role(self):
+        """Asks the OVSDB server just connected to for its role.
+
+           Its _Server database is monitored, so that the changes of its
+           role are received as updates afterwards.
+        """
+        op_id = str(random.getrandbits(128))
+        self._sendall(self.socket, jsonutils.dump_as_bytes(
+            cluster.server_monitor_request(op_id)))
+        msg_framer = self._get_framer()
+        self.socket.settimeout(self.response_timeout)
+        try:
+            while True:
+                messages = msg_framer.recv(self.socket)
+                if messages is None:
+                    raise exceptions.OVSDBError(
+                        message="Connection closed by the OVSDB server")
+                for message in messages:
+                    if message.get('id') == op_id:
+                        return self._reply_role(message)
+        finally:
+            self.socket.settimeout(None)
+
+    def _reply_role(self, reply):
+        if reply.get('error'):
+            # Servers older than the clusters have no _Server database.
+            return cluster.LEADER
+        return cluster.role(reply.get('result'))
+
+    def _on_server_update(self, message):
+        """Handles an update of the _Server database of the OVSDB server.
+
+           Returns False if the message is not such an update.
+        """
+        params = message.get('params') or [None]
+        if (self.endpoint is None or
+                params[0] != cluster.SERVER_MONITOR_ID):
+            return False
+        member_role = cluster.role(params[1])
+        if member_role is not None and member_role != self.cluster_role:
+            LOG.info(_LI("OVSDB server %(ip)s of %(id)s is now a "
+                         "%(role)s"),
+                     {'ip': self.gw_config.endpoints[self.endpoint][0],
+                      'id': self.gw_config.ovsdb_identifier,
+                      'role': member_role})
+            cluster.set_role(self, self.gw_config, member_role)
+        return True
+
+    def _open_endpoint(self, gw_config, max_retries):
+        """Opens the connection to the OVSDB server at gw_config."""
+        if l2gateway_config.unix_socket_path(gw_config.ovsdb_ip):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._connect(gw_config, max_retries)
+        if not l2gateway_config.unix_socket_path(gw_config.ovsdb_ip):
+            self._set_keepalive(self.socket)
+            self._set_nodelay(self.socket)
+        if gw_config.use_ssl:
+            self._ssl_handshake(gw_config)
+
+    def _close(self):
+        """Closes the connection opened by _open."""
+        if self.gw_config.use_ssl:
+            # The session tickets of TLS 1.3 are only received after
+            # the handshake.
+            self.ssl_contexts.save_session(
+                self.gw_config.ovsdb_identifier, self.socket)
+        self.socket.close()
+
+    def _connect(self, gw_config, max_retries):
+        """Connects the socket to the OVSDB server.
+
+           The socket is green, so waiting for the connection, which
+           is bounded by connect_timeout, does not block the other
+           greenthreads. Failed attempts are retried up to max_retries
+           times after a jittered, exponentially growing delay.
+        """
+        address = l2gateway_config.unix_socket_path(gw_config.ovsdb_ip)
+        if address is None:
+            address = (str(gw_config.ovsdb_ip), int(gw_config.ovsdb_port))
+        retry_count = 0
+        while True:
+            self.socket.settimeout(cfg.CONF.ovsdb.connect_timeout)
+            try:
+                self.socket.connect(address)
+                break
+            except (socket.error, socket.timeout):
+                LOG.warning(OVSDB_UNREACHABLE_MSG, gw_config.ovsdb_ip)
+                if retry_count >= max_retries:
+                    # Retried for max_connection_retries times.
+                    # Give up and return so that it can be tried in
+                    # the next periodic interval.
+                    with excutils.save_and_reraise_exception(reraise=True):
+                        LOG.exception(_LE("Socket error in connecting to "
+                                          "the OVSDB server"))
+                eventlet.greenthread.sleep(connection_state.backoff_delay(
+                    retry_count, cfg.CONF.ovsdb.connection_backoff_initial,
+                    cfg.CONF.ovsdb.connection_backoff_max))
+                retry_count += 1
+        self.socket.settimeout(None)
+
+    def _ssl_handshake(self, gw_config):
+        """Wraps the connected socket and runs the TLS handshake.
+
+           The socket is wrapped only once connected, as connecting a
+           wrapped green socket would not resume the TLS session.
+        """
+        ovsdb_identifier = gw_config.ovsdb_identifier
+        try:
+            self.socket = self.ssl_contexts.wrap_socket(
+                self.socket, ovsdb_identifier, gw_config.private_key,
+                gw_config.certificate, gw_config.ca_cert)
+            self.socket.settimeout(cfg.CONF.ovsdb.connect_timeout)
+            self.ssl_contexts.handshake(ovsdb_identifier, self.socket)
+        except (IOError, OSError, socket.error, socket.timeout):
+            with excutils.save_and_reraise_exception():
+                LOG.exception(_LE("TLS handshake with the OVSDB server "
+                                  "%s failed"), ovsdb_identifier)
+                self.socket.close()
+        self.socket.settimeout(None)
+        self.ssl_contexts.save_session(ovsdb_identifier, self.socket)
+
+    def _set_keepalive(self, sock):
+        if cfg.CONF.ovsdb.tcp_keepalive:
+            inactivity.enable_tcp_keepalive(
+                sock, cfg.CONF.ovsdb.tcp_keepalive_idle,
+                cfg.CONF.ovsdb.tcp_keepalive_interval,
+                cfg.CONF.ovsdb.tcp_keepalive_count)
+
+    @staticmethod
+    def _is_tcp(sock):
+        return getattr(sock, 'family', None) in (socket.AF_INET,
+                                                 socket.AF_INET6)
+
+    def _set_nodelay(self, sock):
+        if cfg.CONF.ovsdb.tcp_nodelay and self._is_tcp(sock):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _start_probing(self, addr=None):
+        """Starts to probe the connection of addr when it is idle."""
+        if self.probes is not None:
+            self.probes.add(addr)
+
+    def _on_activity(self, addr=None):
+        """Records that a message was received from addr."""
+        if self.probes is not None:
+            self.probes.touch(addr)
+
+    def _send_probe(self, addr):
+        self.send({"method": "echo", "params": [],
+                   "id": inactivity.PROBE_ID}, addr=addr)
+
+    def _on_inactive(self, addr):
+        if self.enable_manager:
+            if addr in self.ovsdb_dicts:
+                self.disconnect(addr)
+        elif self.connected:
+            self.disconnect(addr)
+
     def _get_ovsdb_ip_mapping(self):
         ovsdb_ip_mapping = {}
         ovsdb_hosts = cfg.CONF.ovsdb.ovsdb_hosts
@@ -100,6 +376,9 @@ class BaseConnection(object):
                 host_splits = str(host).split(':')
                 ovsdb_identifier = str(host_splits[0]).strip()
                 ovsdb_ip = str(host_splits[1]).strip()
+                if ovsdb_ip == 'unix':
+                    # Unix sockets are not accepted by the manager mode.
+                    continue
                 ovsdb_ip_mapping[ovsdb_ip] = ovsdb_identifier
             return ovsdb_ip_mapping
 
@@ -117,19 +396,19 @@ class BaseConnection(object):
                 priv_key_file = priv_key_path + "/" + ovsdb_id + ".key"
                 cert_file = cert_path + "/" + ovsdb_id + ".cert"
                 ca_cert_file = ca_cert_path + "/" + ovsdb_id + ".ca_cert"
-                is_priv_key = os.path.isfile(priv_key_file)
-                is_cert_file = os.path.isfile(cert_file)
-                is_ca_cert_file = os.path.isfile(ca_cert_file)
-                if is_priv_key and is_cert_file and is_ca_cert_file:
-                    ssl_conn_stream = ssl.wrap_socket(
-                        client_sock,
-                        server_side=True,
-                        keyfile=priv_key_file,
-                        certfile=cert_file,
-                        ssl_version=ssl.PROTOCOL_SSLv23,
-                        ca_certs=ca_cert_file)
+                try:
+                    ssl_conn_stream = self.ssl_contexts.wrap_socket(
+                        client_sock, ovsdb_id, priv_key_file, cert_file,
+                        ca_cert_file, server_side=True)
+                except (IOError, OSError):
+                    ssl_conn_stream = None
+                if ssl_conn_stream is not None:
+                    self.ssl_contexts.handshake(ovsdb_id, ssl_conn_stream)
                     client_sock = ssl_conn_stream
                 else:
+                    is_priv_key = os.path.isfile(priv_key_file)
+                    is_cert_file = os.path.isfile(cert_file)
+                    is_ca_cert_file = os.path.isfile(ca_cert_file)
                     if not is_priv_key:
                         LOG.error(_LE("Could not find private key in"
                                       " %(path)s dir, expecting in the "
@@ -162,149 +441,308 @@ class BaseConnection(object):
         # configured port for your service.
         self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.s.bind((host, port))        # Bind to the port
-        self.s.listen(5)                 # Now wait for client connection.
+        # Now wait for client connection.
+        self.s.listen(socket.SOMAXCONN)
+        if multiplexer.is_supported():
+            # All the connections are read from a single loop.
+            self.multiplexer = multiplexer.Multiplexer(self)
+            self.multiplexer.run(self.s)
+            return
         while True:
-            # Establish connection with client.
+            # The connections are left in the backlog while too many
+            # handshakes are in progress.
+            self.handshakes.wait_for_room()
             c_sock, ip_addr = self.s.accept()
-            addr = ip_addr[0]
-            c_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            c_sock = self._is_ssl_configured(addr, c_sock)
-            LOG.debug("Got connection from %s ", addr)
-            self.connected = True
-            if addr in self.ovsdb_fd_states.keys():
-                del self.ovsdb_fd_states[addr]
-            if addr in self.ovsdb_conn_list:
-                self.ovsdb_conn_list.remove(addr)
-            if addr in self.ovsdb_dicts.keys():
-                if self.ovsdb_dicts.get(addr):
-                    self.ovsdb_dicts.get(addr).close()
-                del self.ovsdb_dicts[addr]
-            self.ovsdb_dicts[addr] = c_sock
+            self._admit_peer(c_sock, ip_addr[0])
+
+    def _admit_peer(self, c_sock, addr):
+        """Starts the handshake of the connection accepted from addr.
+
+           The connection is set up in its own greenthread, so that a
+           slow TLS handshake does not hold up the other connections.
+        """
+        self.handshakes.start(addr)
+        eventlet.greenthread.spawn_n(self._setup_peer, c_sock, addr)
+
+    def _setup_peer(self, c_sock, addr):
+        c_sock.settimeout(cfg.CONF.ovsdb.handshake_timeout)
+        try:
+            self._accept_peer(c_sock, addr)
+        except Exception as ex:
+            LOG.exception(_LE("Exception [%(ex)s] occurred while setting "
+                              "up the connection of the OVSDB server "
+                              "%(addr)s"), {'ex': ex, 'addr': addr})
+            c_sock.close()
+            self.handshakes.abort(addr)
+
+    def _accept_peer(self, c_sock, addr):
+        """Takes over the connection accepted from an OVSDB server."""
+        c_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._set_keepalive(c_sock)
+        self._set_nodelay(c_sock)
+        c_sock = self._is_ssl_configured(addr, c_sock)
+        c_sock.settimeout(None)
+        LOG.debug("Got connection from %s ", addr)
+        self.connected = True
+        self.ovsdb_fd_states.pop(addr, None)
+        self.ovsdb_conn_list.discard(addr)
+        if self.multiplexer:
+            self.multiplexer.remove_peer(addr)
+        old_sock = self.ovsdb_dicts.pop(addr, None)
+        if old_sock:
+            old_sock.close()
+        self.framers.pop(addr, None)
+        self.ovsdb_dicts[addr] = c_sock
+        self._start_probing(addr)
+        # Now that OVSDB server has sent a socket open request, let us wait
+        # for echo request. After the first echo request, we will send the
+        # "monitor" request to the OVSDB server.
+        self.handshakes.advance(addr, handshake.AWAITING_ECHO)
+        if self.multiplexer:
+            self.multiplexer.add_peer(addr, c_sock)
+        else:
             eventlet.greenthread.spawn(self._common_sock_rcv_thread, addr)
-            # Now that OVSDB server has sent a socket open request, let us wait
-            # for echo request. After the first echo request, we will send the
-            # "monitor" request to the OVSDB server.
+
+    def _on_handshake_expired(self, addr):
+        if addr in self.ovsdb_dicts:
+            self.disconnect(addr)
+
+    def _on_peer_messages(self, addr, messages):
+        """Handles messages read from addr.
+
+           Until the OVSDB server has sent its first echo request, the
+           messages are dropped. The echo is answered and the monitor
+           request is sent. Returns the messages left to be processed.
+        """
+        if addr in self.ovsdb_conn_list:
+            return messages
+        for index, message in enumerate(messages):
+            if message.get('method', None) == 'echo':
+                break
+        else:
+            return []
+        self.check_c_sock = True
+        if not self.send({"result": message.get("params", None),
+                          "error": None, "id": message['id']}, addr=addr):
+            return []
+        self.ovsdb_conn_list.add(addr)
+        self.ovsdb_fd_states[addr] = 'connected'
+        self.check_sock_rcv = True
+        if self._send_monitor_msg_to_ovsdb_connection(addr):
+            self.handshakes.advance(addr, handshake.AWAITING_MONITOR)
+        else:
+            # Only the monitor agent monitors the OVSDB servers.
+            self.handshakes.finish(addr)
+        return messages[index + 1:]
+
+    def _on_peer_closed(self, addr):
+        """Handles the connection of addr being closed by the peer."""
+        self.disconnect(addr)
 
     def _send_monitor_msg_to_ovsdb_connection(self, addr):
+        """Starts to monitor the OVSDB server of addr.
+
+           Returns whether the monitor request is being sent.
+        """
         if self.mgr.l2gw_agent_type == n_const.MONITOR:
             try:
                 if (self.mgr.ovsdb_fd) and (addr in self.ovsdb_conn_list):
                     eventlet.greenthread.spawn_n(
                         self.mgr.ovsdb_fd._spawn_monitor_table_thread,
                         addr)
+                    return True
             except Exception:
                 LOG.warning(_LW("Could not send monitor message to the "
                                 "OVSDB server."))
                 self.disconnect(addr)
+        return False
 
     def _common_sock_rcv_thread(self, addr):
-        chunks = []
-        lc = rc = 0
-        prev_char = None
-        self.read_on = True
-        check_monitor_msg = True
-        self._echo_response(addr)
-        if self.enable_manager and (addr in self.ovsdb_conn_list):
-            while self.read_on:
-                response = self.ovsdb_dicts.get(addr).recv(n_const.BUFFER_SIZE)
-                self.ovsdb_fd_states[addr] = 'connected'
-                self.check_sock_rcv = True
-                eventlet.greenthread.sleep(0)
-                if check_monitor_msg:
-                    self._send_monitor_msg_to_ovsdb_connection(addr)
-                    check_monitor_msg = False
-                if response:
-                    response = response.decode('utf8')
-                    message_mark = 0
-                    for i, c in enumerate(response):
-                        if c == '{' and not (prev_char and
-                                             prev_char == '\\'):
-                            lc += 1
-                        elif c == '}' and not (prev_char and
-                                               prev_char == '\\'):
-                            rc += 1
-                        if rc > lc:
-                            raise Exception(_LE("json string not valid"))
-                        elif lc == rc and lc is not 0:
-                            chunks.append(response[message_mark:i + 1])
-                            message = "".join(chunks)
-                            eventlet.greenthread.spawn_n(
-                                self._on_remote_message, message, addr)
-                            eventlet.greenthread.sleep(0)
-                            lc = rc = 0
-                            message_mark = i + 1
-                            chunks = []
-                        prev_char = c
-                    chunks.append(response[message_mark:])
-                else:
-                    self.read_on = False
-                    self.disconnect(addr)
+        """Reads the connection of addr until it is closed.
 
-    def _echo_response(self, addr):
-        while True:
+           Used when epoll is not available. The messages go through
+           _on_peer_messages, as those read by the multiplexer do.
+        """
+        sock = self.ovsdb_dicts.get(addr)
+        msg_framer = self._get_framer(addr)
+        while sock is not None:
             try:
-                if self.enable_manager:
-                    eventlet.greenthread.sleep(0)
-                    response = self.ovsdb_dicts.get(addr).recv(
-                        n_const.BUFFER_SIZE)
-                    sock_json_m = jsonutils.loads(response)
-                    sock_handler_method = sock_json_m.get('method', None)
-                    if sock_handler_method == 'echo':
-                        self.check_c_sock = True
-                        self.ovsdb_dicts.get(addr).send(jsonutils.dumps(
-                            {"result": sock_json_m.get("params", None),
-                             "error": None, "id": sock_json_m['id']}))
-                        if (addr not in self.ovsdb_conn_list):
-                            self.ovsdb_conn_list.append(addr)
-                        break
-            except Exception:
-                continue
+                messages = msg_framer.recv(sock)
+                if messages is not None:
+                    messages = self._on_peer_messages(addr, messages)
+            except Exception as ex:
+                LOG.exception(_LE("Exception [%s] occurred while receiving "
+                                  "message from the OVSDB server"), ex)
+                messages = None
+            if self.ovsdb_dicts.get(addr) is not sock:
+                # Closed, or replaced by a newer connection from addr.
+                break
+            if messages is None:
+                self._on_peer_closed(addr)
+                break
+            self._on_activity(addr)
+            if messages:
+                self.dispatcher.dispatch(addr, messages)
+                self.dispatcher.wait_for_room(addr)
 
     def send(self, message, callback=None, addr=None):
-        """Sends a message to the OVSDB server."""
+        """Sends a message to the OVSDB server.
+
+           The message is encoded once and queued in the batch of the
+           connection. The greenthread which gets the send lock of the
+           connection writes the whole batch, so the messages sent while
+           the connection is busy go out in a single write.
+        """
         if callback:
             self.callbacks[message['id']] = callback
-        retry_count = 0
-        bytes_sent = 0
-        while retry_count <= n_const.MAX_RETRIES:
-            try:
-                if self.enable_manager:
-                    bytes_sent = self.ovsdb_dicts.get(addr).send(
-                        jsonutils.dumps(message))
-                else:
-                    bytes_sent = self.socket.send(jsonutils.dumps(message))
-                if bytes_sent:
-                    return True
-            except Exception as ex:
-                LOG.exception(_LE("Exception [%s] occurred while sending "
-                                  "message to the OVSDB server"), ex)
-            retry_count += 1
+        key = self._send_key(addr)
+        batch = self._outgoing.get(key)
+        if batch is None:
+            batch = self._outgoing[key] = _Batch()
+        batch.data.append(jsonutils.dump_as_bytes(message))
+        with self._send_locks[key]:
+            if self._outgoing.get(key) is batch:
+                del self._outgoing[key]
+                batch.sent = self._write_batch(batch.data, addr)
+        return batch.sent
 
-        LOG.warning(_LW("Could not send message to the "
-                        "OVSDB server."))
-        self.disconnect(addr)
-        return False
+    def _send_key(self, addr):
+        # In direct mode the callers may pass the OVSDB identifier, but
+        # there is a single connection.
+        return addr if self.enable_manager else None
+
+    def _write_batch(self, data, addr):
+        if self.enable_manager:
+            sock = self.ovsdb_dicts.get(addr)
+            if sock is None:
+                return False
+        else:
+            sock = self.socket
+        try:
+            with self._corked(sock):
+                self._sendall(sock, b''.join(data))
+        except Exception as ex:
+            LOG.exception(_LE("Exception [%s] occurred while sending "
+                              "message to the OVSDB server"), ex)
+            self.stats['send_errors'] += 1
+            LOG.warning(_LW("Could not send message to the "
+                            "OVSDB server."))
+            self.disconnect(addr)
+            return False
+        self.stats['messages_sent'] += len(data)
+        self.stats['send_batches'] += 1
+        return True
+
+    def _sendall(self, sock, data):
+        """Writes the whole of data, which send may only write in part."""
+        view = memoryview(data)
+        offset = 0
+        while offset < len(data):
+            sent = sock.send(view[offset:])
+            self.stats['send_calls'] += 1
+            offset += sent
+            self.stats['bytes_sent'] += sent
+
+    @contextlib.contextmanager
+    def _corked(self, sock):
+        cork = (cfg.CONF.ovsdb.tcp_cork and hasattr(socket, 'TCP_CORK') and
+                self._is_tcp(sock))
+        if cork:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+        try:
+            yield
+        finally:
+            if cork:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+
+    def _get_framer(self, addr=None):
+        """Returns the message framer of the connection to addr."""
+        msg_framer = self.framers.get(addr)
+        if msg_framer is None:
+            msg_framer = framer.MessageFramer(
+                buffer_size=cfg.CONF.ovsdb.recv_buffer_size)
+            self.framers[addr] = msg_framer
+        return msg_framer
 
     def disconnect(self, addr=None):
         """disconnects the connection from the OVSDB server."""
+        self.framers.pop(addr, None)
+        self._send_locks.pop(self._send_key(addr), None)
+        self._outgoing.pop(self._send_key(addr), None)
+        if self.probes is not None:
+            self.probes.remove(addr)
+        self._fail_requests(addr)
         if self.enable_manager:
-            self.ovsdb_dicts.get(addr).close()
-            del self.ovsdb_dicts[addr]
-            if addr in self.ovsdb_fd_states.keys():
-                del self.ovsdb_fd_states[addr]
-            self.ovsdb_conn_list.remove(addr)
+            self.handshakes.abort(addr)
+            if self.multiplexer:
+                self.multiplexer.remove_peer(addr)
+            # The peer may have been disconnected already by another
+            # greenthread.
+            sock = self.ovsdb_dicts.pop(addr, None)
+            if sock:
+                sock.close()
+            self.ovsdb_fd_states.pop(addr, None)
+            self.ovsdb_conn_list.discard(addr)
         else:
-            self.socket.close()
+            self._close()
         self.connected = False
 
+    def _register_request(self, operation_id, addr=None):
+        """Registers a request whose reply is going to be waited for.
+
+           Must be called before the request is sent so that a reply
+           arriving immediately finds its waiter.
+        """
+        self.requests[operation_id] = (addr, event.Event())
+
+    def _cancel_request(self, operation_id):
+        self.requests.pop(operation_id, None)
+
+    def _complete_request(self, message):
+        """Hands a reply over to the request waiting for it."""
+        if message.get('id') == inactivity.PROBE_ID:
+            # The reply to an inactivity probe, nobody waits for it.
+            return True
+        request = self.requests.get(message.get('id'))
+        if request is None:
+            # Either nobody asked for it or the waiter has timed out.
+            self.stats['unmatched_responses'] += 1
+            LOG.debug("Dropping unmatched reply %(id)s from the OVSDB "
+                      "server, %(count)d so far",
+                      {'id': message.get('id'),
+                       'count': self.stats['unmatched_responses']})
+            return False
+        waiter = request[1]
+        if not waiter.ready():
+            waiter.send(message)
+        return True
+
+    def _is_request_complete(self, operation_id):
+        request = self.requests.get(operation_id)
+        return request is not None and request[1].ready()
+
+    def _fail_requests(self, addr=None):
+        """Wakes up the requests sent on a connection which is closed."""
+        for operation_id, (req_addr, waiter) in list(self.requests.items()):
+            if req_addr == addr or not self.enable_manager:
+                del self.requests[operation_id]
+                if not waiter.ready():
+                    waiter.send(None)
+
     def _response(self, operation_id):
-        x_copy = None
-        to_delete = None
-        for x in self.responses:
-            if x['id'] == operation_id:
-                x_copy = copy.deepcopy(x)
-                to_delete = x
-                break
-        if to_delete:
-            self.responses.remove(to_delete)
-        return x_copy
+        """Returns the reply to a registered request.
+
+           Waits up to response_timeout seconds for the reply to arrive.
+           None is returned if it does not arrive in time or if the
+           connection is closed in the meantime.
+        """
+        request = self.requests.get(operation_id)
+        if request is None:
+            return None
+        result = None
+        with eventlet.Timeout(self.response_timeout, False):
+            result = request[1].wait()
+        self.requests.pop(operation_id, None)
+        if result is None:
+            self.stats['expired_requests'] += 1
+        return result
@@ -0,0 +1,111 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Helpers for the clustered (RAFT) OVSDB servers.
+
+A clustered OVSDB server is made of several members, one of which is
+the leader. Every member serves the whole database, but only the leader
+commits transactions; the followers forward them to it, or refuse them.
+Each member reports, in the Database table of its _Server database,
+whether it is connected to the cluster and whether it is the leader.
+
+The members of an OVSDB server are the endpoints of its gateway
+configuration. The sessions record the member they are connected to and
+its role, and the gateway configuration records the member last known
+to be the leader, along with a leader epoch which is incremented each
+time the leadership is seen to change.
+"""
+
+from networking_l2gw.services.l2gateway.common import constants as n_const
+
+SERVER_DATABASE = '_Server'
+# Monitor id of the updates of the _Server database, so that they are
+# told apart from the updates of the hardware_vtep database.
+SERVER_MONITOR_ID = '_Server'
+
+LEADER = 'leader'
+FOLLOWER = 'follower'
+
+
+def is_clustered(gw_config):
+    return len(gw_config.endpoints) > 1
+
+
+def server_monitor_request(op_id):
+    """Returns the request monitoring the members of a clustered server."""
+    return {'id': op_id,
+            'method': 'monitor',
+            'params': [SERVER_DATABASE, SERVER_MONITOR_ID,
+                       {'Database': {'columns': ['name', 'model',
+                                                 'connected', 'leader']}}]}
+
+
+def role(table_updates, database=n_const.OVSDB_SCHEMA_NAME):
+    """Returns the role of a member from an update of its _Server database.
+
+       Returns None if the update does not tell. A member which is not
+       connected to the cluster is a follower, and a standalone server is
+       its own leader.
+    """
+    rows = (table_updates or {}).get('Database') or {}
+    for row_update in rows.values():
+        row = row_update.get('new')
+        if not row or row.get('name') != database:
+            continue
+        if row.get('connected', True) and row.get('leader', True):
+            return LEADER
+        return FOLLOWER
+
+
+def candidates(gw_config, preferred_role):
+    """Returns the indexes of the members to try, in order.
+
+       The known leader is tried first by the sessions which want the
+       leader, and last by the other ones.
+    """
+    others = [index for index in range(len(gw_config.endpoints))
+              if index != gw_config.leader]
+    if gw_config.leader is None:
+        return others
+    if preferred_role == LEADER:
+        return [gw_config.leader] + others
+    return others + [gw_config.leader]
+
+
+def set_role(session, gw_config, new_role):
+    """Records the role of the member a session is connected to."""
+    session.cluster_role = new_role
+    if new_role == LEADER:
+        if gw_config.leader != session.endpoint:
+            gw_config.leader = session.endpoint
+            gw_config.leader_epoch += 1
+    elif gw_config.leader == session.endpoint:
+        # The member lost the leadership, the new leader is not known.
+        gw_config.leader = None
+        gw_config.leader_epoch += 1
+    session.leader_epoch = gw_config.leader_epoch
+
+
+def can_write(session, gw_config):
+    """Returns whether transactions should be sent on a session.
+
+       The sessions to a member which is not the leader, or which was the
+       leader before the leadership last changed, are not to be used for
+       transactions.
+    """
+    if session.endpoint is None:
+        return True
+    return (session.cluster_role == LEADER and
+            session.leader_epoch == gw_config.leader_epoch)
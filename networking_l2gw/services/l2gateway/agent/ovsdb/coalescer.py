@@ -0,0 +1,168 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+import eventlet
+from oslo_log import log as logging
+
+from networking_l2gw._i18n import _LE
+from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_monitor
+from networking_l2gw.services.l2gateway.common import constants as n_const
+from networking_l2gw.services.l2gateway.common import ovsdb_payload
+
+LOG = logging.getLogger(__name__)
+
+NEW, MODIFIED, DELETED = (ovsdb_payload.NEW, ovsdb_payload.MODIFIED,
+                          ovsdb_payload.DELETED)
+
+# Values left unset by the monitor in a modified row when they did not
+# change, the pending value is kept for them.
+_KEPT_WHEN_UNSET = {'physical_ports': ('physical_switch_id',
+                                       'vlan_bindings')}
+
+
+def _merge_row(kind, pending_row, row):
+    kept = [key for key in _KEPT_WHEN_UNSET.get(kind, ())
+            if row.get(key) is None and pending_row.get(key) is not None]
+    if not kept:
+        return row
+    row = dict(row)
+    for key in kept:
+        row[key] = pending_row[key]
+    return row
+
+
+class _Window(object):
+    """Changes of a gateway waiting to be sent, by kind of row and uuid."""
+    def __init__(self):
+        self.changes = dict((kind, collections.OrderedDict())
+                            for kind in ovsdb_payload.ROW_KINDS)
+        self.timer = None
+
+    def __len__(self):
+        return sum(len(rows) for rows in self.changes.values())
+
+    def _updates(self, ovsdb_data):
+        for kind in ovsdb_payload.ROW_KINDS:
+            for state in ovsdb_payload.CHANGES:
+                for row in ovsdb_data.get(ovsdb_payload.section(state,
+                                                                kind)) or ():
+                    yield kind, state, row
+
+    def can_merge(self, ovsdb_data):
+        """Whether the changes can be merged with the pending ones.
+
+           A row deleted and then created again is sent in two updates.
+        """
+        for kind, state, row in self._updates(ovsdb_data):
+            pending = self.changes[kind].get(row.get('uuid'))
+            if (pending is not None and pending[0] == DELETED and
+                    state != DELETED):
+                return False
+        return True
+
+    def merge(self, ovsdb_data):
+        for kind, state, row in self._updates(ovsdb_data):
+            rows = self.changes[kind]
+            uuid = row.get('uuid')
+            pending = rows.get(uuid)
+            if pending is None:
+                rows[uuid] = (state, row)
+            elif pending[0] == NEW and state == DELETED:
+                # The row was created and deleted within the window.
+                del rows[uuid]
+            elif pending[0] == NEW:
+                rows[uuid] = (NEW, _merge_row(kind, pending[1], row))
+            elif state == MODIFIED:
+                rows[uuid] = (MODIFIED, _merge_row(kind, pending[1], row))
+            else:
+                rows[uuid] = (state, row)
+
+    def ovsdb_data(self, ovsdb_identifier):
+        ovsdb_data = {n_const.OVSDB_IDENTIFIER: ovsdb_identifier}
+        for kind, rows in self.changes.items():
+            for state in ovsdb_payload.CHANGES:
+                state_rows = [row for row_state, row in rows.values()
+                              if row_state == state]
+                if state_rows:
+                    ovsdb_data[ovsdb_payload.section(state, kind)] = (
+                        state_rows)
+        return ovsdb_data
+
+
+class UpdateCoalescer(object):
+    """Merges the updates of each gateway into fewer calls to send.
+
+       The updates of a gateway received within window seconds of the
+       first one are sent as one update, or as soon as max_rows rows are
+       pending. A row modified several times is sent once, with its latest
+       values, and a row created and deleted within the window is not sent
+       at all. The rows of each list are sent in the order they were
+       first changed in. The initial dumps are sent at once, the updates
+       pending for the gateway are dropped as the dump holds their
+       changes.
+    """
+    def __init__(self, send, window, max_rows):
+        self.send = send
+        self.window = window
+        self.max_rows = max_rows
+        self._windows = {}
+
+    def submit(self, activity, ovsdb_data):
+        ovsdb_identifier = ovsdb_data.get(n_const.OVSDB_IDENTIFIER)
+        if activity != ovsdb_monitor.Activity.Update or self.window <= 0:
+            self._drop(ovsdb_identifier)
+            self.send(activity, ovsdb_data)
+            return
+        window = self._windows.get(ovsdb_identifier)
+        if window is not None and not window.can_merge(ovsdb_data):
+            self.flush(ovsdb_identifier)
+            window = None
+        if window is None:
+            window = self._windows[ovsdb_identifier] = _Window()
+            window.timer = eventlet.spawn_after(self.window, self._expire,
+                                                ovsdb_identifier, window)
+        window.merge(ovsdb_data)
+        if len(window) >= self.max_rows:
+            self.flush(ovsdb_identifier)
+
+    def flush(self, ovsdb_identifier):
+        """Sends the updates pending for a gateway."""
+        window = self._drop(ovsdb_identifier)
+        if window is not None and len(window):
+            self.send(ovsdb_monitor.Activity.Update,
+                      window.ovsdb_data(ovsdb_identifier))
+
+    def clear(self):
+        """Drops the updates pending for all the gateways."""
+        for ovsdb_identifier in list(self._windows):
+            self._drop(ovsdb_identifier)
+
+    def _drop(self, ovsdb_identifier):
+        window = self._windows.pop(ovsdb_identifier, None)
+        if window is not None:
+            window.timer.cancel()
+        return window
+
+    def _expire(self, ovsdb_identifier, window):
+        if self._windows.get(ovsdb_identifier) is not window:
+            return
+        try:
+            self.flush(ovsdb_identifier)
+        except Exception as ex:
+            LOG.exception(_LE("Exception [%(ex)s] while sending the "
+                              "changes of the OVSDB server %(id)s"),
+                          {'ex': ex, 'id': ovsdb_identifier})
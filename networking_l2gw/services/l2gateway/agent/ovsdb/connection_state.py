@@ -0,0 +1,79 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import random
+import time
+
+DISCONNECTED = 'disconnected'
+CONNECTING = 'connecting'
+CONNECTED = 'connected'
+
+
+def backoff_delay(attempt, initial, maximum):
+    """Returns the delay before the retry following attempt failures.
+
+       The delay doubles with each failure up to maximum, and is drawn
+       at random from its upper half so that the agent does not retry all
+       the unreachable OVSDB servers at the same time.
+    """
+    delay = min(initial * (2 ** attempt), maximum)
+    return random.uniform(delay / 2.0, delay)
+
+
+class ConnectionState(object):
+    """Connection state machine of an OVSDB server.
+
+       The connection goes from disconnected to connecting and then to
+       connected. A failed attempt goes back to disconnected, and the next
+       attempt is not due before a backoff delay which grows with the
+       number of consecutive failures. A connection which is lost after
+       being established is retried right away.
+    """
+    def __init__(self, backoff_initial, backoff_max):
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.state = DISCONNECTED
+        self.failures = 0
+        self.next_attempt = 0
+
+    def is_due(self, now=None):
+        """Whether a connection attempt should be made now."""
+        if now is None:
+            now = time.time()
+        return self.state == DISCONNECTED and now >= self.next_attempt
+
+    def set_connecting(self):
+        self.state = CONNECTING
+
+    def set_connected(self):
+        self.state = CONNECTED
+        self.failures = 0
+        self.next_attempt = 0
+
+    def set_failed(self, now=None):
+        """Records a failed attempt and returns the delay to the next."""
+        if now is None:
+            now = time.time()
+        delay = backoff_delay(self.failures, self.backoff_initial,
+                              self.backoff_max)
+        self.state = DISCONNECTED
+        self.failures += 1
+        self.next_attempt = now + delay
+        return delay
+
+    def set_lost(self):
+        self.state = DISCONNECTED
+        self.failures = 0
+        self.next_attempt = 0
@@ -0,0 +1,111 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+import eventlet
+from eventlet import event
+from oslo_log import log as logging
+
+from networking_l2gw._i18n import _LE
+
+LOG = logging.getLogger(__name__)
+
+
+class Dispatcher(object):
+    """Processes the messages received from the OVSDB servers.
+
+       The messages of each connection are queued and handed in order to
+       connection._on_remote_message, so the updates of a gateway are
+       processed in the order the OVSDB server sent them. The queues are
+       drained by a fixed-size pool of workers, one connection per worker
+       at a time.
+
+       A connection is not read while its queue holds queue_size messages
+       or more, see wait_for_room, so that a burst of updates is held back
+       by the OVSDB server instead of being buffered by the agent. The
+       stats counter holds the number of messages dispatched, the highest
+       queue depth seen and the number of times a connection was
+       throttled.
+    """
+    def __init__(self, connection, worker_pool_size, queue_size):
+        self.connection = connection
+        self.queue_size = max(queue_size, 1)
+        self.workers = eventlet.GreenPool(worker_pool_size)
+        self.stats = collections.Counter()
+        # Messages waiting to be processed, by address.
+        self._queues = {}
+        # Addresses whose queue is being drained by a worker.
+        self._draining = set()
+        # Events sent once the queue of an address is no longer full.
+        self._room = {}
+
+    def dispatch(self, addr, messages):
+        """Queues messages received from addr to be processed in order."""
+        if not messages:
+            return
+        queue = self._queues.get(addr)
+        if queue is None:
+            queue = self._queues[addr] = collections.deque()
+        queue.extend(messages)
+        self.stats['dispatched'] += len(messages)
+        if len(queue) > self.stats['max_queue_depth']:
+            self.stats['max_queue_depth'] = len(queue)
+        if addr not in self._draining:
+            self._draining.add(addr)
+            # Waits for a free worker if all of them are busy.
+            self.workers.spawn_n(self._drain, addr)
+
+    def is_full(self, addr):
+        queue = self._queues.get(addr)
+        return queue is not None and len(queue) >= self.queue_size
+
+    def wait_for_room(self, addr):
+        """Waits until the queue of addr is no longer full."""
+        if not self.is_full(addr):
+            return
+        self.stats['throttled'] += 1
+        LOG.debug("Too many messages from the OVSDB server %s are waiting "
+                  "to be processed, pausing the reads", addr)
+        while self.is_full(addr):
+            waiter = self._room.get(addr)
+            if waiter is None:
+                waiter = self._room[addr] = event.Event()
+            waiter.wait()
+
+    def queue_depth(self, addr=None):
+        """Messages waiting to be processed, for addr or overall."""
+        if addr is not None:
+            return len(self._queues.get(addr, ()))
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _drain(self, addr):
+        queue = self._queues[addr]
+        try:
+            while queue:
+                message = queue.popleft()
+                if len(queue) < self.queue_size and addr in self._room:
+                    self._room.pop(addr).send()
+                try:
+                    self.connection._on_remote_message(message, addr)
+                except Exception as ex:
+                    LOG.exception(_LE("Exception [%s] while handling "
+                                      "message"), ex)
+                # Lets the other connections and the readers run.
+                eventlet.greenthread.sleep(0)
+        finally:
+            self._draining.discard(addr)
+            if not queue:
+                del self._queues[addr]
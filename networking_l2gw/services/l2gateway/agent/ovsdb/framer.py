@@ -0,0 +1,202 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import codecs
+import json
+import re
+
+from networking_l2gw.services.l2gateway import exceptions
+
+# Maximum number of bytes buffered for a single incomplete message.
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+# Default size of the receive buffer.
+BUFFER_SIZE = 8 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# Escape sequence of a JSON string, and the bytes other than the quotes
+# and the braces, which do not matter to the nesting depth.
+_ESCAPE = re.compile(br'\\.')
+_NOT_STRUCTURAL = bytes(bytearray(char for char in range(256)
+                                  if char not in bytearray(b'{}"')))
+
+
+class MessageFramer(object):
+    """Splits the stream received from an OVSDB server into messages.
+
+       OVSDB JSON-RPC messages are JSON objects sent back to back on the
+       stream without any delimiter. The socket is read with recv_into
+       into a buffer which is reused for the life of the connection and
+       only grows when a message does not fit in it. Once the buffered
+       data may hold complete messages, it is decoded from the buffer
+       in a single copy and the messages are extracted with
+       json.JSONDecoder.raw_decode. Each message is therefore parsed
+       exactly once and is returned as a dictionary.
+    """
+    def __init__(self, max_message_size=MAX_MESSAGE_SIZE,
+                 buffer_size=BUFFER_SIZE):
+        self.max_message_size = max_message_size
+        self.buffer_size = buffer_size
+        self._raw_decode = json.JSONDecoder().raw_decode
+        self._buffer = bytearray(buffer_size)
+        # Received data not parsed yet is self._buffer[self._start:self._end]
+        self._start = 0
+        self._end = 0
+        # Nesting depth of the data not parsed yet, the braces inside JSON
+        # strings aside. Whether that data ends inside a string or after
+        # the backslash of an escape sequence is kept for the next read.
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        # Length of unparsed data from which a parse attempt is made
+        # regardless of the depth, which only drops to 0 once the data ends
+        # with a complete message. It grows geometrically after each failed
+        # attempt, which keeps the work done for a large message linear.
+        self._retry_length = 0
+
+    def recv(self, sock):
+        """Reads from sock and returns the list of complete messages.
+
+           None is returned if the connection was closed by the peer.
+        """
+        self._reserve(max(self.buffer_size // 2, 1))
+        nbytes = sock.recv_into(memoryview(self._buffer)[self._end:])
+        if not nbytes:
+            return None
+        return self._received(nbytes)
+
+    def feed(self, data):
+        """Adds received data and returns the list of complete messages."""
+        nbytes = len(data)
+        if not nbytes:
+            return []
+        self._reserve(nbytes)
+        self._buffer[self._end:self._end + nbytes] = data
+        return self._received(nbytes)
+
+    def reset(self):
+        """Discards any buffered data."""
+        self._start = 0
+        self._end = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._retry_length = 0
+
+    def _reserve(self, nbytes):
+        """Makes room for nbytes after the buffered data."""
+        if len(self._buffer) - self._end >= nbytes:
+            return
+        pending = self._end - self._start
+        if self._start:
+            # Move the incomplete message to the front of the buffer.
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+            self._start = 0
+            self._end = pending
+        free = len(self._buffer) - pending
+        if free < nbytes:
+            self._buffer.extend(bytearray(max(nbytes - free,
+                                              len(self._buffer))))
+
+    def _received(self, nbytes):
+        end = self._end + nbytes
+        self._count_depth(self._end, end)
+        self._end = end
+        length = end - self._start
+        if self._depth > 0 and length < self._retry_length:
+            self._check_size(length)
+            return []
+        return self._extract_messages()
+
+    def _extract_messages(self):
+        text, consumed = codecs.utf_8_decode(
+            memoryview(self._buffer)[self._start:self._end])
+        end = len(text)
+        messages = []
+        index = _WHITESPACE.match(text, 0).end()
+        while index < end:
+            if text[index] != '{':
+                self.reset()
+                raise exceptions.OVSDBError(
+                    message="Invalid JSON-RPC message received from the "
+                    "OVSDB server")
+            try:
+                message, index = self._raw_decode(text, index)
+            except ValueError:
+                if self._depth > 0:
+                    # The message is not complete yet.
+                    break
+                # Its braces are balanced, the message is invalid.
+                self.reset()
+                raise exceptions.OVSDBError(
+                    message="Invalid JSON-RPC message received from the "
+                    "OVSDB server")
+            messages.append(message)
+            index = _WHITESPACE.match(text, index).end()
+        if index == end:
+            self._start += consumed
+        elif end == consumed:
+            # Only ASCII characters, which are a byte each.
+            self._start += index
+        else:
+            self._start += len(text[:index].encode('utf-8'))
+        remainder = self._end - self._start
+        if remainder:
+            # The messages extracted are balanced, the depth of the data
+            # left is unchanged.
+            self._retry_length = 2 * remainder
+            self._check_size(remainder)
+        else:
+            self.reset()
+        return messages
+
+    def _count_depth(self, start, end):
+        """Adds the braces of buffer[start:end] to the nesting depth.
+
+           The escape sequences are removed first, then everything but the
+           quotes and the braces. The strings left only hold the braces
+           they contained, most are empty and removed as pairs of quotes.
+        """
+        data = bytes(self._buffer[start:end])
+        if self._escaped:
+            data = data[1:]
+            self._escaped = False
+        if b'\\' in data:
+            data = _ESCAPE.sub(b'', data)
+            if data.endswith(b'\\'):
+                # The escaped character is in the next read.
+                data = data[:-1]
+                self._escaped = True
+        data = data.translate(None, _NOT_STRUCTURAL)
+        if self._in_string:
+            data = b'"' + data
+        # The last quote of an odd number opens a string which goes on in
+        # the next read.
+        self._in_string = data.count(b'"') % 2 == 1
+        if self._in_string:
+            data = data[:data.rindex(b'"')]
+        outside = data.replace(b'""', b'')
+        if b'"' in outside:
+            # Some strings hold braces.
+            outside = b''.join(data.split(b'"')[::2])
+        self._depth += outside.count(b'{') - outside.count(b'}')
+
+    def _check_size(self, length):
+        if length > self.max_message_size:
+            self.reset()
+            raise exceptions.OVSDBError(
+                message="Message from the OVSDB server exceeds %d "
+                "bytes" % self.max_message_size)
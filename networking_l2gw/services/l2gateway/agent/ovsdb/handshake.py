@@ -0,0 +1,151 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import time
+
+from eventlet import semaphore
+from oslo_log import log as logging
+
+from networking_l2gw._i18n import _LW
+
+LOG = logging.getLogger(__name__)
+
+# States of the handshake of an OVSDB server connecting in manager mode.
+# The connection is set up, TLS included.
+ACCEPTED = 'accepted'
+# The agent waits for the first echo request of the OVSDB server.
+AWAITING_ECHO = 'awaiting_echo'
+# The monitor request was sent, the agent waits for its reply.
+AWAITING_MONITOR = 'awaiting_monitor'
+
+# Number of the latest handshakes the latency is reported for.
+LATENCY_SAMPLES = 1000
+
+
+class _Handshake(object):
+    def __init__(self, addr):
+        self.addr = addr
+        self.state = ACCEPTED
+        self.accepted_at = time.time()
+
+
+class Handshakes(object):
+    """Tracks the handshakes of the OVSDB servers connecting to the agent.
+
+       An OVSDB server which connects in manager mode goes through the
+       ACCEPTED, AWAITING_ECHO and AWAITING_MONITOR states until the reply
+       to the monitor request has been processed. Up to max_in_progress
+       handshakes are in progress at once, the connections are not
+       accepted while there is no room for another one. Each state has to
+       be left within timeout seconds, on_expired is called with the
+       address of the OVSDB server otherwise. The time from accept to
+       monitored is recorded for the latest handshakes.
+    """
+    def __init__(self, wheel, max_in_progress, timeout, on_expired):
+        self.wheel = wheel
+        self.timeout = timeout
+        self.on_expired = on_expired
+        self.stats = collections.Counter()
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._handshakes = {}
+        self._slots = semaphore.Semaphore(max_in_progress)
+
+    def has_room(self):
+        return self._slots.balance > 0
+
+    def wait_for_room(self):
+        """Waits until another handshake can be started."""
+        with self._slots:
+            pass
+
+    def start(self, addr):
+        """Starts the handshake of a connection accepted from addr.
+
+           A handshake already in progress from addr is replaced.
+        """
+        if addr in self._handshakes:
+            self.stats['handshakes_replaced'] += 1
+        else:
+            self._slots.acquire()
+        self._handshakes[addr] = _Handshake(addr)
+        self._arm(addr)
+
+    def state(self, addr):
+        handshake = self._handshakes.get(addr)
+        return handshake and handshake.state
+
+    def advance(self, addr, state):
+        handshake = self._handshakes.get(addr)
+        if handshake is None:
+            return
+        handshake.state = state
+        self._arm(addr)
+
+    def finish(self, addr):
+        """Records that the OVSDB server of addr is monitored."""
+        handshake = self._remove(addr)
+        if handshake is None:
+            return
+        latency = time.time() - handshake.accepted_at
+        self.latencies.append(latency)
+        self.stats['handshakes_completed'] += 1
+        LOG.debug("OVSDB server %(addr)s is monitored %(latency).3f "
+                  "seconds after its connection was accepted",
+                  {'addr': addr, 'latency': latency})
+
+    def abort(self, addr):
+        """Drops the handshake of addr, whose connection was closed."""
+        if self._remove(addr) is not None:
+            self.stats['handshakes_failed'] += 1
+
+    def __contains__(self, addr):
+        return addr in self._handshakes
+
+    def __len__(self):
+        return len(self._handshakes)
+
+    def latency_summary(self):
+        """Returns the accept to monitored latency, in seconds."""
+        if not self.latencies:
+            return {}
+        latencies = sorted(self.latencies)
+        return {'count': len(latencies),
+                'median': round(latencies[len(latencies) // 2], 3),
+                'p99': round(latencies[int(len(latencies) * 0.99)], 3),
+                'max': round(latencies[-1], 3)}
+
+    def _remove(self, addr):
+        handshake = self._handshakes.pop(addr, None)
+        if handshake is not None:
+            self.wheel.cancel((self, addr))
+            self._slots.release()
+        return handshake
+
+    def _arm(self, addr):
+        handshake = self._handshakes[addr]
+        self.wheel.schedule((self, addr), self.timeout,
+                            lambda: self._expire(addr, handshake))
+
+    def _expire(self, addr, handshake):
+        if self._handshakes.get(addr) is not handshake:
+            return
+        self._remove(addr)
+        self.stats['handshakes_expired'] += 1
+        LOG.warning(_LW("OVSDB server %(addr)s did not complete its "
+                        "handshake, %(state)s for %(timeout)d seconds"),
+                    {'addr': addr, 'state': handshake.state,
+                     'timeout': self.timeout})
+        self.on_expired(addr)
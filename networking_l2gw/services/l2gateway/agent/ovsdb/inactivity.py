@@ -0,0 +1,179 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import math
+import socket
+import time
+
+import eventlet
+from oslo_log import log as logging
+
+from networking_l2gw._i18n import _LE, _LW
+
+LOG = logging.getLogger(__name__)
+
+# Id of the echo requests sent to probe idle sessions, their replies are
+# not waited for.
+PROBE_ID = 'inactivity_probe'
+
+
+class TimerWheel(object):
+    """Runs many timers from a single greenthread.
+
+       A timer is put in one of the slots of the wheel according to its
+       deadline, rounded up to the tick, and the wheel moves to the next
+       slot every tick. Scheduling and cancelling a timer, and each tick,
+       therefore cost the same whatever the number of timers. Timers
+       further away than a turn of the wheel wait for as many turns as
+       needed. The callbacks are run in their own greenthreads.
+    """
+    def __init__(self, tick=1.0, slots=64):
+        self.tick = tick
+        # Each slot maps the key of a timer to [turns left, callback].
+        self._slots = [{} for _i in range(slots)]
+        self._current = 0
+        # Slot of each timer, by key.
+        self._timers = {}
+        self._thread = None
+
+    def schedule(self, key, delay, callback):
+        """Runs callback in delay seconds, replacing the timer of key."""
+        self.cancel(key)
+        ticks = max(int(math.ceil(delay / self.tick)), 1)
+        index = (self._current + ticks) % len(self._slots)
+        self._slots[index][key] = [(ticks - 1) // len(self._slots),
+                                   callback]
+        self._timers[key] = index
+        if self._thread is None:
+            self._thread = eventlet.spawn(self._run)
+
+    def cancel(self, key):
+        index = self._timers.pop(key, None)
+        if index is not None:
+            del self._slots[index][key]
+
+    def __len__(self):
+        return len(self._timers)
+
+    def _run(self):
+        next_tick = time.time() + self.tick
+        try:
+            while self._timers:
+                eventlet.sleep(max(next_tick - time.time(), 0))
+                next_tick += self.tick
+                self._advance()
+        finally:
+            self._thread = None
+
+    def _advance(self):
+        self._current = (self._current + 1) % len(self._slots)
+        slot = self._slots[self._current]
+        for key, timer in list(slot.items()):
+            if timer[0]:
+                timer[0] -= 1
+                continue
+            del slot[key]
+            del self._timers[key]
+            eventlet.spawn_n(timer[1])
+
+
+class InactivityProbes(object):
+    """Detects the OVSDB sessions which are no longer alive.
+
+       The time of the last message received on each session is recorded
+       by touch, which is cheap enough to be called for every read. A
+       session idle for interval seconds is sent an echo request through
+       send_probe. Any message received afterwards, the echo reply
+       included, proves that the session is alive. When max_missed probes
+       in a row went unanswered, on_dead is called with the address of
+       the session. A session for which is_busy returns True, because it
+       is not read while its messages wait to be processed, is left alone.
+    """
+    def __init__(self, wheel, interval, max_missed, send_probe, on_dead,
+                 is_busy=None):
+        self.wheel = wheel
+        self.interval = interval
+        self.max_missed = max_missed
+        self.send_probe = send_probe
+        self.on_dead = on_dead
+        self.is_busy = is_busy
+        # addr -> [time of the last message, probes sent since]
+        self._sessions = {}
+
+    def add(self, addr=None):
+        self._sessions[addr] = [time.time(), 0]
+        self._schedule(addr, self.interval)
+
+    def remove(self, addr=None):
+        if self._sessions.pop(addr, None) is not None:
+            self.wheel.cancel((self, addr))
+
+    def touch(self, addr=None):
+        session = self._sessions.get(addr)
+        if session is not None:
+            session[0] = time.time()
+            session[1] = 0
+
+    def __contains__(self, addr):
+        return addr in self._sessions
+
+    def _schedule(self, addr, delay):
+        self.wheel.schedule((self, addr), delay,
+                            lambda: self._check(addr))
+
+    def _check(self, addr):
+        session = self._sessions.get(addr)
+        if session is None:
+            return
+        if self.is_busy is not None and self.is_busy(addr):
+            self.touch(addr)
+        idle = time.time() - session[0]
+        if idle < self.interval:
+            self._schedule(addr, self.interval - idle)
+            return
+        if session[1] >= self.max_missed:
+            self.remove(addr)
+            LOG.warning(_LW("OVSDB server %(addr)s did not answer "
+                            "%(count)d echo requests, closing the "
+                            "connection"),
+                        {'addr': addr, 'count': session[1]})
+            self._call(self.on_dead, addr)
+            return
+        session[1] += 1
+        self._schedule(addr, self.interval)
+        self._call(self.send_probe, addr)
+
+    def _call(self, method, addr):
+        try:
+            method(addr)
+        except Exception as ex:
+            LOG.exception(_LE("Exception [%(ex)s] while probing the OVSDB "
+                              "server %(addr)s"), {'ex': ex, 'addr': addr})
+
+
+def enable_tcp_keepalive(sock, idle, interval, count):
+    """Has the kernel probe the idle TCP connection of sock.
+
+       The connection is closed after count probes, interval seconds
+       apart, are left unanswered, once it has been idle for idle
+       seconds. The options not supported by the platform are skipped.
+    """
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for name, value in (('TCP_KEEPIDLE', idle),
+                        ('TCP_KEEPINTVL', interval),
+                        ('TCP_KEEPCNT', count)):
+        option = getattr(socket, name, None)
+        if option is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, option, value)
@@ -14,6 +14,7 @@
 #    under the License.
 
 import os.path
+import time
 
 import eventlet
 
@@ -24,12 +25,15 @@ from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_service import loopingcall
 
-from networking_l2gw._i18n import _LE
+from networking_l2gw._i18n import _LE, _LI, _LW
 from networking_l2gw.services.l2gateway.agent import base_agent_manager
 from networking_l2gw.services.l2gateway.agent import l2gateway_config
+from networking_l2gw.services.l2gateway.agent.ovsdb import asyncio_engine
+from networking_l2gw.services.l2gateway.agent.ovsdb import cluster
+from networking_l2gw.services.l2gateway.agent.ovsdb import coalescer
+from networking_l2gw.services.l2gateway.agent.ovsdb import connection_state
 from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_common_class
-from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_monitor
-from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_writer
+from networking_l2gw.services.l2gateway.agent.ovsdb import writer_pool
 from networking_l2gw.services.l2gateway.common import constants as n_const
 
 LOG = logging.getLogger(__name__)
@@ -45,6 +49,12 @@ class OVSDBManager(base_agent_manager.BaseAgentManager):
         super(OVSDBManager, self).__init__(conf)
         self._extract_ovsdb_config(conf)
         self.enable_manager = cfg.CONF.ovsdb.enable_manager
+        self.plugin_rpc.compact_payload = (
+            cfg.CONF.ovsdb.compact_rpc_payload)
+        self.update_coalescer = coalescer.UpdateCoalescer(
+            self._send_ovsdb_changes,
+            cfg.CONF.ovsdb.update_coalescing_window,
+            cfg.CONF.ovsdb.update_coalescing_max_rows)
         if self.enable_manager:
             self.ovsdb_fd = None
             self._sock_open_connection()
@@ -53,6 +63,18 @@ class OVSDBManager(base_agent_manager.BaseAgentManager):
         else:
             self.looping_task = loopingcall.FixedIntervalLoopingCall(
                 self._connect_to_ovsdb_server)
+            self.writer_pool = writer_pool.OVSDBWriterPool(self.conf.ovsdb)
+            self.ovsdb_engine = self.conf.ovsdb.ovsdb_engine
+            if (self.ovsdb_engine == 'asyncio' and
+                    not asyncio_engine.is_supported()):
+                LOG.warning(_LW("The asyncio OVSDB engine requires Python "
+                                "3, using the eventlet engine"))
+                self.ovsdb_engine = 'eventlet'
+            self.connection_states = {}
+            # Time at which this agent started to monitor the OVSDB
+            # servers, and seconds it took until all of them were.
+            self.monitoring_started_at = None
+            self.time_to_all_monitored = None
 
     def _extract_ovsdb_config(self, conf):
         self.conf = conf or cfg.CONF
@@ -70,15 +92,32 @@ class OVSDBManager(base_agent_manager.BaseAgentManager):
 
     def _process_ovsdb_host(self, host):
         try:
-            host_splits = str(host).split(':')
+            host_splits = str(host).split(':', 2)
             ovsdb_identifier = str(host_splits[0]).strip()
-            ovsdb_conf = {n_const.OVSDB_IDENTIFIER: ovsdb_identifier,
-                          'ovsdb_ip': str(host_splits[1]).strip(),
-                          'ovsdb_port': str(host_splits[2]).strip()}
+            gateway = self.gateways.get(ovsdb_identifier)
+            if str(host_splits[1]).strip() == 'unix':
+                # name:unix:/path of an OVSDB server running on this host.
+                ovsdb_conf = {n_const.OVSDB_IDENTIFIER: ovsdb_identifier,
+                              'ovsdb_ip': (
+                                  l2gateway_config.UNIX_SOCKET_PREFIX +
+                                  str(host_splits[2]).strip()),
+                              'ovsdb_port': None}
+            else:
+                ovsdb_conf = {n_const.OVSDB_IDENTIFIER: ovsdb_identifier,
+                              'ovsdb_ip': str(host_splits[1]).strip(),
+                              'ovsdb_port': str(host_splits[2]).strip()}
+            if gateway is not None:
+                # Another member of a clustered OVSDB server.
+                gateway.add_endpoint(ovsdb_conf['ovsdb_ip'],
+                                     ovsdb_conf['ovsdb_port'])
+                LOG.debug("ovsdb_conf = %s", str(ovsdb_conf))
+                return
             priv_key_path = self.conf.ovsdb.l2_gw_agent_priv_key_base_path
             cert_path = self.conf.ovsdb.l2_gw_agent_cert_base_path
             ca_cert_path = self.conf.ovsdb.l2_gw_agent_ca_cert_base_path
-            use_ssl = priv_key_path and cert_path and ca_cert_path
+            # Local unix sockets are not encrypted.
+            use_ssl = (priv_key_path and cert_path and ca_cert_path and
+                       ovsdb_conf['ovsdb_port'] is not None)
             if use_ssl:
                 LOG.debug("ssl is enabled with priv_key_path %s, cert_path "
                           "%s, ca_cert_path %s", priv_key_path,
@@ -134,37 +173,119 @@ class OVSDBManager(base_agent_manager.BaseAgentManager):
         """Initializes the connection to the OVSDB servers."""
         ovsdb_states = {}
         if self.gateways and self.l2gw_agent_type == n_const.MONITOR:
-            for key in self.gateways.keys():
-                gateway = self.gateways.get(key)
-                ovsdb_fd = gateway.ovsdb_fd
-                if not (ovsdb_fd and ovsdb_fd.connected):
-                    LOG.debug("OVSDB server %s is disconnected",
-                              str(gateway.ovsdb_ip))
-                    try:
-                        ovsdb_fd = ovsdb_monitor.OVSDBMonitor(
-                            self.conf.ovsdb,
-                            gateway,
-                            self.agent_to_plugin_rpc)
-                    except Exception:
-                        ovsdb_states[key] = 'disconnected'
-                        # Log a warning and continue so that it can be
-                        # retried in the next iteration.
-                        LOG.error(_LE("OVSDB server %s is not "
-                                      "reachable"), gateway.ovsdb_ip)
-                        # Continue processing the next element in the list.
-                        continue
-                    gateway.ovsdb_fd = ovsdb_fd
-                    try:
-                        eventlet.greenthread.spawn_n(
-                            ovsdb_fd.set_monitor_response_handler)
-                    except Exception:
-                        raise SystemExit(Exception.message)
-                if ovsdb_fd and ovsdb_fd.connected:
-                    ovsdb_states[key] = 'connected'
+            # The gateways are connected to and monitored concurrently,
+            # at most connection_concurrency at a time.
+            pool = eventlet.GreenPool(self.conf.ovsdb.connection_concurrency)
+            keys = list(self.gateways.keys())
+            states = pool.imap(self._connect_to_gateway, keys,
+                               [self.gateways.get(key) for key in keys])
+            ovsdb_states = dict(zip(keys, states))
+            self._check_all_monitored(ovsdb_states)
+            self._report_dispatch_queue_depth(
+                [gateway.ovsdb_fd for gateway in self.gateways.values()])
         LOG.debug("Calling notify_ovsdb_states")
         self.plugin_rpc.notify_ovsdb_states(ctx.get_admin_context(),
                                             ovsdb_states)
 
+    def _check_all_monitored(self, ovsdb_states):
+        """Records when all the OVSDB servers are first monitored."""
+        if (self.time_to_all_monitored is not None or
+                self.monitoring_started_at is None):
+            return
+        if all(state == connection_state.CONNECTED
+               for state in ovsdb_states.values()):
+            self.time_to_all_monitored = round(
+                time.time() - self.monitoring_started_at, 3)
+            self.agent_state.get('configurations')[
+                'time_to_all_monitored'] = self.time_to_all_monitored
+            LOG.info(_LI("All %(count)d OVSDB servers are monitored, "
+                         "%(elapsed).1f seconds after startup"),
+                     {'count': len(ovsdb_states),
+                      'elapsed': self.time_to_all_monitored})
+
+    def _report_dispatch_queue_depth(self, connections):
+        """Reports the messages waiting to be processed by the agent."""
+        depth = sum(connection.dispatcher.queue_depth()
+                    for connection in connections if connection)
+        self.agent_state.get('configurations')[
+            'dispatch_queue_depth'] = depth
+        if depth:
+            LOG.debug("%d messages from the OVSDB servers are waiting to "
+                      "be processed", depth)
+
+    def _report_handshake_latency(self):
+        """Reports the time the OVSDB servers took to be monitored."""
+        latency = self.ovsdb_fd.handshakes.latency_summary()
+        if latency:
+            self.agent_state.get('configurations')[
+                'handshake_latency'] = latency
+
+    def _get_connection_state(self, ovsdb_identifier):
+        conn_state = self.connection_states.get(ovsdb_identifier)
+        if conn_state is None:
+            conn_state = connection_state.ConnectionState(
+                self.conf.ovsdb.connection_backoff_initial,
+                self.conf.ovsdb.connection_backoff_max)
+            self.connection_states[ovsdb_identifier] = conn_state
+        return conn_state
+
+    def _connect_to_gateway(self, ovsdb_identifier, gateway):
+        """Advances the connection state machine of an OVSDB server.
+
+           A single connection attempt is made when one is due, followed
+           by the setup of the monitor. After a failure, the server is
+           left alone for a backoff delay instead of being retried on the
+           spot, so an unreachable server does not hold up the periodic
+           task. Returns the connection state.
+        """
+        conn_state = self._get_connection_state(ovsdb_identifier)
+        ovsdb_fd = gateway.ovsdb_fd
+        if ovsdb_fd and ovsdb_fd.connected:
+            conn_state.set_connected()
+            return conn_state.state
+        if conn_state.state == connection_state.CONNECTED:
+            # The connection was lost since the previous pass.
+            conn_state.set_lost()
+        if not conn_state.is_due():
+            return conn_state.state
+        LOG.debug("OVSDB server %s is disconnected", str(gateway.ovsdb_ip))
+        conn_state.set_connecting()
+        try:
+            # The session is also used for the transactions to the OVSDB
+            # server, see _open_connection.
+            if self.ovsdb_engine == 'asyncio':
+                session_class = asyncio_engine.AsyncioOVSDBSession
+            else:
+                session_class = ovsdb_common_class.OVSDB_commom_class
+            ovsdb_fd = session_class(self.conf.ovsdb,
+                                     gateway,
+                                     self.agent_to_plugin_rpc,
+                                     connect_retries=0)
+            ovsdb_fd.compact_rows = self.plugin_rpc.can_send_compact_payload()
+        except Exception:
+            delay = conn_state.set_failed()
+            # Log an error so that it can be retried once the backoff
+            # delay has elapsed.
+            LOG.error(_LE("OVSDB server %(ip)s is not reachable, next "
+                          "attempt in %(delay).1f seconds"),
+                      {'ip': gateway.ovsdb_ip, 'delay': delay})
+            return conn_state.state
+        gateway.ovsdb_fd = ovsdb_fd
+        try:
+            ovsdb_fd.set_monitor_response_handler()
+        except Exception:
+            # The monitor is set up again on the next attempt.
+            if ovsdb_fd.connected:
+                ovsdb_fd.disconnect()
+        if not ovsdb_fd.connected:
+            delay = conn_state.set_failed()
+            LOG.error(_LE("Could not monitor OVSDB server %(ip)s, next "
+                          "attempt in %(delay).1f seconds"),
+                      {'ip': gateway.ovsdb_ip, 'delay': delay})
+            return conn_state.state
+        conn_state.set_connected()
+        return conn_state.state
+
     def handle_report_state_failure(self):
         # Not able to deliver the heart beats to the Neutron server.
         # Let us change the mode to Transact so that when the
@@ -181,6 +302,8 @@ class OVSDBManager(base_agent_manager.BaseAgentManager):
                 self._disconnect_all_ovsdb_servers()
 
     def _send_ovsdb_states(self):
+        self._report_dispatch_queue_depth([self.ovsdb_fd])
+        self._report_handshake_latency()
         self.plugin_rpc.notify_ovsdb_states(ctx.get_admin_context(),
                                             self.ovsdb_fd.ovsdb_fd_states)
 
@@ -190,6 +313,11 @@ class OVSDBManager(base_agent_manager.BaseAgentManager):
                 ovsdb_fd = gateway.ovsdb_fd
                 if ovsdb_fd and ovsdb_fd.connected:
                     gateway.ovsdb_fd.disconnect()
+                # The changes sent to the plugin until now may not have
+                # reached it, the next monitor sends all the rows again.
+                gateway.monitored_rows.clear()
+        # Another agent sends the changes once it becomes the monitor.
+        self.update_coalescer.clear()
 
     def set_monitor_agent(self, context, hostname):
         """Handle RPC call from plugin to update agent type.
@@ -240,6 +368,8 @@ class OVSDBManager(base_agent_manager.BaseAgentManager):
 
     def _start_looping_task(self):
         if not self.looping_task._running:
+            self.monitoring_started_at = time.time()
+            self.time_to_all_monitored = None
             self.looping_task.start(interval=self.conf.ovsdb.
                                     periodic_interval)
 
@@ -250,18 +380,24 @@ class OVSDBManager(base_agent_manager.BaseAgentManager):
                 self.conf.ovsdb,
                 gateway,
                 self.agent_to_plugin_rpc, self)
+            self.ovsdb_fd.compact_rows = (
+                self.plugin_rpc.can_send_compact_payload())
 
     @contextmanager
     def _open_connection(self, ovsdb_identifier):
-        ovsdb_fd = None
         gateway = self.gateways.get(ovsdb_identifier)
-        try:
-            ovsdb_fd = ovsdb_writer.OVSDBWriter(self.conf.ovsdb,
-                                                gateway)
+        ovsdb_fd = gateway and gateway.ovsdb_fd
+        if (ovsdb_fd and ovsdb_fd.connected and
+                cluster.can_write(ovsdb_fd, gateway)):
+            # A monitor agent transacts on the session it monitors the
+            # OVSDB server with, rather than opening another connection,
+            # unless it monitors a member of a cluster which is not the
+            # leader.
+            yield ovsdb_fd
+            return
+        with self.writer_pool.session(ovsdb_identifier,
+                                      gateway) as ovsdb_fd:
             yield ovsdb_fd
-        finally:
-            if ovsdb_fd:
-                ovsdb_fd.disconnect()
 
     def _is_valid_request(self, ovsdb_identifier):
         val_req = ovsdb_identifier and ovsdb_identifier in self.gateways.keys()
@@ -392,6 +528,9 @@ class OVSDBManager(base_agent_manager.BaseAgentManager):
                                                           op_method)
 
     def agent_to_plugin_rpc(self, activity, ovsdb_data):
+        self.update_coalescer.submit(activity, ovsdb_data)
+
+    def _send_ovsdb_changes(self, activity, ovsdb_data):
         self.plugin_rpc.update_ovsdb_changes(ctx.get_admin_context(),
                                              activity,
                                              ovsdb_data)
@@ -0,0 +1,268 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Monitoring of the hardware_vtep database.
+
+Only the columns read by the monitor, MONITORED_COLUMNS, are requested,
+whatever the monitor method.
+
+The OVSDB servers which support it are monitored with monitor_cond, so
+that the rows of the MAC tables are only sent for the logical switches
+bound to a port of the switch, which are those with L2 gateway
+connections. The condition is changed with monitor_cond_change when the
+bindings change. Until the bindings are known, when an OVSDB server is
+first monitored, the MAC tables are monitored whole, so that the initial
+update holds all the MACs, and the condition is narrowed once the reply
+is processed. Physical_Locator and Physical_Locator_Set have no
+logical switch column, they are monitored whole as the other tables.
+
+The notifications of a conditional monitor, update2, only carry the
+columns which changed. The monitored rows are kept in a MonitoredRows,
+which applies the changes to the columns in place and turns the
+notifications back into the old and new rows processed by the monitor.
+The modifications which leave the monitored columns unchanged are not
+processed.
+
+The OVSDB servers which keep a history of their transactions are
+monitored with monitor_cond_since, whose notifications, update3, also
+carry the id of the last transaction. When the agent reconnects, it
+asks for the changes made since that transaction, so that the monitored
+rows are brought up to date without the whole database being sent again.
+"""
+
+import collections
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import schema
+from networking_l2gw.services.l2gateway.common import constants as n_const
+
+MONITOR = 'monitor'
+MONITOR_COND = 'monitor_cond'
+MONITOR_COND_SINCE = 'monitor_cond_since'
+# Methods tried in turn, the next one being used when the OVSDB server
+# does not support a method.
+FALLBACK_METHODS = {MONITOR_COND_SINCE: MONITOR_COND,
+                    MONITOR_COND: MONITOR}
+# Id of the last transaction when none was seen.
+ZERO_TXN_ID = '00000000-0000-0000-0000-000000000000'
+# Monitor id of the conditional monitor of the hardware_vtep database.
+MONITOR_ID = n_const.OVSDB_SCHEMA_NAME
+
+MONITORED_TABLES = ('Logical_Switch', 'Physical_Switch', 'Physical_Port',
+                    'Ucast_Macs_Local', 'Ucast_Macs_Remote',
+                    'Physical_Locator', 'Mcast_Macs_Local',
+                    'Physical_Locator_Set')
+# Columns of the monitored tables read by the monitor. The other ones,
+# such as the statistics and other_config, are not sent by the OVSDB
+# server, so changes to them are not notified either.
+MONITORED_COLUMNS = {
+    'Logical_Switch': ('name', 'tunnel_key', 'description'),
+    'Physical_Switch': ('name', 'ports', 'tunnel_ips',
+                        'switch_fault_status'),
+    'Physical_Port': ('name', 'vlan_bindings', 'port_fault_status'),
+    'Ucast_Macs_Local': ('MAC', 'logical_switch', 'locator', 'ipaddr'),
+    'Ucast_Macs_Remote': ('MAC', 'logical_switch', 'locator', 'ipaddr'),
+    'Physical_Locator': ('dst_ip',),
+    'Mcast_Macs_Local': ('MAC', 'logical_switch', 'locator_set', 'ipaddr'),
+    'Physical_Locator_Set': ('locators',)}
+# Tables whose rows are only monitored for the connected logical switches.
+SCOPED_TABLES = ('Ucast_Macs_Local', 'Ucast_Macs_Remote',
+                 'Mcast_Macs_Local')
+
+# Types of the monitored columns, by table name.
+_column_types = {}
+
+
+def condition(switches):
+    """Returns the condition selecting the rows of the logical switches.
+
+       All the rows are selected if switches is None.
+    """
+    if switches is None:
+        return [True]
+    if not switches:
+        return [False]
+    return [['logical_switch', '==', ['uuid', switch]]
+            for switch in sorted(switches)]
+
+
+def monitor_request(op_id, method, switches=None, last_txn_id=None):
+    """Returns the request monitoring the hardware_vtep database.
+
+       monitor_cond_since asks for the changes made after the transaction
+       last_txn_id.
+    """
+    requests = {}
+    for table_name in MONITORED_TABLES:
+        request = {'columns': list(MONITORED_COLUMNS[table_name]),
+                   'select': {'initial': True,
+                              'insert': True,
+                              'delete': True,
+                              'modify': True}}
+        if method != MONITOR and table_name in SCOPED_TABLES:
+            request['where'] = condition(switches)
+        requests[table_name] = [request]
+    params = [n_const.OVSDB_SCHEMA_NAME,
+              None if method == MONITOR else MONITOR_ID,
+              requests]
+    if method == MONITOR_COND_SINCE:
+        params.append(last_txn_id or ZERO_TXN_ID)
+    return {'id': op_id,
+            'method': method,
+            'params': params}
+
+
+def condition_change_request(op_id, switches):
+    """Returns the request scoping the monitor to the logical switches."""
+    return {'id': op_id,
+            'method': 'monitor_cond_change',
+            'params': [MONITOR_ID, MONITOR_ID,
+                       dict((table_name, [{'where': condition(switches)}])
+                            for table_name in SCOPED_TABLES)]}
+
+
+def monitored_column_types(table_name):
+    """Returns the types of the monitored columns of a table."""
+    types = _column_types.get(table_name)
+    if types is None:
+        columns = schema.columns(table_name)
+        types = _column_types[table_name] = dict(
+            (column_name, columns[column_name])
+            for column_name in MONITORED_COLUMNS.get(table_name, ()))
+    return types
+
+
+def _atoms(value):
+    if isinstance(value, list) and value and value[0] == 'set':
+        return value[1]
+    return [value]
+
+
+def _hashable(atom):
+    # The uuids are sent as ["uuid", "<uuid>"].
+    return tuple(atom) if isinstance(atom, list) else atom
+
+
+def apply_diff(column_type, value, diff):
+    """Returns the value of a column modified by an update2 diff.
+
+       The diff of a column holding exactly one value is its new value.
+       The diff of a set holds the elements added or removed, the diff
+       of a map the pairs added or removed and the new value of the keys
+       whose value changed.
+    """
+    if column_type.is_map():
+        pairs = collections.OrderedDict(
+            (_hashable(key), [key, val]) for key, val in value[1])
+        for key, val in diff[1]:
+            pair = pairs.get(_hashable(key))
+            if pair is not None and pair[1] == val:
+                del pairs[_hashable(key)]
+            else:
+                pairs[_hashable(key)] = [key, val]
+        return ['map', list(pairs.values())]
+    if column_type.is_scalar():
+        return diff
+    atoms = collections.OrderedDict(
+        (_hashable(atom), atom) for atom in _atoms(value))
+    for atom in _atoms(diff):
+        if _hashable(atom) in atoms:
+            del atoms[_hashable(atom)]
+        else:
+            atoms[_hashable(atom)] = atom
+    if len(atoms) == 1:
+        return list(atoms.values())[0]
+    return ['set', list(atoms.values())]
+
+
+class MonitoredRows(object):
+    """The rows of a conditional monitor, as last notified.
+
+       The values of the columns are replaced, not modified, when they
+       change. They are shared with the rows handed out, which must not
+       be modified.
+
+       The notifications received before the reply to the monitor request
+       is processed are held in pending, with the id of their transaction,
+       so that they are processed after it.
+    """
+    def __init__(self, switches=None):
+        # Rows by table name and uuid.
+        self.rows = {}
+        # Logical switches the MAC tables are monitored for, None until
+        # the bindings of the ports are known.
+        self.switches = None if switches is None else frozenset(switches)
+        self.loaded = False
+        self.pending = []
+        # Id of the last transaction applied, for monitor_cond_since.
+        self.last_txn_id = None
+
+    def apply(self, table_updates2):
+        """Applies the table updates of an update2 notification.
+
+           Returns them as the table updates of an update notification,
+           with the new rows and the old values of the columns modified.
+        """
+        table_updates = {}
+        for table_name, row_updates in table_updates2.items():
+            rows = self.rows.setdefault(table_name, {})
+            column_types = monitored_column_types(table_name)
+            updates = {}
+            for uuid, row_update in row_updates.items():
+                update = self._apply_row(rows, column_types, uuid,
+                                         row_update)
+                if update is not None:
+                    updates[uuid] = update
+            if updates:
+                table_updates[table_name] = updates
+        return table_updates
+
+    def _apply_row(self, rows, column_types, uuid, row_update):
+        if 'initial' in row_update or 'insert' in row_update:
+            # The columns holding their default value are not sent.
+            row = dict((column_name, column_type.default())
+                       for column_name, column_type in column_types.items())
+            for column_name, value in (row_update.get('initial') or
+                                       row_update.get('insert') or
+                                       {}).items():
+                if column_name in column_types:
+                    row[column_name] = value
+            rows[uuid] = row
+            return {'new': dict(row)}
+        if 'delete' in row_update:
+            row = rows.pop(uuid, None)
+            return None if row is None else {'old': row}
+        row = rows.get(uuid)
+        if row is None:
+            return None
+        old_row = {}
+        for column_name, diff in row_update.get('modify', {}).items():
+            column_type = column_types.get(column_name)
+            if column_type is None:
+                continue
+            value = apply_diff(column_type, row[column_name], diff)
+            if value != row[column_name]:
+                old_row[column_name] = row[column_name]
+                row[column_name] = value
+        if not old_row:
+            return None
+        return {'old': old_row, 'new': dict(row)}
+
+    def connected_switches(self):
+        """Returns the logical switches bound to a port of the switch."""
+        switches = set()
+        for port in self.rows.get('Physical_Port', {}).values():
+            for _vlan, switch in port.get('vlan_bindings', ['map', []])[1]:
+                switches.add(switch[1])
+        return frozenset(switches)
@@ -0,0 +1,208 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import socket
+import ssl
+
+import eventlet
+from eventlet import hubs
+from eventlet import patcher
+from oslo_log import log as logging
+
+from networking_l2gw._i18n import _LE
+from networking_l2gw.services.l2gateway import exceptions
+
+# The green select module, which monkey patching installs, has no epoll.
+# The epoll object is waited on through the eventlet hub instead.
+select = patcher.original('select')
+
+LOG = logging.getLogger(__name__)
+WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK)
+
+
+def is_supported():
+    """Whether epoll is available on this platform."""
+    return hasattr(select, 'epoll')
+
+
+class Peer(object):
+    """A connection accepted from an OVSDB server."""
+    def __init__(self, addr, sock, msg_framer):
+        self.addr = addr
+        self.sock = sock
+        self.fileno = sock.fileno()
+        self.framer = msg_framer
+
+    def read(self):
+        """Returns the messages which can be read without blocking.
+
+           None is returned if the connection was closed by the peer.
+        """
+        self.sock.setblocking(False)
+        try:
+            messages = self.framer.recv(self.sock)
+            # Data already decrypted by SSL does not wake up epoll.
+            while messages is not None and _pending(self.sock):
+                more = self.framer.recv(self.sock)
+                if more is None:
+                    break
+                messages.extend(more)
+            return messages
+        except ssl.SSLWantReadError:
+            return []
+        except socket.error as ex:
+            if ex.errno in WOULD_BLOCK:
+                return []
+            raise
+        finally:
+            self.sock.setblocking(True)
+
+
+def _pending(sock):
+    pending = getattr(sock, 'pending', None)
+    return pending is not None and pending() > 0
+
+
+class Multiplexer(object):
+    """Services all the manager mode connections from a single loop.
+
+       The listening socket and the sockets of the OVSDB servers are
+       registered with one epoll object, and the loop only waits on
+       the epoll object itself through the eventlet hub. Accepted
+       connections are handed to connection._admit_peer, and received
+       messages go through connection._on_peer_messages. The messages it
+       returns are then queued to connection.dispatcher. A peer whose
+       queue is full is no longer polled until the queue has room again,
+       and the listening socket is not while too many handshakes are in
+       progress.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        # Peers indexed by address and by file descriptor.
+        self.peers = {}
+        self._peers_by_fileno = {}
+        self._epoll = select.epoll()
+        self._listener = None
+        self._running = False
+
+    def add_peer(self, addr, sock):
+        """Starts reading from the connection accepted from addr."""
+        self.remove_peer(addr)
+        peer = Peer(addr, sock, self.connection._get_framer(addr))
+        self._epoll.register(peer.fileno, select.EPOLLIN)
+        self.peers[addr] = peer
+        self._peers_by_fileno[peer.fileno] = peer
+        return peer
+
+    def remove_peer(self, addr):
+        """Stops reading from the connection of addr."""
+        peer = self.peers.pop(addr, None)
+        if peer is not None:
+            del self._peers_by_fileno[peer.fileno]
+            try:
+                self._epoll.unregister(peer.fileno)
+            except (IOError, OSError, ValueError):
+                # The socket has already been closed.
+                pass
+        return peer
+
+    def run(self, listener):
+        """Accepts and reads connections until stop is called."""
+        listener.setblocking(False)
+        self._listener = listener
+        self._epoll.register(listener.fileno(), select.EPOLLIN)
+        self._running = True
+        while self._running:
+            self._wait()
+            for fileno, _events in self._epoll.poll(0):
+                if fileno == listener.fileno():
+                    self._accept()
+                    continue
+                peer = self._peers_by_fileno.get(fileno)
+                if peer is not None:
+                    self._read(peer)
+
+    def stop(self):
+        self._running = False
+
+    def _wait(self):
+        hubs.trampoline(self._epoll.fileno(), read=True)
+
+    def _accept(self):
+        while True:
+            if not self.connection.handshakes.has_room():
+                self._pause_accept()
+                return
+            try:
+                c_sock, ip_addr = self._listener.accept()
+            except socket.error as ex:
+                if ex.errno in WOULD_BLOCK:
+                    return
+                LOG.exception(_LE("Exception [%s] occurred while accepting "
+                                  "a connection from an OVSDB server"), ex)
+                return
+            c_sock.setblocking(True)
+            try:
+                self.connection._admit_peer(c_sock, ip_addr[0])
+            except Exception as ex:
+                LOG.exception(_LE("Exception [%s] occurred while setting "
+                                  "up the connection of the OVSDB server "
+                                  "%s"), ex, ip_addr[0])
+                c_sock.close()
+
+    def _read(self, peer):
+        try:
+            messages = peer.read()
+        except (socket.error, exceptions.OVSDBError) as ex:
+            LOG.exception(_LE("Exception [%s] occurred while receiving "
+                              "message from the OVSDB server"), ex)
+            messages = None
+        if self.peers.get(peer.addr) is not peer:
+            # Replaced by a newer connection from the same address.
+            return
+        if messages is not None:
+            try:
+                messages = self.connection._on_peer_messages(peer.addr,
+                                                             messages)
+            except Exception as ex:
+                LOG.exception(_LE("Exception [%s] occurred while handling "
+                                  "message from the OVSDB server"), ex)
+                messages = None
+        if messages is None:
+            self.connection._on_peer_closed(peer.addr)
+            return
+        self.connection._on_activity(peer.addr)
+        self.connection.dispatcher.dispatch(peer.addr, messages)
+        if self.connection.dispatcher.is_full(peer.addr):
+            self._pause(peer)
+
+    def _pause(self, peer):
+        self._epoll.unregister(peer.fileno)
+        eventlet.spawn_n(self._resume, peer)
+
+    def _resume(self, peer):
+        self.connection.dispatcher.wait_for_room(peer.addr)
+        if self.peers.get(peer.addr) is peer:
+            self._epoll.register(peer.fileno, select.EPOLLIN)
+
+    def _pause_accept(self):
+        self._epoll.unregister(self._listener.fileno())
+        eventlet.spawn_n(self._resume_accept)
+
+    def _resume_accept(self):
+        self.connection.handshakes.wait_for_room()
+        if self._running:
+            self._epoll.register(self._listener.fileno(), select.EPOLLIN)
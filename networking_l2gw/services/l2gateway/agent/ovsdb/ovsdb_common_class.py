@@ -18,4 +18,20 @@ from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_writer
 
 
 class OVSDB_commom_class(ovsdb_monitor.OVSDBMonitor, ovsdb_writer.OVSDBWriter):
-    pass
+    """Monitors an OVSDB server and transacts on the same session.
+
+       When not in manager mode, the receive thread of the monitor reads
+       every message of the session: updates and echo requests go to
+       their handlers, and the replies to transactions are handed to the
+       callers waiting for them by request id. Up to transact_window
+       transactions are outstanding at once.
+    """
+    def _is_pipelined(self):
+        return not self.enable_manager
+
+    def _start_reader(self):
+        # The receive thread of the monitor reads the replies.
+        pass
+
+    def _process_response(self, op_id):
+        return ovsdb_writer.OVSDBWriter._process_response(self, op_id)
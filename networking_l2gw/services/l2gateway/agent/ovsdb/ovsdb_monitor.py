@@ -18,41 +18,89 @@ import random
 import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
-from oslo_serialization import jsonutils
 from oslo_utils import excutils
 
-from networking_l2gw._i18n import _LE
+from networking_l2gw._i18n import _LE, _LI, _LW
 from networking_l2gw.services.l2gateway.agent.ovsdb import base_connection
+from networking_l2gw.services.l2gateway.agent.ovsdb import cluster
+from networking_l2gw.services.l2gateway.agent.ovsdb import monitor_cond
+from networking_l2gw.services.l2gateway.agent.ovsdb import schema
 from networking_l2gw.services.l2gateway.common import constants as n_const
+from networking_l2gw.services.l2gateway.common import ovsdb_payload
 from networking_l2gw.services.l2gateway.common import ovsdb_schema
 from networking_l2gw.services.l2gateway import exceptions
 
 LOG = logging.getLogger(__name__)
 
 
+# Columns decoded by the handlers of the tables, in the order of their
+# values. The vlan bindings of the ports are only decoded when they change.
+_DECODED_COLUMNS = {
+    'Logical_Switch': ('name', 'tunnel_key', 'description'),
+    'Physical_Switch': ('name', 'ports', 'tunnel_ips', 'switch_fault_status'),
+    'Physical_Port': ('name', 'port_fault_status'),
+    'Ucast_Macs_Local': ('MAC', 'logical_switch', 'locator', 'ipaddr'),
+    'Ucast_Macs_Remote': ('MAC', 'logical_switch', 'locator', 'ipaddr'),
+    'Physical_Locator': ('dst_ip',),
+    'Mcast_Macs_Local': ('MAC', 'logical_switch', 'locator_set', 'ipaddr'),
+    'Physical_Locator_Set': ('locators',)}
+
+
 class Activity(object):
     Initial, Update = range(2)
 
 
 class OVSDBMonitor(base_connection.BaseConnection):
     """Monitors OVSDB servers."""
-    def __init__(self, conf, gw_config, callback, mgr=None):
-        super(OVSDBMonitor, self).__init__(conf, gw_config, mgr=None)
+    # Whether the plugin implements version 1.1 of the RPC API, see
+    # L2GatewayAgentApi.can_send_compact_payload.
+    compact_rows = False
+
+    def __init__(self, conf, gw_config, callback, mgr=None,
+                 connect_retries=None):
+        super(OVSDBMonitor, self).__init__(conf, gw_config, mgr=None,
+                                           connect_retries=connect_retries)
         self.mgr = mgr
         self.rpc_callback = callback
         self.callbacks = {}
         self._setup_dispatch_table()
         self.read_on = True
         self.handlers = {"echo": self._default_echo_handler}
+        if self.endpoint is not None:
+            # Updates of the role of the member of a clustered server.
+            self._set_handler("update", self._update_event_handler)
         self.sock_timeout = cfg.CONF.ovsdb.socket_timeout
+        # Monitor method accepted by the OVSDB servers and the rows of
+        # their conditional monitors, by address. The rows are kept when
+        # the connection is lost, so that only the changes missed are sent
+        # when the OVSDB server is monitored again. A new session is used
+        # after a reconnection in direct mode, the rows are kept in the
+        # configuration of the OVSDB server then, until the agent stops
+        # being the monitoring agent.
+        self.monitor_methods = {}
+        self.monitored_rows = ({} if self.enable_manager
+                               else gw_config.monitored_rows)
         if self.enable_manager:
             self.check_monitor_table_thread = False
         if not self.enable_manager:
             eventlet.greenthread.spawn(self._rcv_thread)
+            self._start_probing()
+
+    def _preferred_role(self):
+        if cfg.CONF.ovsdb.monitor_from_follower:
+            return cluster.FOLLOWER
+        return cluster.LEADER
 
     def _spawn_monitor_table_thread(self, addr):
-        self.set_monitor_response_handler(addr)
+        try:
+            self.set_monitor_response_handler(addr)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                # The OVSDB server connects again and is monitored then.
+                self._on_handshake_expired(addr)
+                self.handshakes.abort(addr)
         self.check_monitor_table_thread = True
+        self.handshakes.finish(addr)
 
     def _initialize_data_dict(self):
         data_dict = {'new_local_macs': [],
@@ -82,7 +130,16 @@ class OVSDBMonitor(base_connection.BaseConnection):
         return data_dict
 
     def _setup_dispatch_table(self):
+        # Decoders of the rows, built from the schema of the hardware_vtep
+        # database, by table name.
+        self.row_decoders = dict(
+            (table_name, schema.row_decoder(table_name, column_names))
+            for table_name, column_names in _DECODED_COLUMNS.items())
+        self.row_decoders['vlan_bindings'] = schema.row_decoder(
+            'Physical_Port', ('vlan_bindings',))
         self.dispatch_table = {'Logical_Switch': self._process_logical_switch,
+                               'Physical_Switch':
+                               self._process_physical_switch,
                                'Ucast_Macs_Local':
                                self._process_ucast_macs_local,
                                'Physical_Locator':
@@ -98,39 +155,84 @@ class OVSDBMonitor(base_connection.BaseConnection):
     def set_monitor_response_handler(self, addr=None):
         """Monitor OVSDB tables to receive events for any changes in OVSDB."""
         if self.connected:
-                op_id = str(random.getrandbits(128))
-                props = {'select': {'initial': True,
-                                    'insert': True,
-                                    'delete': True,
-                                    'modify': True}}
-                monitor_message = {'id': op_id,
-                                   'method': 'monitor',
-                                   'params': [n_const.OVSDB_SCHEMA_NAME,
-                                              None,
-                                              {'Logical_Switch': [props],
-                                               'Physical_Switch': [props],
-                                               'Physical_Port': [props],
-                                               'Ucast_Macs_Local': [props],
-                                               'Ucast_Macs_Remote': [props],
-                                               'Physical_Locator': [props],
-                                               'Mcast_Macs_Local': [props],
-                                               'Physical_Locator_Set': [props]}
-                                              ]}
                 self._set_handler("update", self._update_event_handler)
-                if not self.send(monitor_message, addr=addr):
-                    # Return so that this will retried in the next iteration
-                    return
+                self._set_handler("update2", self._update2_event_handler)
+                self._set_handler("update3", self._update3_event_handler)
                 try:
-                    response_result = self._process_response(op_id)
+                    method, response_result = self._monitor(addr)
                 except exceptions.OVSDBError:
                     with excutils.save_and_reraise_exception():
                         if self.enable_manager:
                             self.check_monitor_table_thread = False
                         LOG.exception(_LE("Exception while receiving the "
                                           "response for the monitor message"))
-                self._process_monitor_msg(response_result, addr)
+                if response_result is None:
+                    # Return so that this will retried in the next iteration
+                    return
+                if method == monitor_cond.MONITOR:
+                    self._process_monitor_msg(response_result, addr)
+                else:
+                    self._process_monitor_cond_msg(response_result, addr,
+                                                   method)
+
+    def _monitor(self, addr):
+        """Sends the monitor request, returns the method used and its reply.
+
+           monitor_cond_since is requested first, unless the OVSDB server
+           is known not to support it, then monitor_cond and monitor. None
+           is returned as reply if the request could not be sent.
+        """
+        method = self.monitor_methods.get(addr)
+        if method is None:
+            method = (monitor_cond.MONITOR_COND_SINCE
+                      if cfg.CONF.ovsdb.conditional_monitoring
+                      else monitor_cond.MONITOR)
+        while True:
+            switches, last_txn_id = None, None
+            if method == monitor_cond.MONITOR:
+                self.monitored_rows.pop(addr, None)
+            else:
+                rows = self._reset_monitored_rows(addr, method)
+                switches, last_txn_id = rows.switches, rows.last_txn_id
+            op_id = str(random.getrandbits(128))
+            self._register_request(op_id, addr)
+            if not self.send(monitor_cond.monitor_request(op_id, method,
+                                                          switches,
+                                                          last_txn_id),
+                             addr=addr):
+                self._cancel_request(op_id)
+                return method, None
+            response_result = self._response(op_id)
+            if (method != monitor_cond.MONITOR and response_result and
+                    response_result.get('error')):
+                LOG.info(_LI("OVSDB server %(addr)s does not support "
+                             "%(method)s: %(error)s"),
+                         {'addr': addr, 'method': method,
+                          'error': response_result['error']})
+                method = monitor_cond.FALLBACK_METHODS[method]
+                continue
+            self.monitor_methods[addr] = method
+            return method, self._check_response(response_result)
+
+    def _reset_monitored_rows(self, addr, method):
+        """Returns the rows of the monitor requested with method.
+
+           The rows kept from the previous connection are brought up to
+           date by monitor_cond_since, the other methods send them all.
+        """
+        rows = self.monitored_rows.get(addr)
+        if rows is None or method != monitor_cond.MONITOR_COND_SINCE:
+            rows = monitor_cond.MonitoredRows(rows.switches if rows
+                                              else None)
+            self.monitored_rows[addr] = rows
+        # Holds the notifications received before the reply is processed.
+        rows.loaded = False
+        rows.pending = []
+        return rows
 
     def _update_event_handler(self, message, addr):
+        if self._on_server_update(message):
+            return
         self._process_update_event(message, addr)
 
     def _process_update_event(self, message, addr):
@@ -144,37 +246,105 @@ class OVSDBMonitor(base_connection.BaseConnection):
             self.rpc_callback(Activity.Update,
                               self._form_ovsdb_data(data_dict, addr))
 
+    def _update2_event_handler(self, message, addr):
+        """Handles the notifications of the conditional monitor."""
+        params = message.get('params') or [None, {}]
+        self._on_update2(params[0], params[1], None, addr)
+
+    def _update3_event_handler(self, message, addr):
+        """Handles the notifications of monitor_cond_since.
+
+           They also carry the id of the transaction they notify.
+        """
+        params = message.get('params') or [None, None, {}]
+        self._on_update2(params[0], params[2], params[1], addr)
+
+    def _on_update2(self, monitor_id, table_updates2, txn_id, addr):
+        rows = self.monitored_rows.get(addr)
+        if rows is None or monitor_id != monitor_cond.MONITOR_ID:
+            return
+        if not rows.loaded:
+            # The reply to the monitor request is being processed.
+            rows.pending.append((table_updates2, txn_id))
+            return
+        self._process_update2_event(rows, table_updates2, addr, txn_id)
+
+    def _process_update2_event(self, rows, table_updates2, addr,
+                               txn_id=None):
+        LOG.debug("_process_update2_event: table_updates2 = %s ",
+                  str(table_updates2))
+        data_dict = self._initialize_data_dict()
+        self._process_tables(rows.apply(table_updates2), data_dict)
+        if txn_id is not None:
+            rows.last_txn_id = txn_id
+        self.rpc_callback(Activity.Update,
+                          self._form_ovsdb_data(data_dict, addr))
+        self._update_monitor_condition(rows, addr)
+
+    def _update_monitor_condition(self, rows, addr):
+        """Scopes the monitor to the logical switches bound to a port."""
+        switches = rows.connected_switches()
+        if switches == rows.switches:
+            return
+        rows.switches = switches
+        op_id = str(random.getrandbits(128))
+        self._register_request(op_id, addr)
+        if not self.send(monitor_cond.condition_change_request(op_id,
+                                                               switches),
+                         addr=addr):
+            self._cancel_request(op_id)
+            return
+        LOG.debug("Monitoring the MACs of %(count)d logical switches of "
+                  "the OVSDB server %(addr)s",
+                  {'count': len(switches), 'addr': addr})
+        # The reply is processed after the notification being processed.
+        eventlet.greenthread.spawn_n(self._check_condition_change, op_id,
+                                     addr)
+
+    def _check_condition_change(self, op_id, addr):
+        try:
+            self._process_response(op_id)
+        except exceptions.OVSDBError as ex:
+            LOG.warning(_LW("Could not change the logical switches "
+                            "monitored on the OVSDB server %(addr)s: "
+                            "%(ex)s"), {'addr': addr, 'ex': ex})
+
     def _process_tables(self, param_dict, data_dict):
         # Process all the tables one by one.
         # OVSDB table name is the key in the dictionary.
-        port_map = {}
-        for table_name in param_dict.keys():
-            table_dict = param_dict.get(table_name)
-            for uuid in table_dict.keys():
-                uuid_dict = table_dict.get(uuid)
-                if table_name == 'Physical_Switch':
-                    self._process_physical_switch(uuid,
-                                                  uuid_dict,
-                                                  port_map,
-                                                  data_dict)
-                elif table_name == 'Physical_Port':
+        # The ports of the switches are mapped first, so that the ports
+        # get their switch whatever the order the tables are processed in.
+        port_map = self._map_ports(param_dict.get('Physical_Switch', {}))
+        for table_name, table_dict in param_dict.items():
+            if table_name == 'Physical_Port':
+                for uuid, uuid_dict in table_dict.items():
                     self._process_physical_port(uuid, uuid_dict,
                                                 port_map, data_dict)
-                else:
-                    self.dispatch_table.get(table_name)(uuid, uuid_dict,
-                                                        data_dict)
+            else:
+                process_row = self.dispatch_table.get(table_name)
+                for uuid, uuid_dict in table_dict.items():
+                    process_row(uuid, uuid_dict, data_dict)
+
+    def _map_ports(self, switch_updates):
+        """Returns the switches of the ports, by port uuid."""
+        decode_row = self.row_decoders['Physical_Switch']
+        port_map = {}
+        for uuid, uuid_dict in switch_updates.items():
+            new_row = uuid_dict.get('new')
+            if new_row:
+                _name, ports, _tunnel_ips, _fault_status = decode_row(new_row)
+                for port in ports or ():
+                    port_map[port] = uuid
+        return port_map
 
     def _process_response(self, op_id):
-        result = self._response(op_id)
-        count = 0
-        while (not result and count <= n_const.MAX_RETRIES):
-            count = count + 1
-            eventlet.greenthread.sleep(0)
-            result = self._response(op_id)
-        if not result and count >= n_const.MAX_RETRIES:
+        return self._check_response(self._response(op_id))
+
+    def _check_response(self, result):
+        if not result:
             raise exceptions.OVSDBError(
-                message="OVSDB server did not respond within "
-                "max retry attempts.")
+                message="OVSDB server did not respond within %s "
+                "seconds." % self.response_timeout)
         error = result.get("error", None)
         if error:
             raise exceptions.OVSDBError(
@@ -191,58 +361,41 @@ class OVSDBMonitor(base_connection.BaseConnection):
         self.handlers[method_name] = handler
 
     def _on_remote_message(self, message, addr=None):
-        """Processes the message received on the socket."""
+        """Processes a message received on the socket."""
         try:
-            json_m = jsonutils.loads(message)
-            handler_method = json_m.get('method', None)
+            handler_method = message.get('method', None)
             if handler_method:
-                self.handlers.get(handler_method)(json_m, addr)
+                self.handlers.get(handler_method)(message, addr)
             else:
-                self.responses.append(json_m)
+                self._complete_request(message)
         except Exception as e:
             LOG.exception(_LE("Exception [%s] while handling "
                               "message"), e)
 
     def _rcv_thread(self):
-        chunks = []
-        lc = rc = 0
-        prev_char = None
+        msg_framer = self._get_framer()
+        if self.probes is None:
+            # self.socket.recv() is a blocked call
+            # (if timeout value is not passed) due to which we cannot
+            # determine if the remote OVSDB server has died. The remote
+            # OVSDB server sends echo requests every 4 seconds.
+            # If there is no echo request on the socket for socket_timeout
+            # seconds(by default its 30 seconds),
+            # the agent can safely assume that the connection with the
+            # remote OVSDB server is lost. Better to retry by reopening
+            # the socket. Otherwise the inactivity probes close the
+            # socket of a dead OVSDB server.
+            self.socket.settimeout(self.sock_timeout)
         while self.read_on:
             try:
-                # self.socket.recv() is a blocked call
-                # (if timeout value is not passed) due to which we cannot
-                # determine if the remote OVSDB server has died. The remote
-                # OVSDB server sends echo requests every 4 seconds.
-                # If there is no echo request on the socket for socket_timeout
-                # seconds(by default its 30 seconds),
-                # the agent can safely assume that the connection with the
-                # remote OVSDB server is lost. Better to retry by reopening
-                # the socket.
-                self.socket.settimeout(self.sock_timeout)
-                response = self.socket.recv(n_const.BUFFER_SIZE)
+                messages = msg_framer.recv(self.socket)
                 eventlet.greenthread.sleep(0)
-                if response:
-                    response = response.decode('utf8')
-                    message_mark = 0
-                    for i, c in enumerate(response):
-                        if c == '{' and not (prev_char and
-                                             prev_char == '\\'):
-                            lc += 1
-                        elif c == '}' and not (prev_char and
-                                               prev_char == '\\'):
-                            rc += 1
-                        if rc > lc:
-                            raise Exception(_LE("json string not valid"))
-                        elif lc == rc and lc is not 0:
-                            chunks.append(response[message_mark:i + 1])
-                            message = "".join(chunks)
-                            eventlet.greenthread.spawn_n(
-                                self._on_remote_message, message)
-                            lc = rc = 0
-                            message_mark = i + 1
-                            chunks = []
-                        prev_char = c
-                    chunks.append(response[message_mark:])
+                if messages is not None:
+                    self._on_activity()
+                    # The socket is not read while too many messages wait
+                    # to be processed.
+                    self.dispatcher.dispatch(None, messages)
+                    self.dispatcher.wait_for_room(None)
                 else:
                     self.read_on = False
                     self.disconnect()
@@ -268,90 +421,78 @@ class OVSDBMonitor(base_connection.BaseConnection):
         except Exception as e:
             LOG.exception(_LE("_process_monitor_msg:ERROR %s "), e)
 
+    def _process_monitor_cond_msg(self, message, addr=None,
+                                  method=monitor_cond.MONITOR_COND):
+        """Processes the reply to the conditional monitor request.
+
+           The reply to monitor_cond_since only holds the changes made
+           after the last transaction seen if the OVSDB server found it,
+           they are sent as an update. All the rows are sent otherwise.
+        """
+        rows = self.monitored_rows.get(addr)
+        if rows is None:
+            # The rows were forgotten while the reply was awaited, the
+            # OVSDB server is being disconnected.
+            return
+        data_dict = self._initialize_data_dict()
+        try:
+            activity = Activity.Initial
+            table_updates2 = message.get('result') or {}
+            if method == monitor_cond.MONITOR_COND_SINCE:
+                found, rows.last_txn_id, table_updates2 = table_updates2
+                if found:
+                    activity = Activity.Update
+                else:
+                    rows.rows = {}
+            self._process_tables(rows.apply(table_updates2 or {}),
+                                 data_dict)
+            self.rpc_callback(activity,
+                              self._form_ovsdb_data(data_dict, addr))
+            while rows.pending:
+                table_updates2, txn_id = rows.pending.pop(0)
+                self._process_update2_event(rows, table_updates2, addr,
+                                            txn_id)
+        except Exception as e:
+            LOG.exception(_LE("_process_monitor_msg:ERROR %s "), e)
+        rows.pending = []
+        rows.loaded = True
+        self._update_monitor_condition(rows, addr)
+
     def _get_list(self, resource_list):
         return [element.__dict__ for element in resource_list]
 
     def _form_ovsdb_data(self, data_dict, addr):
-        return {n_const.OVSDB_IDENTIFIER: str(addr) if (
-                self.enable_manager) else (self.gw_config.ovsdb_identifier),
-                'new_logical_switches': self._get_list(
-                    data_dict.get('new_logical_switches')),
-                'new_physical_switches': self._get_list(
-                    data_dict.get('new_physical_switches')),
-                'new_physical_ports': self._get_list(
-                    data_dict.get('new_physical_ports')),
-                'new_physical_locators': self._get_list(
-                    data_dict.get('new_physical_locators')),
-                'new_local_macs': self._get_list(
-                    data_dict.get('new_local_macs')),
-                'new_remote_macs': self._get_list(
-                    data_dict.get('new_remote_macs')),
-                'new_mlocal_macs': self._get_list(
-                    data_dict.get('new_mlocal_macs')),
-                'new_locator_sets': self._get_list(
-                    data_dict.get('new_locator_sets')),
-                'deleted_logical_switches': self._get_list(
-                    data_dict.get('deleted_logical_switches')),
-                'deleted_physical_switches': self._get_list(
-                    data_dict.get('deleted_physical_switches')),
-                'deleted_physical_ports': self._get_list(
-                    data_dict.get('deleted_physical_ports')),
-                'deleted_physical_locators': self._get_list(
-                    data_dict.get('deleted_physical_locators')),
-                'deleted_local_macs': self._get_list(
-                    data_dict.get('deleted_local_macs')),
-                'deleted_remote_macs': self._get_list(
-                    data_dict.get('deleted_remote_macs')),
-                'deleted_mlocal_macs': self._get_list(
-                    data_dict.get('deleted_mlocal_macs')),
-                'deleted_locator_sets': self._get_list(
-                    data_dict.get('deleted_locator_sets')),
-                'modified_logical_switches': self._get_list(
-                    data_dict.get('modified_logical_switches')),
-                'modified_physical_switches': self._get_list(
-                    data_dict.get('modified_physical_switches')),
-                'modified_physical_ports': self._get_list(
-                    data_dict.get('modified_physical_ports')),
-                'modified_physical_locators': self._get_list(
-                    data_dict.get('modified_physical_locators')),
-                'modified_local_macs': self._get_list(
-                    data_dict.get('modified_local_macs')),
-                'modified_remote_macs': self._get_list(
-                    data_dict.get('modified_remote_macs')),
-                'modified_mlocal_macs': self._get_list(
-                    data_dict.get('modified_mlocal_macs')),
-                'modified_locator_sets': self._get_list(
-                    data_dict.get('modified_locator_sets'))}
+        """Returns the OVSDB data of the kinds of rows which changed."""
+        if self.enable_manager:
+            ovsdb_identifier = str(addr)
+        else:
+            ovsdb_identifier = self.gw_config.ovsdb_identifier
+        ovsdb_data = {n_const.OVSDB_IDENTIFIER: ovsdb_identifier}
+        for section in ovsdb_payload.SECTIONS:
+            rows = data_dict.get(section)
+            if rows:
+                ovsdb_data[section] = self._get_list(rows)
+        return ovsdb_data
 
     def _process_physical_port(self, uuid, uuid_dict, port_map, data_dict):
         """Processes Physical_Port record from the OVSDB event."""
         new_row = uuid_dict.get('new', None)
         old_row = uuid_dict.get('old', None)
+        decode_row = self.row_decoders['Physical_Port']
         if new_row:
-            port_fault_status = new_row.get('port_fault_status')
-            if type(port_fault_status) is list:
-                port_fault_status = None
-            port = ovsdb_schema.PhysicalPort(uuid, new_row.get('name'), None,
-                                             None,
-                                             port_fault_status)
+            name, port_fault_status = decode_row(new_row)
+            port = ovsdb_schema.PhysicalPort(uuid, name, None, None,
+                                             _single_value(port_fault_status))
             switch_id = port_map.get(uuid, None)
             if switch_id:
                 port.physical_switch_id = switch_id
-            # Update the vlan bindings
-            outer_binding_list = new_row.get('vlan_bindings')
-            # First element is "map"
-            outer_binding_list.remove(outer_binding_list[0])
-            vlan_bindings = []
-            if len(outer_binding_list) > 0:
-                for binding in outer_binding_list:
-                    if len(binding) > 0:
-                        for element in binding:
-                            vlan = element[0]
-                            inner_most_list = element[1]
-                            ls_id = inner_most_list[1]
-                            vb = ovsdb_schema.VlanBinding(vlan, ls_id).__dict__
-                            vlan_bindings.append(vb)
-            port.vlan_bindings = vlan_bindings
+            if (self.compact_rows and old_row and
+                    'vlan_bindings' not in old_row):
+                # Only the changed columns are in the old row, the vlan
+                # bindings are left unchanged by the plugin.
+                port.vlan_bindings = None
+            else:
+                port.vlan_bindings = self._get_vlan_bindings(new_row)
             if old_row:
                 modified_physical_ports = data_dict.get(
                     'modified_physical_ports')
@@ -362,52 +503,29 @@ class OVSDBMonitor(base_connection.BaseConnection):
                 new_physical_ports.append(port)
         elif old_row:
             # Port is deleted permanently from OVSDB server
-            port_fault_status = old_row.get('port_fault_status')
-            if type(port_fault_status) is list:
-                port_fault_status = None
-            port = ovsdb_schema.PhysicalPort(uuid, old_row.get('name'), None,
-                                             None,
-                                             port_fault_status)
+            name, port_fault_status = decode_row(old_row)
+            port = ovsdb_schema.PhysicalPort(uuid, name, None, None,
+                                             _single_value(port_fault_status))
             deleted_physical_ports = data_dict.get('deleted_physical_ports')
             deleted_physical_ports.append(port)
 
-    def _process_physical_switch(self, uuid, uuid_dict, port_map, data_dict):
+    def _get_vlan_bindings(self, row):
+        vlan_bindings, = self.row_decoders['vlan_bindings'](row)
+        return [ovsdb_schema.VlanBinding(vlan, ls_id).__dict__
+                for vlan, ls_id in vlan_bindings or ()]
+
+    def _process_physical_switch(self, uuid, uuid_dict, data_dict):
         """Processes Physical_Switch record from the OVSDB event."""
         new_row = uuid_dict.get('new', None)
         old_row = uuid_dict.get('old', None)
+        decode_row = self.row_decoders['Physical_Switch']
         if new_row:
             # insert or modify operation
-            ports = new_row.get('ports')
-            # First element in the list is either 'set' or 'uuid'
-            # Let us remove it.
-            is_set = False
-            if ports[0] == 'set':
-                is_set = True
-            ports.remove(ports[0])
-            all_ports = []
-            if not is_set:
-                all_ports.append(ports[0])
-            else:
-                for port_list in ports:
-                    # each port variable is again list
-                    for port in port_list:
-                        for inner_port in port:
-                            if inner_port != 'uuid':
-                                all_ports.append(inner_port)
-            switch_fault_status = new_row.get('switch_fault_status')
-            if type(switch_fault_status) is list:
-                switch_fault_status = None
+            name, _ports, tunnel_ips, switch_fault_status = decode_row(
+                new_row)
             phys_switch = ovsdb_schema.PhysicalSwitch(
-                uuid, new_row.get('name'), new_row.get('tunnel_ips'),
-                switch_fault_status)
-            # Now, store mapping of physical ports to
-            # physical switch so that it is useful while
-            # processing Physical_Switch record
-            for port in all_ports:
-                port_map[port] = uuid
-                for pport in data_dict['new_physical_ports']:
-                    if pport.uuid == port:
-                        pport.physical_switch_id = uuid
+                uuid, name, self._tunnel_ip(tunnel_ips),
+                _single_value(switch_fault_status))
             if old_row:
                 modified_physical_switches = data_dict.get(
                     'modified_physical_switches')
@@ -419,25 +537,29 @@ class OVSDBMonitor(base_connection.BaseConnection):
         elif old_row:
             # Physical switch is deleted permanently from OVSDB
             # server
-            switch_fault_status = old_row.get('switch_fault_status')
-            if type(switch_fault_status) is list:
-                switch_fault_status = None
+            name, _ports, tunnel_ips, switch_fault_status = decode_row(
+                old_row)
             phys_switch = ovsdb_schema.PhysicalSwitch(
-                uuid, old_row.get('name'), old_row.get('tunnel_ips'),
-                switch_fault_status)
+                uuid, name, self._tunnel_ip(tunnel_ips),
+                _single_value(switch_fault_status))
             deleted_physical_switches = data_dict.get(
                 'deleted_physical_switches')
             deleted_physical_switches.append(phys_switch)
 
+    def _tunnel_ip(self, tunnel_ips):
+        if self.compact_rows or (tunnel_ips and len(tunnel_ips) == 1):
+            return _single_value(tunnel_ips)
+        # The plugins older than 1.1 take the OVSDB set of the tunnel ips
+        # when there is not exactly one.
+        return ['set', list(tunnel_ips or ())]
+
     def _process_logical_switch(self, uuid, uuid_dict, data_dict):
         """Processes Logical_Switch record from the OVSDB event."""
         new_row = uuid_dict.get('new', None)
         old_row = uuid_dict.get('old', None)
+        decode_row = self.row_decoders['Logical_Switch']
         if new_row:
-            l_switch = ovsdb_schema.LogicalSwitch(uuid,
-                                                  new_row.get('name'),
-                                                  new_row.get('tunnel_key'),
-                                                  new_row.get('description'))
+            l_switch = ovsdb_schema.LogicalSwitch(uuid, *decode_row(new_row))
             if old_row:
                 modified_logical_switches = data_dict.get(
                     'modified_logical_switches')
@@ -447,10 +569,7 @@ class OVSDBMonitor(base_connection.BaseConnection):
                     'new_logical_switches')
                 new_logical_switches.append(l_switch)
         elif old_row:
-            l_switch = ovsdb_schema.LogicalSwitch(uuid,
-                                                  old_row.get('name'),
-                                                  old_row.get('tunnel_key'),
-                                                  old_row.get('description'))
+            l_switch = ovsdb_schema.LogicalSwitch(uuid, *decode_row(old_row))
             deleted_logical_switches = data_dict.get(
                 'deleted_logical_switches')
             deleted_logical_switches.append(l_switch)
@@ -459,16 +578,10 @@ class OVSDBMonitor(base_connection.BaseConnection):
         """Processes Ucast_Macs_Local record from the OVSDB event."""
         new_row = uuid_dict.get('new', None)
         old_row = uuid_dict.get('old', None)
+        decode_row = self.row_decoders['Ucast_Macs_Local']
         if new_row:
-            locator_list = new_row.get('locator')
-            locator_id = locator_list[1]
-            logical_switch_list = new_row.get('logical_switch')
-            logical_switch_id = logical_switch_list[1]
             mac_local = ovsdb_schema.UcastMacsLocal(uuid,
-                                                    new_row.get('MAC'),
-                                                    logical_switch_id,
-                                                    locator_id,
-                                                    new_row.get('ipaddr'))
+                                                    *decode_row(new_row))
             if old_row:
                 modified_local_macs = data_dict.get(
                     'modified_local_macs')
@@ -479,11 +592,10 @@ class OVSDBMonitor(base_connection.BaseConnection):
                 new_local_macs.append(mac_local)
         elif old_row:
             # A row from UcastMacLocal is deleted.
-            logical_switch_list = old_row.get('logical_switch')
-            l_sw_id = logical_switch_list[1]
+            mac, logical_switch_id, _locator, _ipaddr = decode_row(old_row)
             mac_local = ovsdb_schema.UcastMacsLocal(uuid,
-                                                    old_row.get('MAC'),
-                                                    l_sw_id,
+                                                    mac,
+                                                    logical_switch_id,
                                                     None,
                                                     None)
             deleted_local_macs = data_dict.get(
@@ -494,16 +606,10 @@ class OVSDBMonitor(base_connection.BaseConnection):
         """Processes Ucast_Macs_Remote record from the OVSDB event."""
         new_row = uuid_dict.get('new', None)
         old_row = uuid_dict.get('old', None)
+        decode_row = self.row_decoders['Ucast_Macs_Remote']
         if new_row:
-            locator_list = new_row.get('locator')
-            locator_id = locator_list[1]
-            logical_switch_list = new_row.get('logical_switch')
-            logical_switch_id = logical_switch_list[1]
             mac_remote = ovsdb_schema.UcastMacsRemote(uuid,
-                                                      new_row.get('MAC'),
-                                                      logical_switch_id,
-                                                      locator_id,
-                                                      new_row.get('ipaddr'))
+                                                      *decode_row(new_row))
             if old_row:
                 modified_remote_macs = data_dict.get(
                     'modified_remote_macs')
@@ -513,11 +619,10 @@ class OVSDBMonitor(base_connection.BaseConnection):
                     'new_remote_macs')
                 new_remote_macs.append(mac_remote)
         elif old_row:
-            logical_switch_list = old_row.get('logical_switch')
-            l_sw_id = logical_switch_list[1]
+            mac, logical_switch_id, _locator, _ipaddr = decode_row(old_row)
             mac_remote = ovsdb_schema.UcastMacsRemote(uuid,
-                                                      old_row.get('MAC'),
-                                                      l_sw_id,
+                                                      mac,
+                                                      logical_switch_id,
                                                       None,
                                                       None)
             deleted_remote_macs = data_dict.get(
@@ -528,9 +633,9 @@ class OVSDBMonitor(base_connection.BaseConnection):
         """Processes Physical_Locator record from the OVSDB event."""
         new_row = uuid_dict.get('new', None)
         old_row = uuid_dict.get('old', None)
+        decode_row = self.row_decoders['Physical_Locator']
         if new_row:
-            dstip = new_row['dst_ip']
-            locator = ovsdb_schema.PhysicalLocator(uuid, dstip)
+            locator = ovsdb_schema.PhysicalLocator(uuid, *decode_row(new_row))
             if old_row:
                 modified_physical_locators = data_dict.get(
                     'modified_physical_locators')
@@ -540,8 +645,7 @@ class OVSDBMonitor(base_connection.BaseConnection):
                     'new_physical_locators')
                 new_physical_locators.append(locator)
         elif old_row:
-            dstip = old_row['dst_ip']
-            locator = ovsdb_schema.PhysicalLocator(uuid, dstip)
+            locator = ovsdb_schema.PhysicalLocator(uuid, *decode_row(old_row))
             deleted_physical_locators = data_dict.get(
                 'deleted_physical_locators')
             deleted_physical_locators.append(locator)
@@ -550,14 +654,10 @@ class OVSDBMonitor(base_connection.BaseConnection):
         """Processes Mcast_Macs_Local record from the OVSDB event."""
         new_row = uuid_dict.get('new', None)
         old_row = uuid_dict.get('old', None)
+        decode_row = self.row_decoders['Mcast_Macs_Local']
         if new_row:
-            locator_set_list = new_row.get('locator_set')
-            logical_switch_list = new_row.get('logical_switch')
             mcast_local = ovsdb_schema.McastMacsLocal(uuid,
-                                                      new_row['MAC'],
-                                                      logical_switch_list[1],
-                                                      locator_set_list[1],
-                                                      new_row['ipaddr'])
+                                                      *decode_row(new_row))
             if old_row:
                 modified_mlocal_macs = data_dict.get(
                     'modified_mlocal_macs')
@@ -567,11 +667,11 @@ class OVSDBMonitor(base_connection.BaseConnection):
                     'new_mlocal_macs')
                 new_mlocal_macs.append(mcast_local)
         elif old_row:
-            logical_switch_list = old_row.get('logical_switch')
-            l_sw_id = logical_switch_list[1]
+            mac, logical_switch_id, _locator_set, _ipaddr = decode_row(
+                old_row)
             mcast_local = ovsdb_schema.McastMacsLocal(uuid,
-                                                      old_row.get('MAC'),
-                                                      l_sw_id,
+                                                      mac,
+                                                      logical_switch_id,
                                                       None,
                                                       None)
             deleted_mlocal_macs = data_dict.get(
@@ -599,14 +699,14 @@ class OVSDBMonitor(base_connection.BaseConnection):
             deleted_locator_sets.append(locator_set)
 
     def _form_locator_set(self, uuid, row):
-        locators = []
-        locator_set_list = row.get('locators')
-        if locator_set_list[0] == 'set':
-            locator_set_list = locator_set_list[1]
-            for locator in locator_set_list:
-                locators.append(locator[1])
-        else:
-            locators.append(locator_set_list[1])
-        locator_set = ovsdb_schema.PhysicalLocatorSet(uuid,
-                                                      locators)
+        locators, = self.row_decoders['Physical_Locator_Set'](row)
+        locator_set = ovsdb_schema.PhysicalLocatorSet(uuid, locators or [])
         return locator_set
+
+
+def _single_value(values):
+    # The fault statuses and the tunnel ips are sent to the plugin when
+    # there is exactly one.
+    if values and len(values) == 1:
+        return values[0]
+    return None
@@ -13,11 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import random
 import socket
 
+import eventlet
+from eventlet import semaphore
+from oslo_config import cfg
 from oslo_log import log as logging
-from oslo_serialization import jsonutils
 from oslo_utils import excutils
 
 from networking_l2gw._i18n import _LE, _LW
@@ -31,12 +34,31 @@ LOG = logging.getLogger(__name__)
 
 class OVSDBWriter(base_connection.BaseConnection):
     """Performs transactions to OVSDB server tables."""
-    def __init__(self, conf, gw_config, mgr=None):
-        super(OVSDBWriter, self).__init__(conf, gw_config, mgr=None)
+    def __init__(self, conf, gw_config, mgr=None, connect_retries=None):
+        super(OVSDBWriter, self).__init__(conf, gw_config, mgr=None,
+                                          connect_retries=connect_retries)
         self.mgr = mgr
+        # Messages framed from the socket but not consumed yet.
+        self.pending_messages = collections.defaultdict(collections.deque)
+        # Transactions which can be outstanding on the connection at once.
+        self.transact_window = cfg.CONF.ovsdb.transact_window
+        self._window = semaphore.Semaphore(max(self.transact_window, 1))
+        self._reader = None
+
+    def disconnect(self, addr=None):
+        """disconnects the connection from the OVSDB server."""
+        self.pending_messages.pop(addr, None)
+        reader, self._reader = self._reader, None
+        if reader is not None and reader is not eventlet.getcurrent():
+            reader.kill()
+        super(OVSDBWriter, self).disconnect(addr)
 
     def _process_response(self, op_id):
         result = self._response(op_id)
+        if not result:
+            raise exceptions.OVSDBError(
+                message="OVSDB server did not respond within %s "
+                "seconds." % self.response_timeout)
         error = result.get("error", None)
         if error:
             raise exceptions.OVSDBError(
@@ -44,7 +66,7 @@ class OVSDBWriter(base_connection.BaseConnection):
                 )
         # Check errors in responses of all the subqueries
         outcomes = result.get("result", None)
-        if outcomes:
+        if isinstance(outcomes, list):
             for outcome in outcomes:
                 error = outcome.get("error", None)
                 if error:
@@ -55,20 +77,19 @@ class OVSDBWriter(base_connection.BaseConnection):
     def _get_reply(self, operation_id, ovsdb_identifier):
         count = 0
         while count <= n_const.MAX_RETRIES:
-            response = self._recv_data(ovsdb_identifier)
-            LOG.debug("Response from OVSDB server = %s", str(response))
-            if response:
+            json_m = self._recv_data(ovsdb_identifier)
+            LOG.debug("Response from OVSDB server = %s", str(json_m))
+            if json_m:
                 try:
-                    json_m = jsonutils.loads(response)
-                    self.responses.append(json_m)
                     method_type = json_m.get('method', None)
-                    if method_type == "echo" and self.enable_manager:
-                        self.ovsdb_dicts.get(ovsdb_identifier).send(
-                            jsonutils.dumps(
-                                {"result": json_m.get("params", None),
-                                 "error": None, "id": json_m['id']}))
-                    else:
-                        if self._process_response(operation_id):
+                    if method_type == "echo":
+                        self._echo_reply(json_m, ovsdb_identifier)
+                    elif method_type == "update":
+                        self._on_server_update(json_m)
+                    elif not method_type:
+                        self._complete_request(json_m)
+                        if (self._is_request_complete(operation_id) and
+                                self._process_response(operation_id)):
                             return True
                 except Exception as ex:
                     with excutils.save_and_reraise_exception():
@@ -76,17 +97,86 @@ class OVSDBWriter(base_connection.BaseConnection):
                                           "response for the write request:"
                                           " [%s]"), ex)
             count += 1
+        self._cancel_request(operation_id)
         with excutils.save_and_reraise_exception():
             LOG.error(_LE("Could not obtain response from the OVSDB server "
                           "for the request"))
 
+    def _echo_reply(self, message, ovsdb_identifier):
+        reply = {"result": message.get("params", None),
+                 "error": None, "id": message['id']}
+        if self.enable_manager:
+            self.send(reply, addr=ovsdb_identifier)
+        else:
+            # Pooled sessions stay open between transactions, so the
+            # inactivity probes of the server have to be answered too.
+            self.send(reply)
+
+    def _is_pipelined(self):
+        return self.transact_window > 1 and not self.enable_manager
+
+    def _start_reader(self):
+        if self._reader is None:
+            self._reader = eventlet.spawn(self._read_replies)
+
+    def _read_replies(self):
+        """Hands over the replies to pipelined requests to their callers.
+
+           Runs as long as the connection is open. The connection is
+           closed, and the outstanding requests failed, when the socket
+           can no longer be read.
+        """
+        while self.connected:
+            message = self._recv_data(None)
+            if message is None:
+                break
+            LOG.debug("Response from OVSDB server = %s", str(message))
+            method_type = message.get('method', None)
+            if method_type == "echo":
+                self._echo_reply(message, None)
+            elif method_type == "update":
+                self._on_server_update(message)
+            elif not method_type:
+                self._complete_request(message)
+        self._reader = None
+        if self.connected:
+            self.disconnect()
+
+    def _send_pipelined(self, query, operation_id, ovsdb_identifier):
+        # Up to transact_window requests are outstanding on the connection.
+        # The OVSDB server executes the requests of a connection in the
+        # order it receives them, so writes to the same rows are applied
+        # in the order the callers sent them.
+        with self._window:
+            self._register_request(operation_id, ovsdb_identifier)
+            sent = self.send(query, addr=ovsdb_identifier)
+            if not sent:
+                self._cancel_request(operation_id)
+                return
+            self._start_reader()
+            return self._process_response(operation_id)
+
     def _send_and_receive(self, query, operation_id, ovsdb_identifier,
                           rcv_required):
+        if rcv_required and self._is_pipelined():
+            self._send_pipelined(query, operation_id, ovsdb_identifier)
+            return
+        if rcv_required:
+            self._register_request(operation_id, ovsdb_identifier)
         if not self.send(query, addr=ovsdb_identifier):
+            self._cancel_request(operation_id)
             return
         if rcv_required:
             self._get_reply(operation_id, ovsdb_identifier)
 
+    def echo(self, ovsdb_identifier=None):
+        """Sends an echo request and waits for its reply."""
+        op_id = str(random.getrandbits(128))
+        query = {"method": "echo",
+                 "params": [],
+                 "id": op_id}
+        self._send_and_receive(query, op_id, ovsdb_identifier, True)
+
     def delete_logical_switch(self, logical_switch_uuid, ovsdb_identifier,
                               rcv_required=True):
         """Delete an entry from Logical_Switch OVSDB table."""
@@ -233,31 +323,18 @@ class OVSDBWriter(base_connection.BaseConnection):
         self._send_and_receive(query, op_id, ovsdb_identifier, rcv_required)
 
     def _recv_data(self, ovsdb_identifier):
-        chunks = []
-        lc = rc = 0
-        prev_char = None
-        while True:
+        addr = ovsdb_identifier if self.enable_manager else None
+        msg_framer = self._get_framer(addr)
+        pending_messages = self.pending_messages[addr]
+        while not pending_messages:
             try:
                 if self.enable_manager:
-                    response = self.ovsdb_dicts.get(ovsdb_identifier).recv(
-                        n_const.BUFFER_SIZE)
+                    messages = msg_framer.recv(
+                        self.ovsdb_dicts.get(ovsdb_identifier))
                 else:
-                    response = self.socket.recv(n_const.BUFFER_SIZE)
-                if response:
-                    response = response.decode('utf8')
-                    for i, c in enumerate(response):
-                        if c == '{' and not (prev_char and
-                                             prev_char == '\\'):
-                            lc += 1
-                        elif c == '}' and not (prev_char and
-                                               prev_char == '\\'):
-                            rc += 1
-                        if lc == rc and lc is not 0:
-                            chunks.append(response[0:i + 1])
-                            message = "".join(chunks)
-                            return message
-                        prev_char = c
-                    chunks.append(response)
+                    messages = msg_framer.recv(self.socket)
+                if messages is not None:
+                    pending_messages.extend(messages)
                 else:
                     LOG.warning(_LW("Did not receive any reply from the OVSDB "
                                     "server"))
@@ -266,6 +343,7 @@ class OVSDBWriter(base_connection.BaseConnection):
                 LOG.warning(_LW("Did not receive any reply from the OVSDB "
                                 "server"))
                 return
+        return pending_messages.popleft()
 
     def _get_bindings_to_update(self, l_switch_dict, locator_dicts,
                                 mac_dicts, port_dicts, op_method):
@@ -0,0 +1,219 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Column types of the hardware_vtep database.
+
+The types are read from the vtep.ovsschema file shipped with the agent.
+They tell how the values of the columns are encoded in the OVSDB
+protocol: a column holding exactly one value is sent as an atom, the
+other ones as a set or a map. A set of one element is also sent as an
+atom.
+
+The decoders of the columns, chosen from their type, turn their values
+into Python values: the uuids into strings, the sets into lists, the
+maps into lists of (key, value) pairs and the values of the columns
+holding at most one value into that value or None. The function decoding
+the rows of a table is generated once for each tuple of columns.
+"""
+
+import copy
+import json
+import os.path
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'vtep', 'vtep.ovsschema')
+
+_ATOM_DEFAULTS = {'integer': 0,
+                  'real': 0.0,
+                  'boolean': False,
+                  'string': '',
+                  'uuid': ['uuid', '00000000-0000-0000-0000-000000000000']}
+
+_tables = None
+# Decoders of the rows, by table name and tuple of column names.
+_decoders = {}
+
+
+class ColumnType(object):
+    """Type of a column of the database."""
+
+    def __init__(self, type_json):
+        if not isinstance(type_json, dict):
+            type_json = {'key': type_json}
+        self.key = _atomic_type(type_json['key'])
+        self.value = None
+        if 'value' in type_json:
+            self.value = _atomic_type(type_json['value'])
+        self.n_min = type_json.get('min', 1)
+        n_max = type_json.get('max', 1)
+        self.n_max = float('inf') if n_max == 'unlimited' else n_max
+
+    def is_map(self):
+        return self.value is not None
+
+    def is_scalar(self):
+        """Whether the column holds exactly one value."""
+        return self.n_min == 1 and self.n_max == 1 and not self.is_map()
+
+    def default(self):
+        """Returns the value of the column in a new row."""
+        if self.is_map():
+            return ['map', []]
+        if self.is_scalar():
+            return copy.deepcopy(_ATOM_DEFAULTS[self.key])
+        return ['set', []]
+
+
+def _atomic_type(atomic_json):
+    if isinstance(atomic_json, dict):
+        return atomic_json['type']
+    return atomic_json
+
+
+def tables():
+    """Returns the column types of the tables, by table and column name."""
+    global _tables
+    if _tables is None:
+        with open(SCHEMA_FILE) as schema_file:
+            schema = json.load(schema_file)
+        _tables = dict(
+            (table_name, dict((column_name, ColumnType(column['type']))
+                              for column_name, column in
+                              table['columns'].items()))
+            for table_name, table in schema['tables'].items())
+    return _tables
+
+
+def columns(table_name):
+    return tables().get(table_name, {})
+
+
+def _uuid(atom):
+    # The uuids are sent as ["uuid", "<uuid>"].
+    return atom[1]
+
+
+def _same(atom):
+    return atom
+
+
+# The decoders of the sets and the maps of the columns, by type of atom.
+# A set of one element is sent as the element, the atoms which are not
+# uuids are not lists.
+
+def _decode_set(value):
+    if isinstance(value, list):
+        return value[1]
+    return [value]
+
+
+def _decode_uuid_set(value):
+    if value[0] == 'set':
+        return [atom[1] for atom in value[1]]
+    return [value[1]]
+
+
+def _decode_optional(value):
+    if isinstance(value, list):
+        return value[1][0] if value[1] else None
+    return value
+
+
+def _decode_optional_uuid(value):
+    if value[0] == 'set':
+        return value[1][0][1] if value[1] else None
+    return value[1]
+
+
+def _decode_uuid_map(value):
+    return [(key, val[1]) for key, val in value[1]]
+
+
+def _map_decoder(decode_key, decode_value):
+    if decode_key is _same and decode_value is _uuid:
+        return _decode_uuid_map
+
+    def decode(value):
+        return [(decode_key(key), decode_value(val))
+                for key, val in value[1]]
+    return decode
+
+
+def _atom_decoder(atom_type):
+    return _uuid if atom_type == 'uuid' else _same
+
+
+def decoder(column_type):
+    """Returns the function decoding the values of a column type.
+
+       None is returned for the columns whose values are not changed by
+       the decoding, the strings, numbers and booleans.
+    """
+    decode_key = _atom_decoder(column_type.key)
+    if column_type.is_map():
+        return _map_decoder(decode_key, _atom_decoder(column_type.value))
+    if column_type.is_scalar():
+        return None if decode_key is _same else decode_key
+    if column_type.n_max == 1:
+        return (_decode_optional_uuid if decode_key is _uuid
+                else _decode_optional)
+    return _decode_uuid_set if decode_key is _uuid else _decode_set
+
+
+def row_decoder(table_name, column_names):
+    """Returns the function decoding the columns of the rows of a table.
+
+       The function returns the tuple of the decoded values of the
+       columns of column_names, None for those which are not in the row.
+       The decoders are built once for each table and tuple of columns.
+    """
+    row_decoders = _decoders.get(table_name)
+    if row_decoders is None:
+        row_decoders = _decoders[table_name] = {}
+    decode_row = row_decoders.get(column_names)
+    if decode_row is None:
+        decode_row = row_decoders[column_names] = _row_decoder(
+            columns(table_name), column_names)
+    return decode_row
+
+
+def _row_decoder(column_types, column_names):
+    # The function is generated with the expression decoding each column,
+    # the uuids of the columns holding exactly one being decoded inline.
+    # The rows holding all the columns are decoded by a single expression,
+    # the other ones, such as the old rows of the modifications, column
+    # by column.
+    namespace = {}
+    values = []
+    for column_name in column_names:
+        value = 'row[%r]' % column_name
+        decode = decoder(column_types[column_name])
+        if decode is _uuid:
+            value += '[1]'
+        elif decode is not None:
+            decode_name = '_decode_%d' % len(namespace)
+            namespace[decode_name] = decode
+            value = '%s(%s)' % (decode_name, value)
+        values.append((column_name, value))
+    lines = ['def decode_row(row):',
+             '    try:',
+             '        return (%s,)' % ', '.join(
+                 value for _column_name, value in values),
+             '    except KeyError:',
+             '        return (%s,)' % ', '.join(
+                 '%s if %r in row else None' % (value, column_name)
+                 for column_name, value in values)]
+    exec('\n'.join(lines), namespace)
+    return namespace['decode_row']
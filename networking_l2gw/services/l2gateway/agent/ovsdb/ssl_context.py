@@ -0,0 +1,124 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import os
+import ssl
+import time
+
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+def _files_signature(paths):
+    """Identifies the version on disk of the files at paths.
+
+       Raises OSError if one of them does not exist.
+    """
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append((stat.st_ino, stat.st_size, stat.st_mtime))
+    return tuple(signature)
+
+
+def _create_context(private_key, certificate, ca_cert, server_side):
+    # Negotiates the highest TLS version supported by both ends.
+    context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+    context.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3
+    context.load_cert_chain(certificate, private_key)
+    context.load_verify_locations(ca_cert)
+    if server_side:
+        # The OVSDB servers are not asked for a certificate.
+        context.verify_mode = ssl.CERT_NONE
+    else:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_REQUIRED
+    return context
+
+
+class SSLContextCache(object):
+    """Caches the SSL contexts of the OVSDB servers.
+
+       A context is built once per ovsdb_identifier, and again only when
+       its key, certificate or CA certificate file changes on disk. The
+       TLS session of the last connection to each OVSDB server is kept so
+       that the next connection resumes it instead of running a full
+       handshake. The stats counter holds the number of contexts loaded,
+       of handshakes, of resumed handshakes and the total seconds spent
+       in handshakes.
+    """
+    def __init__(self):
+        self._contexts = {}
+        self._sessions = {}
+        self.stats = collections.Counter()
+
+    def get_context(self, ovsdb_identifier, private_key, certificate,
+                    ca_cert, server_side=False):
+        """Returns the SSL context to use with ovsdb_identifier.
+
+           Raises IOError or OSError if one of the files is missing.
+        """
+        signature = _files_signature((private_key, certificate, ca_cert))
+        key = (ovsdb_identifier, server_side)
+        cached = self._contexts.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        LOG.debug("Loading the SSL context of the OVSDB server %s",
+                  ovsdb_identifier)
+        context = _create_context(private_key, certificate, ca_cert,
+                                  server_side)
+        self._contexts[key] = (signature, context)
+        # Sessions cannot be resumed with another context.
+        self._sessions.pop(ovsdb_identifier, None)
+        self.stats['context_loads'] += 1
+        return context
+
+    def wrap_socket(self, sock, ovsdb_identifier, private_key, certificate,
+                    ca_cert, server_side=False):
+        """Wraps sock, whose handshake is left to the handshake method."""
+        context = self.get_context(ovsdb_identifier, private_key,
+                                   certificate, ca_cert, server_side)
+        kwargs = {}
+        session = self._sessions.get(ovsdb_identifier)
+        if session is not None and not server_side:
+            kwargs['session'] = session
+        return context.wrap_socket(sock, server_side=server_side,
+                                   do_handshake_on_connect=False, **kwargs)
+
+    def handshake(self, ovsdb_identifier, ssl_sock):
+        """Runs the handshake of ssl_sock and records its latency."""
+        start = time.time()
+        ssl_sock.do_handshake()
+        elapsed = time.time() - start
+        self.stats['handshakes'] += 1
+        self.stats['handshake_seconds'] += elapsed
+        resumed = bool(getattr(ssl_sock, 'session_reused', False))
+        if resumed:
+            self.stats['resumed_handshakes'] += 1
+        LOG.debug("TLS handshake with the OVSDB server %(id)s took "
+                  "%(elapsed).3f seconds, resumed: %(resumed)s",
+                  {'id': ovsdb_identifier, 'elapsed': elapsed,
+                   'resumed': resumed})
+
+    def save_session(self, ovsdb_identifier, ssl_sock):
+        """Keeps the TLS session of ssl_sock for the next connection.
+
+           Python older than 3.6 cannot resume sessions.
+        """
+        session = getattr(ssl_sock, 'session', None)
+        if session is not None:
+            self._sessions[ovsdb_identifier] = session
@@ -0,0 +1,223 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+from contextlib import contextmanager
+import time
+
+import eventlet
+from eventlet import semaphore
+from oslo_log import log as logging
+from oslo_service import loopingcall
+from oslo_utils import excutils
+
+from networking_l2gw._i18n import _LW
+from networking_l2gw.services.l2gateway.agent.ovsdb import cluster
+from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_writer
+from networking_l2gw.services.l2gateway import exceptions
+
+LOG = logging.getLogger(__name__)
+
+# Retries to connect a writer session. The transactions are made on behalf
+# of the plugin, which waits for them, so an unreachable OVSDB server is
+# given up on after a few seconds instead of being retried with the long
+# backoff of the monitor.
+WRITER_CONNECT_RETRIES = 2
+
+
+class OVSDBWriterPool(object):
+    """Pool of long-lived writer sessions, per OVSDB server.
+
+       A session is borrowed for the duration of a transaction and given
+       back afterwards, instead of opening a new connection (and possibly
+       a new TLS session) for every write. Sessions are created lazily,
+       kept alive with echo requests while they are idle and closed once
+       they have been idle for longer than the idle timeout.
+
+       When transactions are pipelined (transact_window greater than 1),
+       a single session per OVSDB server is shared by all the callers
+       instead, so that their writes reach the server in order.
+
+       The sessions to a clustered OVSDB server are connected to its
+       leader. They are replaced once the leadership has changed.
+    """
+    def __init__(self, conf):
+        self.conf = conf
+        self.size = conf.writer_pool_size
+        self.idle_timeout = conf.writer_pool_idle_timeout
+        self.pipelined = conf.transact_window > 1
+        self._idle_sessions = collections.defaultdict(collections.deque)
+        self._semaphores = collections.defaultdict(
+            lambda: semaphore.Semaphore(self.size))
+        # ovsdb_identifier -> [session, number of users, last use]
+        self._shared_sessions = {}
+        self._keepalive_task = None
+
+    @contextmanager
+    def session(self, ovsdb_identifier, gw_config):
+        """Borrows a connected writer session to an OVSDB server.
+
+           The session is returned to the pool when the block completes.
+           If the block raises, the session is closed because its state
+           on the wire is unknown.
+        """
+        if self.pipelined:
+            with self._shared_session(ovsdb_identifier,
+                                      gw_config) as ovsdb_fd:
+                yield ovsdb_fd
+            return
+        with self._semaphores[ovsdb_identifier]:
+            ovsdb_fd = self._acquire(ovsdb_identifier, gw_config)
+            try:
+                yield ovsdb_fd
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    self._close(ovsdb_fd)
+            else:
+                self._release(ovsdb_identifier, ovsdb_fd)
+
+    @contextmanager
+    def _shared_session(self, ovsdb_identifier, gw_config):
+        # Only one greenthread at a time may open the shared session.
+        with self._semaphores[ovsdb_identifier]:
+            shared = self._shared_sessions.get(ovsdb_identifier)
+            if not (shared and shared[0].connected and
+                    cluster.can_write(shared[0], gw_config)):
+                if shared and not shared[1]:
+                    self._close(shared[0])
+                shared = [self._connect(gw_config), 0, time.time()]
+                self._shared_sessions[ovsdb_identifier] = shared
+                self._start_keepalive_task()
+            shared[1] += 1
+        try:
+            yield shared[0]
+        finally:
+            # The other users of the session are not affected by a failed
+            # transaction, a broken session is replaced by the next user.
+            shared[1] -= 1
+            shared[2] = time.time()
+            if (not shared[1] and
+                    self._shared_sessions.get(ovsdb_identifier) is not shared):
+                # Replaced while in use, after a leadership change.
+                self._close(shared[0])
+
+    def _acquire(self, ovsdb_identifier, gw_config):
+        idle_sessions = self._idle_sessions[ovsdb_identifier]
+        now = time.time()
+        while idle_sessions:
+            ovsdb_fd, last_used = idle_sessions.pop()
+            if (ovsdb_fd.connected and now - last_used < self.idle_timeout
+                    and cluster.can_write(ovsdb_fd, gw_config)):
+                return ovsdb_fd
+            self._close(ovsdb_fd)
+        return self._connect(gw_config)
+
+    def _connect(self, gw_config):
+        return ovsdb_writer.OVSDBWriter(
+            self.conf, gw_config, connect_retries=WRITER_CONNECT_RETRIES)
+
+    def _release(self, ovsdb_identifier, ovsdb_fd):
+        idle_sessions = self._idle_sessions[ovsdb_identifier]
+        if not ovsdb_fd.connected or len(idle_sessions) >= self.size:
+            self._close(ovsdb_fd)
+            return
+        idle_sessions.append((ovsdb_fd, time.time()))
+        self._start_keepalive_task()
+
+    def _start_keepalive_task(self):
+        interval = self.conf.writer_pool_keepalive_interval
+        if self._keepalive_task or interval <= 0:
+            return
+        self._keepalive_task = loopingcall.FixedIntervalLoopingCall(
+            self._keepalive_idle_sessions)
+        self._keepalive_task.start(interval=interval, initial_delay=interval)
+
+    def _close(self, ovsdb_fd):
+        if ovsdb_fd.connected:
+            ovsdb_fd.disconnect()
+
+    def _echo(self, ovsdb_fd, ovsdb_identifier):
+        """Pings a session, giving up after response_timeout seconds.
+
+           The replies to the requests of a session which is not pipelined
+           are read from its socket without any timeout, an OVSDB server
+           which does not answer would hold the keepalive task forever.
+        """
+        timeout = exceptions.OVSDBError(
+            message="OVSDB server did not respond within %s seconds." %
+            self.conf.response_timeout)
+        with eventlet.Timeout(self.conf.response_timeout, timeout):
+            ovsdb_fd.echo(ovsdb_identifier)
+
+    def _keepalive_idle_sessions(self):
+        """Pings idle sessions and evicts the expired or broken ones."""
+        now = time.time()
+        for ovsdb_identifier, shared in list(self._shared_sessions.items()):
+            ovsdb_fd, users, last_used = shared
+            if users:
+                continue
+            if (not ovsdb_fd.connected or
+                    now - last_used >= self.idle_timeout):
+                del self._shared_sessions[ovsdb_identifier]
+                self._close(ovsdb_fd)
+                continue
+            try:
+                self._echo(ovsdb_fd, ovsdb_identifier)
+            except Exception:
+                LOG.warning(_LW("Writer session to OVSDB server %s did "
+                                "not answer the echo request"),
+                            ovsdb_identifier)
+                if self._shared_sessions.get(ovsdb_identifier) is shared:
+                    del self._shared_sessions[ovsdb_identifier]
+                # The session may have been borrowed while the echo was
+                # pending, its last user closes it then.
+                if not shared[1]:
+                    self._close(ovsdb_fd)
+        for ovsdb_identifier, idle_sessions in list(
+                self._idle_sessions.items()):
+            survivors = []
+            while idle_sessions:
+                ovsdb_fd, last_used = idle_sessions.popleft()
+                if not ovsdb_fd.connected:
+                    continue
+                if now - last_used >= self.idle_timeout:
+                    LOG.debug("Closing idle writer session to OVSDB "
+                              "server %s", ovsdb_identifier)
+                    self._close(ovsdb_fd)
+                    continue
+                try:
+                    self._echo(ovsdb_fd, ovsdb_identifier)
+                except Exception:
+                    LOG.warning(_LW("Writer session to OVSDB server %s did "
+                                    "not answer the echo request"),
+                                ovsdb_identifier)
+                    self._close(ovsdb_fd)
+                    continue
+                survivors.append((ovsdb_fd, last_used))
+            # Sessions released while the pings were in progress are
+            # more recent, keep them at the end of the queue.
+            idle_sessions.extendleft(reversed(survivors))
+
+    def close(self):
+        """Stops the keepalive task and closes every idle session."""
+        if self._keepalive_task:
+            self._keepalive_task.stop()
+            self._keepalive_task = None
+        for idle_sessions in self._idle_sessions.values():
+            while idle_sessions:
+                self._close(idle_sessions.pop()[0])
+        for shared in self._shared_sessions.values():
+            self._close(shared[0])
+        self._shared_sessions.clear()
@@ -23,7 +23,9 @@ from networking_l2gw._i18n import _
 OVSDB_OPTS = [
     cfg.StrOpt('ovsdb_hosts',
                default='host1:127.0.0.1:6632',
-               help=_("OVSDB server name:host/IP:port")),
+               help=_("OVSDB server name:host/IP:port or "
+                      "name:unix:path. The members of a clustered "
+                      "OVSDB server are listed under the same name")),
     cfg.StrOpt('l2_gw_agent_priv_key_base_path',
                help=_('L2 gateway agent private key')),
     cfg.StrOpt('l2_gw_agent_cert_base_path',
@@ -52,7 +54,144 @@ OVSDB_OPTS = [
     cfg.IntOpt('max_connection_retries',
                default=10,
                help=_('Maximum number of retries to open a socket '
-                      'with the OVSDB server'))
+                      'with the OVSDB server')),
+    cfg.IntOpt('response_timeout',
+               default=60,
+               help=_('Seconds to wait for the OVSDB server to reply to '
+                      'a request before giving up on it')),
+    cfg.IntOpt('writer_pool_size',
+               default=4,
+               help=_('Maximum number of writer sessions opened to each '
+                      'OVSDB server')),
+    cfg.IntOpt('writer_pool_idle_timeout',
+               default=300,
+               help=_('Seconds after which an unused writer session to an '
+                      'OVSDB server is closed')),
+    cfg.IntOpt('writer_pool_keepalive_interval',
+               default=4,
+               help=_('Interval in seconds between the echo requests sent '
+                      'on idle writer sessions. 0 disables them')),
+    cfg.IntOpt('transact_window',
+               default=1,
+               help=_('Maximum number of transactions outstanding at once '
+                      'on a writer session to an OVSDB server. Values '
+                      'greater than 1 pipeline the transactions on a '
+                      'single session per OVSDB server')),
+    cfg.IntOpt('recv_buffer_size',
+               default=8192,
+               help=_('Initial size in bytes of the receive buffer of each '
+                      'connection to an OVSDB server. The buffer grows '
+                      'when a message does not fit in it')),
+    cfg.IntOpt('connect_timeout',
+               default=10,
+               help=_('Seconds to wait for a connection to an OVSDB server '
+                      'to be established')),
+    cfg.IntOpt('connection_backoff_initial',
+               default=1,
+               help=_('Seconds to wait before the first retry to connect to '
+                      'an unreachable OVSDB server. The wait doubles with '
+                      'each failed attempt')),
+    cfg.IntOpt('connection_backoff_max',
+               default=60,
+               help=_('Maximum number of seconds to wait between two '
+                      'attempts to connect to an unreachable OVSDB server')),
+    cfg.IntOpt('connection_concurrency',
+               default=20,
+               help=_('Maximum number of OVSDB servers connected to and '
+                      'monitored at the same time')),
+    cfg.IntOpt('manager_worker_pool_size',
+               default=64,
+               help=_('Number of greenthreads processing the messages '
+                      'received from the OVSDB servers when enable_manager '
+                      'is True')),
+    cfg.IntOpt('dispatch_queue_size',
+               default=1000,
+               help=_('Maximum number of messages received from an OVSDB '
+                      'server which wait to be processed. The connection '
+                      'is not read while that many are waiting')),
+    cfg.IntOpt('inactivity_probe_interval',
+               default=5,
+               help=_('Seconds a connection to an OVSDB server can be idle '
+                      'before an echo request is sent to it. 0 disables '
+                      'the probes, and socket_timeout applies instead')),
+    cfg.IntOpt('max_missed_probes',
+               default=2,
+               help=_('Number of echo requests in a row an OVSDB server '
+                      'can leave unanswered before its connection is '
+                      'closed')),
+    cfg.BoolOpt('tcp_keepalive',
+                default=False,
+                help=_('Enable TCP keepalive on the connections to the '
+                       'OVSDB servers')),
+    cfg.IntOpt('tcp_keepalive_idle',
+               default=10,
+               help=_('Seconds a connection is idle before the first TCP '
+                      'keepalive probe is sent')),
+    cfg.IntOpt('tcp_keepalive_interval',
+               default=5,
+               help=_('Seconds between the TCP keepalive probes')),
+    cfg.IntOpt('tcp_keepalive_count',
+               default=3,
+               help=_('Number of unanswered TCP keepalive probes after '
+                      'which a connection is closed')),
+    cfg.StrOpt('ovsdb_engine',
+               default='eventlet',
+               choices=['eventlet', 'asyncio'],
+               help=_('Implementation of the sessions which monitor the '
+                      'OVSDB servers and carry the transactions to them '
+                      'when enable_manager is False. asyncio runs every '
+                      'session from an asyncio event loop in a separate '
+                      'thread and requires Python 3')),
+    cfg.BoolOpt('tcp_nodelay',
+                default=True,
+                help=_('Disable the Nagle algorithm on the TCP connections '
+                       'to the OVSDB servers, so that small requests are '
+                       'sent without delay')),
+    cfg.BoolOpt('tcp_cork',
+                default=False,
+                help=_('Cork the TCP connections to the OVSDB servers '
+                       'while a batch of messages is written, so that it '
+                       'is sent in as few segments as possible. Linux '
+                       'only')),
+    cfg.BoolOpt('monitor_from_follower',
+                default=False,
+                help=_('Monitor the clustered OVSDB servers from a '
+                       'follower rather than from the leader, which then '
+                       'only serves the transactions')),
+    cfg.IntOpt('max_concurrent_handshakes',
+               default=32,
+               help=_('Maximum number of OVSDB servers connecting in '
+                      'manager mode whose handshake is in progress. The '
+                      'other connections wait to be accepted')),
+    cfg.IntOpt('handshake_timeout',
+               default=30,
+               help=_('Seconds an OVSDB server connecting in manager mode '
+                      'has to complete each step of its handshake, the TLS '
+                      'handshake, its first echo request and the reply to '
+                      'the monitor request, before it is disconnected')),
+    cfg.BoolOpt('conditional_monitoring',
+                default=True,
+                help=_('Monitor the MAC tables of the OVSDB servers which '
+                       'support it only for the logical switches bound to '
+                       'their ports. The other servers are monitored '
+                       'whole. The servers supporting monitor_cond_since '
+                       'only send the changes missed on reconnection')),
+    cfg.FloatOpt('update_coalescing_window',
+                 default=0.2,
+                 help=_('Seconds the changes of an OVSDB server are '
+                        'gathered for before being sent to the plugin as '
+                        'one update. 0 sends each update at once')),
+    cfg.IntOpt('update_coalescing_max_rows',
+               default=1000,
+               help=_('Number of changed rows of an OVSDB server after '
+                      'which they are sent to the plugin without waiting '
+                      'for the end of update_coalescing_window')),
+    cfg.BoolOpt('compact_rpc_payload',
+                default=False,
+                help=_('Send the OVSDB changes to the plugin as columns '
+                       'and values instead of one dictionary per row. '
+                       'Enable it once every Neutron server runs a plugin '
+                       'which accepts the compact payload')),
 ]
 
 L2GW_OPTS = [
@@ -0,0 +1,95 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Payload of the update_ovsdb_changes RPC.
+
+The agent hands the plugin the rows of an OVSDB server which were
+created, modified or deleted, in lists named after the change and the
+kind of row, such as new_local_macs, each row being a dict. That is the
+version 1 payload.
+
+The version 2 payload, sent by the agents configured with
+compact_rpc_payload to the plugins implementing version 1.1 of the RPC
+API, only holds the kinds of rows which changed. The rows of each kind
+are sent as lists of values, in the order of the columns listed once for
+the kind:
+
+    {'version': 2,
+     'ovsdb_identifier': 'ovsdb1',
+     'tables': {'local_macs': {'columns': ['ipaddr', 'mac', ...],
+                               'new': [['10.0.0.1', 'fa:16:...', ...]],
+                               'deleted': [...]}}}
+
+The plugin decodes both versions into the version 1 format.
+"""
+
+from networking_l2gw.services.l2gateway.common import constants as n_const
+
+VERSION = 2
+
+ROW_KINDS = ('logical_switches', 'physical_switches', 'physical_ports',
+             'physical_locators', 'local_macs', 'remote_macs', 'mlocal_macs',
+             'locator_sets')
+NEW, MODIFIED, DELETED = 'new', 'modified', 'deleted'
+CHANGES = (NEW, MODIFIED, DELETED)
+
+
+def section(change, kind):
+    """Returns the name of a list of rows of the version 1 payload."""
+    return '%s_%s' % (change, kind)
+
+
+SECTIONS = tuple(section(change, kind)
+                 for change in CHANGES for kind in ROW_KINDS)
+
+
+def encode(ovsdb_data):
+    """Returns the version 2 payload of version 1 OVSDB data."""
+    tables = {}
+    for kind in ROW_KINDS:
+        changes = dict((change, ovsdb_data[section(change, kind)])
+                       for change in CHANGES
+                       if ovsdb_data.get(section(change, kind)))
+        if not changes:
+            continue
+        columns = sorted(set(column for rows in changes.values()
+                             for row in rows for column in row))
+        table = tables[kind] = {'columns': columns}
+        for change, rows in changes.items():
+            table[change] = [[row.get(column) for column in columns]
+                             for row in rows]
+    return {'version': VERSION,
+            n_const.OVSDB_IDENTIFIER: ovsdb_data.get(
+                n_const.OVSDB_IDENTIFIER),
+            'tables': tables}
+
+
+def decode(payload):
+    """Returns the version 1 OVSDB data of a payload of any version.
+
+       Only the lists of the rows which changed are returned.
+    """
+    if 'version' not in payload:
+        # Sent by an agent which does not encode the payload.
+        return payload
+    ovsdb_data = {n_const.OVSDB_IDENTIFIER: payload.get(
+        n_const.OVSDB_IDENTIFIER)}
+    for kind, table in payload.get('tables', {}).items():
+        columns = table['columns']
+        for change in CHANGES:
+            if table.get(change):
+                ovsdb_data[section(change, kind)] = [
+                    dict(zip(columns, values)) for values in table[change]]
+    return ovsdb_data
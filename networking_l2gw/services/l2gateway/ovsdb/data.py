@@ -17,6 +17,7 @@ from networking_l2gw._i18n import _LE
 from networking_l2gw.db.l2gateway import l2gateway_db
 from networking_l2gw.db.l2gateway.ovsdb import lib as db
 from networking_l2gw.services.l2gateway.common import constants as n_const
+from networking_l2gw.services.l2gateway.common import ovsdb_payload
 from networking_l2gw.services.l2gateway.common import ovsdb_schema
 from networking_l2gw.services.l2gateway.common import topics
 from networking_l2gw.services.l2gateway.common import tunnel_calls
@@ -36,7 +37,12 @@ LOG = logging.getLogger(__name__)
 class L2GatewayOVSDBCallbacks(object):
     """Implement the rpc call back functions from OVSDB."""
 
-    target = messaging.Target(version='1.0')
+    # 1.0 - Initial version
+    # 1.1 - update_ovsdb_changes accepts the compact payload of
+    #       ovsdb_payload.encode, the modified ports without their vlan
+    #       bindings when these did not change and the physical switches
+    #       without a tunnel ip
+    target = messaging.Target(version='1.1')
 
     def __init__(self, plugin):
         super(L2GatewayOVSDBCallbacks, self).__init__()
@@ -45,6 +51,7 @@ class L2GatewayOVSDBCallbacks(object):
 
     def update_ovsdb_changes(self, context, activity, ovsdb_data):
         """RPC to update the changes from OVSDB in the database."""
+        ovsdb_data = ovsdb_payload.decode(ovsdb_data)
         self.ovsdb = self.get_ovsdbdata_object(
             ovsdb_data.get(n_const.OVSDB_IDENTIFIER))
         self.ovsdb.update_ovsdb_changes(context, activity, ovsdb_data)
@@ -212,7 +219,9 @@ class OVSDBData(object):
         for physical_switch in new_physical_switches:
             ps_dict = physical_switch
             ps_dict[n_const.OVSDB_IDENTIFIER] = self.ovsdb_identifier
-            if (ps_dict.get('tunnel_ip'))[0] == 'set':
+            # The agents used to send the tunnel ips as an OVSDB set
+            # when there was not exactly one.
+            if isinstance(ps_dict.get('tunnel_ip'), list):
                 ps_dict['tunnel_ip'] = None
             p_switch = db.get_physical_switch(context, ps_dict)
             if not p_switch:
@@ -351,6 +360,9 @@ class OVSDBData(object):
             if modified_port:
                 db.update_physical_ports_status(context, pp_dict)
                 port_vlan_bindings = physical_port.get('vlan_bindings')
+                if port_vlan_bindings is None:
+                    # The vlan bindings of the port did not change.
+                    continue
                 vlan_bindings = db.get_all_vlan_bindings_by_physical_port(
                     context, pp_dict)
                 for vlan_binding in vlan_bindings:
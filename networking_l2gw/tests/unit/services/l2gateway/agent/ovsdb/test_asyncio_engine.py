@@ -0,0 +1,213 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os.path
+import shutil
+import tempfile
+
+import eventlet
+from eventlet.green import socket
+import mock
+import testtools
+
+from neutron.tests import base
+from oslo_config import cfg
+from oslo_serialization import jsonutils
+
+from networking_l2gw.services.l2gateway.agent import l2gateway_config as conf
+from networking_l2gw.services.l2gateway.agent.ovsdb import asyncio_engine
+from networking_l2gw.services.l2gateway.agent.ovsdb import framer
+from networking_l2gw.services.l2gateway.agent.ovsdb import inactivity
+from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_monitor
+from networking_l2gw.services.l2gateway.common import config
+from networking_l2gw.services.l2gateway.common import constants as n_const
+from networking_l2gw.services.l2gateway import exceptions
+
+
+def _encode(*messages):
+    return b''.join(jsonutils.dump_as_bytes(message) for message in messages)
+
+
+@testtools.skipIf(not asyncio_engine.is_supported(), 'requires asyncio')
+class TestOVSDBProtocol(base.BaseTestCase):
+    def setUp(self):
+        super(TestOVSDBProtocol, self).setUp()
+        self.loop = asyncio_engine.asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.notifications = []
+        self.on_close = mock.Mock()
+        self.protocol = asyncio_engine.OVSDBProtocol(
+            self.loop, self.notifications.append, self.on_close,
+            probe_interval=5, max_missed_probes=2)
+        self.transport = mock.Mock()
+        self.protocol.connection_made(self.transport)
+
+    def _written(self):
+        return [jsonutils.loads(call[0][0])
+                for call in self.transport.write.call_args_list]
+
+    def _run_pending(self):
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+
+    def test_request_reply(self):
+        """Test case to test the future of the reply to a request."""
+        request = {'method': 'transact', 'params': [], 'id': 'op1'}
+        future = self.protocol.request(request, 5)
+        self.assertEqual([request], self._written())
+        update = {'method': 'update', 'params': [None, {}], 'id': None}
+        reply = {'id': 'op1', 'result': [{}], 'error': None}
+        self.protocol.data_received(_encode(update, reply, update))
+        self.assertEqual(reply, self.loop.run_until_complete(future))
+        self._run_pending()
+        self.assertEqual([[update], [update]], self.notifications)
+
+    def test_echo_answered(self):
+        """Test case to test that echo requests are answered at once."""
+        self.protocol.data_received(_encode(
+            {'method': 'echo', 'params': [], 'id': 'echo'}))
+        self.assertEqual([{'result': [], 'error': None, 'id': 'echo'}],
+                         self._written())
+        self._run_pending()
+        self.assertEqual([], self.notifications)
+
+    def test_request_timeout(self):
+        """Test case to test a request which is not answered in time."""
+        future = self.protocol.request({'method': 'echo', 'params': [],
+                                        'id': 'op1'}, 0.01)
+        self.assertRaises(exceptions.OVSDBError,
+                          self.loop.run_until_complete, future)
+        self.assertEqual(1, self.protocol.stats['expired_requests'])
+        self.protocol.data_received(_encode({'id': 'op1', 'result': [],
+                                             'error': None}))
+        self.assertEqual(1, self.protocol.stats['unmatched_responses'])
+
+    def test_connection_lost(self):
+        """Test case to test the requests failed by a disconnection."""
+        future = self.protocol.request({'method': 'echo', 'params': [],
+                                        'id': 'op1'})
+        self.protocol.connection_lost(None)
+        self.assertRaises(exceptions.OVSDBError,
+                          self.loop.run_until_complete, future)
+        self.assertTrue(self.on_close.called)
+        self.assertFalse(self.protocol.write({'id': 'op2'}))
+
+    def test_inactivity_probes(self):
+        """Test case to test the probes of an idle connection."""
+        now = self.protocol._last_received + 100
+        with mock.patch.object(self.loop, 'time', return_value=now):
+            self.protocol._check_idle()
+            self.protocol._check_idle()
+            self.assertEqual([inactivity.PROBE_ID] * 2,
+                             [message['id'] for message in self._written()])
+            self.assertFalse(self.transport.abort.called)
+            with mock.patch.object(asyncio_engine.LOG, 'warning'):
+                self.protocol._check_idle()
+            self.assertTrue(self.transport.abort.called)
+
+    def test_paused_connection_not_probed(self):
+        """Test case to test that a paused connection is not probed."""
+        self.protocol.pause_reading()
+        self.assertTrue(self.transport.pause_reading.called)
+        now = self.protocol._last_received + 100
+        with mock.patch.object(self.loop, 'time', return_value=now):
+            self.protocol._check_idle()
+        self.assertEqual([], self._written())
+        self.protocol.resume_reading()
+        self.assertTrue(self.transport.resume_reading.called)
+
+
+@testtools.skipIf(not asyncio_engine.is_supported(), 'requires asyncio')
+class TestAsyncioOVSDBSession(base.BaseTestCase):
+    def setUp(self):
+        super(TestAsyncioOVSDBSession, self).setUp()
+        config.register_ovsdb_opts_helper(cfg.CONF)
+        cfg.CONF.set_override('response_timeout', 5, 'ovsdb')
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        sock_path = os.path.join(path, 'db.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(sock_path)
+        listener.listen(1)
+        self.addCleanup(listener.close)
+        accepted = eventlet.spawn(listener.accept)
+        self.callback = mock.Mock()
+        self.session = asyncio_engine.AsyncioOVSDBSession(
+            mock.Mock(), conf.L2GatewayConfig(
+                {n_const.OVSDB_IDENTIFIER: 'ovsdb1',
+                 'ovsdb_ip': conf.UNIX_SOCKET_PREFIX + sock_path,
+                 'ovsdb_port': None}), self.callback, connect_retries=0)
+        with eventlet.Timeout(5):
+            self.remote = accepted.wait()[0]
+        self.addCleanup(self._disconnect)
+        self.framer = framer.MessageFramer()
+
+    def _disconnect(self):
+        self.remote.close()
+        with eventlet.Timeout(5):
+            while self.session.connected:
+                eventlet.sleep(0.01)
+
+    def _receive(self):
+        with eventlet.Timeout(5):
+            messages = self.framer.recv(self.remote)
+        self.assertEqual(1, len(messages))
+        return messages[0]
+
+    def test_transact_and_monitor(self):
+        """Test case to test updates received along a transaction."""
+        self.session._set_handler('update',
+                                  self.session._update_event_handler)
+        writer = eventlet.spawn(self.session.delete_logical_switch,
+                                'fake_uuid', None)
+        request = self._receive()
+        self.assertEqual('transact', request['method'])
+        update = {'method': 'update', 'id': None, 'params': [None, {}]}
+        echo = {'method': 'echo', 'params': [], 'id': 'echo'}
+        self.remote.sendall(_encode(update, echo, {
+            'id': request['id'], 'error': None, 'result': [{}, {}]}))
+        with eventlet.Timeout(5):
+            writer.wait()
+        self.assertEqual({'id': 'echo', 'result': [], 'error': None},
+                         self._receive())
+        with eventlet.Timeout(5):
+            while not self.callback.called:
+                eventlet.sleep(0.01)
+        self.callback.assert_called_once_with(ovsdb_monitor.Activity.Update,
+                                              mock.ANY)
+        self.assertEqual({}, self.session.requests)
+        self.assertTrue(self.session.connected)
+
+    def test_transact_connection_lost(self):
+        """Test case to test the transactions failed by a disconnection."""
+        writer = eventlet.spawn(self.session.delete_logical_switch,
+                                'fake_uuid', None)
+        self._receive()
+        self.remote.close()
+        with eventlet.Timeout(5):
+            self.assertRaises(exceptions.OVSDBError, writer.wait)
+        self.assertFalse(self.session.connected)
+
+    def test_reads_paused(self):
+        """Test case to test the reads paused by a full queue."""
+        self.session.dispatcher.queue_size = 1
+        with mock.patch.object(self.session.dispatcher,
+                               'wait_for_room') as wait_for_room, \
+                mock.patch.object(self.session.engine, 'call') as call:
+            self.session._deliver([{'method': 'update'}])
+            self.session._deliver([{'method': 'update'}])
+            eventlet.sleep(0)
+        self.assertEqual(1, wait_for_room.call_count)
+        self.assertEqual(2, call.call_count)
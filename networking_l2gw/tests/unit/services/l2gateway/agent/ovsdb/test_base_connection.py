@@ -17,7 +17,6 @@ import eventlet
 
 import os.path
 import socket
-import ssl
 import time
 
 import mock
@@ -27,6 +26,9 @@ from neutron.tests import base
 
 from networking_l2gw.services.l2gateway.agent import l2gateway_config as conf
 from networking_l2gw.services.l2gateway.agent.ovsdb import base_connection
+from networking_l2gw.services.l2gateway.agent.ovsdb import connection_state
+from networking_l2gw.services.l2gateway.agent.ovsdb import handshake
+from networking_l2gw.services.l2gateway.agent.ovsdb import inactivity
 from networking_l2gw.services.l2gateway.agent.ovsdb import manager
 from networking_l2gw.services.l2gateway.common import config
 from networking_l2gw.services.l2gateway.common import constants as n_const
@@ -42,6 +44,7 @@ class FakeConf(object):
         self.use_ssl = False
         self.ovsdb_ip = '1.1.1.1'
         self.ovsdb_port = 6632
+        self.endpoints = [(self.ovsdb_ip, self.ovsdb_port)]
 
 
 class FakeDecodeClass(object):
@@ -67,6 +70,12 @@ class SocketClass(object):
         if self.connect_error:
             raise self.connect_error
 
+    def settimeout(self, timeout):
+        pass
+
+    def setsockopt(self, level, option, value):
+        pass
+
     def send(self, data):
         if self.send_error:
             raise self.send_error
@@ -77,6 +86,13 @@ class SocketClass(object):
             raise self.recv_error
         return self.rcv_data
 
+    def recv_into(self, buffer):
+        data = self.recv(len(buffer))
+        if not data:
+            return 0
+        buffer[:len(data)] = data
+        return len(data)
+
     def close(self):
         pass
 
@@ -90,15 +106,14 @@ class TestBaseConnection(base.BaseTestCase):
         cfg.CONF.set_override('max_connection_retries', 0, 'ovsdb')
 
         self.sock = mock.patch('socket.socket').start()
-        self.ssl_sock = mock.patch.object(ssl, 'wrap_socket').start()
+        self.ssl_contexts = mock.patch.object(
+            base_connection.BaseConnection, 'ssl_contexts').start()
         self.l2gw_ovsdb = base_connection.BaseConnection(mock.Mock(),
                                                          self.conf)
         self.op_id = 'abcd'
         self.fake_message = {'id': self.op_id,
                              'fake_key': 'fake_value'}
 
-        self.l2gw_ovsdb.responses = [self.fake_message]
-
     def test_init(self):
         """Test case to test __init__."""
 
@@ -141,11 +156,116 @@ class TestBaseConnection(base.BaseTestCase):
             self.assertTrue(logger_exc.called)
             self.assertTrue(sock_connect.called)
 
+    def test_init_with_unix_socket(self):
+        """Test case to test __init__ with a unix socket address."""
+        fakesocket = SocketClass()
+        gw_config = FakeConf()
+        gw_config.ovsdb_ip = 'unix:/var/run/openvswitch/db.sock'
+        gw_config.ovsdb_port = None
+        with mock.patch.object(socket, 'socket',
+                               return_value=fakesocket) as mock_socket, \
+                mock.patch.object(fakesocket, 'connect') as mock_connect:
+            self.l2gw_ovsdb.__init__(mock.Mock(), gw_config)
+            mock_socket.assert_called_once_with(socket.AF_UNIX,
+                                                socket.SOCK_STREAM)
+            mock_connect.assert_called_once_with(
+                '/var/run/openvswitch/db.sock')
+            self.assertTrue(self.l2gw_ovsdb.connected)
+
+    def test_init_with_ssl(self):
+        """Test case to test __init__ with a cached SSL context."""
+        fakesocket = SocketClass()
+        gw_config = mock.Mock(use_ssl=True, ovsdb_identifier='ovsdb1',
+                              private_key='key', certificate='cert',
+                              ca_cert='ca_cert', ovsdb_ip='1.1.1.1',
+                              ovsdb_port=6632,
+                              endpoints=[('1.1.1.1', 6632)])
+        self.ssl_contexts.reset_mock()
+        ssl_sock = self.ssl_contexts.wrap_socket.return_value
+        with mock.patch.object(socket, 'socket', return_value=fakesocket):
+            self.l2gw_ovsdb.__init__(mock.Mock(), gw_config)
+        # The socket is wrapped once connected.
+        self.ssl_contexts.wrap_socket.assert_called_once_with(
+            fakesocket, 'ovsdb1', 'key', 'cert', 'ca_cert')
+        self.assertFalse(ssl_sock.connect.called)
+        self.ssl_contexts.handshake.assert_called_once_with('ovsdb1',
+                                                            ssl_sock)
+        self.ssl_contexts.save_session.assert_called_once_with('ovsdb1',
+                                                               ssl_sock)
+        self.assertTrue(self.l2gw_ovsdb.connected)
+        self.l2gw_ovsdb.disconnect()
+        self.assertEqual(2, self.ssl_contexts.save_session.call_count)
+        self.assertTrue(ssl_sock.close.called)
+
+    def test_init_retries_with_backoff(self):
+        """Test case to test __init__ retrying with backoff."""
+        fakesocket = SocketClass()
+        with mock.patch.object(base_connection.LOG, 'warning'), \
+                mock.patch.object(socket, 'socket', return_value=fakesocket), \
+                mock.patch.object(fakesocket, 'connect',
+                                  side_effect=[socket.error, socket.timeout,
+                                               None]), \
+                mock.patch.object(fakesocket, 'settimeout') as settimeout, \
+                mock.patch.object(connection_state, 'backoff_delay',
+                                  return_value=0.5) as backoff_delay, \
+                mock.patch.object(eventlet.greenthread, 'sleep') as sleep:
+            l2gw_ovsdb = base_connection.BaseConnection(
+                cfg.CONF.ovsdb, FakeConf(), connect_retries=2)
+            self.assertTrue(l2gw_ovsdb.connected)
+            backoff_delay.assert_has_calls([
+                mock.call(0, cfg.CONF.ovsdb.connection_backoff_initial,
+                          cfg.CONF.ovsdb.connection_backoff_max),
+                mock.call(1, cfg.CONF.ovsdb.connection_backoff_initial,
+                          cfg.CONF.ovsdb.connection_backoff_max)])
+            sleep.assert_has_calls([mock.call(0.5), mock.call(0.5)])
+            settimeout.assert_has_calls([
+                mock.call(cfg.CONF.ovsdb.connect_timeout), mock.call(None)])
+
     def test_response(self):
         """Test case to test _response."""
+        self.l2gw_ovsdb._register_request(self.op_id)
+        self.assertTrue(self.l2gw_ovsdb._complete_request(self.fake_message))
+        self.assertTrue(self.l2gw_ovsdb._is_request_complete(self.op_id))
         response = self.l2gw_ovsdb._response(self.op_id)
-        self.assertIsNotNone(response)
         self.assertEqual(response, self.fake_message)
+        self.assertNotIn(self.op_id, self.l2gw_ovsdb.requests)
+
+    def test_response_delivered_while_waiting(self):
+        """Test case to test _response waiting for the reply."""
+        self.l2gw_ovsdb._register_request(self.op_id)
+        eventlet.spawn_after(0, self.l2gw_ovsdb._complete_request,
+                             self.fake_message)
+        self.assertEqual(self.fake_message,
+                         self.l2gw_ovsdb._response(self.op_id))
+
+    def test_response_timeout(self):
+        """Test case to test _response when no reply arrives."""
+        self.l2gw_ovsdb.response_timeout = 0
+        self.l2gw_ovsdb._register_request(self.op_id)
+        self.assertIsNone(self.l2gw_ovsdb._response(self.op_id))
+        self.assertNotIn(self.op_id, self.l2gw_ovsdb.requests)
+        self.assertEqual(1, self.l2gw_ovsdb.stats['expired_requests'])
+
+    def test_response_not_registered(self):
+        """Test case to test _response for an unknown request."""
+        self.assertIsNone(self.l2gw_ovsdb._response(self.op_id))
+
+    def test_complete_request_unmatched(self):
+        """Test case to test _complete_request with an orphaned reply."""
+        self.assertFalse(self.l2gw_ovsdb._complete_request(self.fake_message))
+        self.assertEqual(1, self.l2gw_ovsdb.stats['unmatched_responses'])
+
+    def test_complete_request_probe_reply(self):
+        """Test case to test _complete_request with a probe reply."""
+        self.assertTrue(self.l2gw_ovsdb._complete_request(
+            {'id': inactivity.PROBE_ID, 'result': [], 'error': None}))
+        self.assertEqual(0, self.l2gw_ovsdb.stats['unmatched_responses'])
+
+    def test_disconnect_fails_pending_requests(self):
+        """Test case to test disconnect waking up pending requests."""
+        self.l2gw_ovsdb._register_request(self.op_id)
+        self.l2gw_ovsdb.disconnect()
+        self.assertNotIn(self.op_id, self.l2gw_ovsdb.requests)
 
     def test_send(self):
         """Test case to test send."""
@@ -161,6 +281,77 @@ class TestBaseConnection(base.BaseTestCase):
                         self.assertTrue(send.called)
                         self.assertTrue(mock_disconnect.called)
 
+    def test_send_partial_writes(self):
+        """Test case to test send when the socket writes in part."""
+        written = []
+
+        def fake_send(data):
+            written.append(bytes(data[:10]))
+            return len(written[-1])
+
+        message = {'method': 'transact', 'params': ['x' * 25], 'id': 'op'}
+        with mock.patch.object(self.l2gw_ovsdb.socket, 'send',
+                               side_effect=fake_send):
+            self.assertTrue(self.l2gw_ovsdb.send(message))
+        data = jsonutils.dump_as_bytes(message)
+        self.assertEqual(data, b''.join(written))
+        self.assertEqual(len(written), self.l2gw_ovsdb.stats['send_calls'])
+        self.assertEqual(len(data), self.l2gw_ovsdb.stats['bytes_sent'])
+        self.assertEqual(1, self.l2gw_ovsdb.stats['messages_sent'])
+
+    def test_send_batches_queued_messages(self):
+        """Test case to test the messages queued while a send blocks."""
+        written = []
+        unblock = eventlet.event.Event()
+
+        def fake_send(data):
+            if not written:
+                unblock.wait()
+            written.append(bytes(data))
+            return len(data)
+
+        messages = [{'method': 'echo', 'params': [], 'id': str(index)}
+                    for index in range(3)]
+        with mock.patch.object(self.l2gw_ovsdb.socket, 'send',
+                               side_effect=fake_send):
+            senders = [eventlet.spawn(self.l2gw_ovsdb.send, message)
+                       for message in messages]
+            eventlet.sleep(0)
+            unblock.send()
+            self.assertEqual([True] * 3,
+                             [sender.wait() for sender in senders])
+        self.assertEqual([jsonutils.dump_as_bytes(messages[0]),
+                          jsonutils.dump_as_bytes(messages[1]) +
+                          jsonutils.dump_as_bytes(messages[2])], written)
+        self.assertEqual(2, self.l2gw_ovsdb.stats['send_batches'])
+        self.assertEqual(3, self.l2gw_ovsdb.stats['messages_sent'])
+
+    def test_send_with_tcp_cork(self):
+        """Test case to test the corked TCP connections."""
+        cfg.CONF.set_override('tcp_cork', True, 'ovsdb')
+        sock = self.l2gw_ovsdb.socket
+        sock.family = socket.AF_INET
+        sock.send.side_effect = len
+        with mock.patch.object(socket, 'TCP_CORK', 3, create=True):
+            self.assertTrue(self.l2gw_ovsdb.send(self.fake_message))
+        self.assertEqual([mock.call(socket.IPPROTO_TCP, 3, 1),
+                          mock.call(socket.IPPROTO_TCP, 3, 0)],
+                         sock.setsockopt.call_args_list)
+
+    def test_set_nodelay(self):
+        """Test case to test TCP_NODELAY set by the tcp_nodelay option."""
+        sock = mock.Mock(family=socket.AF_INET)
+        self.l2gw_ovsdb._set_nodelay(sock)
+        sock.setsockopt.assert_called_once_with(socket.IPPROTO_TCP,
+                                                socket.TCP_NODELAY, 1)
+        unix_sock = mock.Mock(family=socket.AF_UNIX)
+        self.l2gw_ovsdb._set_nodelay(unix_sock)
+        self.assertFalse(unix_sock.setsockopt.called)
+        cfg.CONF.set_override('tcp_nodelay', False, 'ovsdb')
+        sock = mock.Mock(family=socket.AF_INET)
+        self.l2gw_ovsdb._set_nodelay(sock)
+        self.assertFalse(sock.setsockopt.called)
+
     def test_disconnect(self):
         """Test case to test disconnect socket."""
         self.l2gw_ovsdb.monitor = True
@@ -178,13 +369,15 @@ class TestBaseConnection_with_enable_manager(base.BaseTestCase):
         config.register_ovsdb_opts_helper(cfg.CONF)
         cfg.CONF.set_override('enable_manager', True, 'ovsdb')
         self.mgr = mock.patch.object(manager, 'OVSDBManager').start()
+        self.ssl_contexts = mock.patch.object(
+            base_connection.BaseConnection, 'ssl_contexts').start()
         self.l2gw_ovsdb_conn = base_connection.BaseConnection(
             mock.Mock(), self.conf, self.mgr)
         self.mock_sock = mock.patch('socket.socket').start()
         self.l2gw_ovsdb_conn.s = mock.patch('socket.socket').start()
         self.fakesocket = SocketClass()
         self.fake_ip = 'fake_ip'
-        self.l2gw_ovsdb_conn.ovsdb_conn_list = ['fake_ip']
+        self.l2gw_ovsdb_conn.ovsdb_conn_list = {'fake_ip'}
         self.l2gw_ovsdb_conn.ovsdb_dicts = {'fake_ip': self.fakesocket}
 
     def test_init_with_enable_manager(self):
@@ -205,7 +398,7 @@ class TestBaseConnection_with_enable_manager(base.BaseTestCase):
         fake_ip = 'fake_ip'
         self.l2gw_ovsdb_conn.ovsdb_fd_states = {fake_ip: 'fake_status'}
         self.l2gw_ovsdb_conn.mgr.l2gw_agent_type = n_const.MONITOR
-        self.l2gw_ovsdb_conn.ovsdb_conn_list = [fake_ip]
+        self.l2gw_ovsdb_conn.ovsdb_conn_list = {fake_ip}
         with mock.patch.object(eventlet.greenthread, 'spawn_n') as (
                 mock_thread):
             self.l2gw_ovsdb_conn._send_monitor_msg_to_ovsdb_connection(
@@ -216,7 +409,7 @@ class TestBaseConnection_with_enable_manager(base.BaseTestCase):
         fake_ip = 'fake_ip'
         self.l2gw_ovsdb_conn.ovsdb_fd_states = {fake_ip: 'fake_status'}
         self.l2gw_ovsdb_conn.mgr.l2gw_agent_type = n_const.MONITOR
-        self.l2gw_ovsdb_conn.ovsdb_conn_list = [fake_ip]
+        self.l2gw_ovsdb_conn.ovsdb_conn_list = {fake_ip}
         with mock.patch.object(eventlet.greenthread, 'spawn_n',
                                side_effect=Exception) as mock_thread, \
                 mock.patch.object(base_connection.LOG, 'warning') as mock_warning, \
@@ -228,47 +421,95 @@ class TestBaseConnection_with_enable_manager(base.BaseTestCase):
             self.assertTrue(mock_warning.called)
             mock_disconnect.assert_called_with(fake_ip)
 
-    def test_echo_response(self):
-        fake_resp = {"method": "echo",
-                     "params": "fake_params",
-                     "id": "fake_id",
-                     }
-        with mock.patch.object(eventlet.greenthread, 'sleep') as fake_thread, \
-                mock.patch.object(jsonutils, 'loads', return_value=fake_resp) as mock_loads, \
-                mock.patch.object(self.fakesocket,
-                                  'recv',
-                                  return_value=fake_resp) as mock_sock_rcv, \
-                mock.patch.object(self.fakesocket,
-                                  'send') as mock_sock_send:
-            self.l2gw_ovsdb_conn._echo_response(self.fake_ip)
-            self.assertTrue(fake_thread.called)
-            self.assertTrue(mock_sock_rcv.called)
-            mock_loads.assert_called_with(fake_resp)
+    def test_common_sock_rcv_thread(self):
+        fake_echo = jsonutils.dump_as_bytes({"method": "echo",
+                                             "params": "fake_params",
+                                             "id": "fake_id"})
+        fake_update = {"method": "update", "params": [], "id": None}
+        self.l2gw_ovsdb_conn.ovsdb_conn_list = set()
+        self.l2gw_ovsdb_conn.handshakes.start(self.fake_ip)
+        with mock.patch.object(self.fakesocket, 'recv', side_effect=[
+                fake_echo[:10], fake_echo[10:] +
+                jsonutils.dump_as_bytes(fake_update), None]), \
+                mock.patch.object(self.fakesocket, 'send',
+                                  side_effect=len) as mock_sock_send, \
+                mock.patch.object(self.l2gw_ovsdb_conn,
+                                  '_send_monitor_msg_to_ovsdb_connection',
+                                  return_value=False), \
+                mock.patch.object(self.l2gw_ovsdb_conn.dispatcher,
+                                  'dispatch') as mock_dispatch, \
+                mock.patch.object(self.l2gw_ovsdb_conn,
+                                  'disconnect') as mock_disconnect:
+            self.l2gw_ovsdb_conn._common_sock_rcv_thread(self.fake_ip)
+            # The echo split across two reads is answered.
+            mock_sock_send.assert_called_once_with(jsonutils.dump_as_bytes(
+                {"result": "fake_params", "error": None, "id": "fake_id"}))
             self.assertTrue(self.l2gw_ovsdb_conn.check_c_sock)
-            self.assertTrue(mock_sock_send.called)
+            mock_dispatch.assert_called_once_with(self.fake_ip,
+                                                  [fake_update])
+            mock_disconnect.assert_called_once_with(self.fake_ip)
+        self.assertNotIn(self.fake_ip, self.l2gw_ovsdb_conn.handshakes)
+        self.assertEqual(1, self.l2gw_ovsdb_conn.handshakes.stats[
+            'handshakes_completed'])
 
     def test_common_sock_rcv_thread_none(self):
-        with mock.patch.object(base_connection.BaseConnection,
-                               '_echo_response') as mock_resp, \
-                mock.patch.object(eventlet.greenthread, 'sleep') as green_thrd_sleep, \
-                mock.patch.object(self.fakesocket,
-                                  'recv', return_value=None) as mock_rcv, \
+        with mock.patch.object(self.fakesocket,
+                               'recv', return_value=None) as mock_rcv, \
+                mock.patch.object(self.l2gw_ovsdb_conn.dispatcher,
+                                  'dispatch') as mock_dispatch, \
                 mock.patch.object(base_connection.BaseConnection,
                                   'disconnect') as mock_disconnect:
-            self.l2gw_ovsdb_conn.check_c_sock = True
-            self.l2gw_ovsdb_conn.read_on = True
             self.l2gw_ovsdb_conn._common_sock_rcv_thread(self.fake_ip)
-            self.assertTrue(mock_resp.called)
-            self.assertTrue(green_thrd_sleep.called)
             self.assertTrue(mock_rcv.called)
-            self.assertTrue(mock_disconnect.called)
-            self.assertFalse(self.l2gw_ovsdb_conn.connected)
-            self.assertFalse(self.l2gw_ovsdb_conn.read_on)
+            self.assertFalse(mock_dispatch.called)
+            mock_disconnect.assert_called_once_with(self.fake_ip)
+
+    def test_common_sock_rcv_thread_replaced(self):
+        self.l2gw_ovsdb_conn.ovsdb_conn_list = set()
+
+        def replace(length):
+            self.l2gw_ovsdb_conn.ovsdb_dicts[self.fake_ip] = SocketClass()
+            raise socket.error
+
+        with mock.patch.object(self.fakesocket, 'recv',
+                               side_effect=replace), \
+                mock.patch.object(base_connection.LOG, 'exception'), \
+                mock.patch.object(base_connection.BaseConnection,
+                                  'disconnect') as mock_disconnect:
+            self.l2gw_ovsdb_conn._common_sock_rcv_thread(self.fake_ip)
+            # The newer connection from the same address is left open.
+            self.assertFalse(mock_disconnect.called)
+
+    def test_admit_peer_failure(self):
+        new_socket = mock.Mock()
+        with mock.patch.object(self.l2gw_ovsdb_conn, '_is_ssl_configured',
+                               side_effect=socket.timeout), \
+                mock.patch.object(base_connection.LOG,
+                                  'exception') as logger_call:
+            self.l2gw_ovsdb_conn._admit_peer(new_socket, 'other_ip')
+            self.assertIn('other_ip', self.l2gw_ovsdb_conn.handshakes)
+            eventlet.sleep(0)
+            self.assertTrue(logger_call.called)
+        # The TLS handshake is bounded by the handshake timeout.
+        new_socket.settimeout.assert_called_once_with(30)
+        self.assertTrue(new_socket.close.called)
+        self.assertNotIn('other_ip', self.l2gw_ovsdb_conn.ovsdb_dicts)
+        self.assertNotIn('other_ip', self.l2gw_ovsdb_conn.handshakes)
+        self.assertEqual(1, self.l2gw_ovsdb_conn.handshakes.stats[
+            'handshakes_failed'])
+
+    def test_handshake_expired(self):
+        with mock.patch.object(self.l2gw_ovsdb_conn,
+                               'disconnect') as mock_disconnect:
+            self.l2gw_ovsdb_conn._on_handshake_expired('unknown_ip')
+            self.assertFalse(mock_disconnect.called)
+            self.l2gw_ovsdb_conn._on_handshake_expired(self.fake_ip)
+            mock_disconnect.assert_called_once_with(self.fake_ip)
 
     def test_disconnect_with_enable_manager(self):
         fake_ip = 'fake_ip'
         self.l2gw_ovsdb_conn.ovsdb_fd_states = {fake_ip: 'fake_status'}
-        self.l2gw_ovsdb_conn.ovsdb_conn_list = [fake_ip]
+        self.l2gw_ovsdb_conn.ovsdb_conn_list = {fake_ip}
         with mock.patch.object(self.fakesocket,
                                'close') as (mock_close):
             self.l2gw_ovsdb_conn.disconnect(fake_ip)
@@ -276,6 +517,85 @@ class TestBaseConnection_with_enable_manager(base.BaseTestCase):
             self.assertNotIn(fake_ip, self.l2gw_ovsdb_conn.ovsdb_fd_states)
             self.assertNotIn(fake_ip, self.l2gw_ovsdb_conn.ovsdb_conn_list)
 
+    def test_disconnect_twice_with_enable_manager(self):
+        """Test case to test disconnect of a peer already disconnected."""
+        with mock.patch.object(self.fakesocket,
+                               'close') as (mock_close):
+            self.l2gw_ovsdb_conn.disconnect(self.fake_ip)
+            self.l2gw_ovsdb_conn.disconnect(self.fake_ip)
+            mock_close.assert_called_once_with()
+            self.assertNotIn(self.fake_ip, self.l2gw_ovsdb_conn.ovsdb_dicts)
+
+    def test_accept_peer(self):
+        old_socket = mock.Mock()
+        self.l2gw_ovsdb_conn.ovsdb_dicts = {self.fake_ip: old_socket}
+        self.l2gw_ovsdb_conn.ovsdb_fd_states = {self.fake_ip: 'connected'}
+        self.l2gw_ovsdb_conn.multiplexer = mock.Mock()
+        new_socket = mock.Mock()
+        with mock.patch.object(self.l2gw_ovsdb_conn, '_is_ssl_configured',
+                               side_effect=lambda addr, sock: sock):
+            self.l2gw_ovsdb_conn._accept_peer(new_socket, self.fake_ip)
+        self.assertTrue(old_socket.close.called)
+        self.assertEqual(new_socket,
+                         self.l2gw_ovsdb_conn.ovsdb_dicts[self.fake_ip])
+        self.assertNotIn(self.fake_ip, self.l2gw_ovsdb_conn.ovsdb_conn_list)
+        self.assertNotIn(self.fake_ip, self.l2gw_ovsdb_conn.ovsdb_fd_states)
+        self.l2gw_ovsdb_conn.multiplexer.add_peer.assert_called_with(
+            self.fake_ip, new_socket)
+        self.assertIn(self.fake_ip, self.l2gw_ovsdb_conn.probes)
+        self.l2gw_ovsdb_conn.probes.remove(self.fake_ip)
+
+    def test_accept_peer_with_tcp_keepalive(self):
+        cfg.CONF.set_override('tcp_keepalive', True, 'ovsdb')
+        self.l2gw_ovsdb_conn.multiplexer = mock.Mock()
+        new_socket = mock.Mock()
+        with mock.patch.object(self.l2gw_ovsdb_conn, '_is_ssl_configured',
+                               side_effect=lambda addr, sock: sock), \
+                mock.patch.object(self.l2gw_ovsdb_conn, '_start_probing'), \
+                mock.patch.object(inactivity,
+                                  'enable_tcp_keepalive') as keepalive:
+            self.l2gw_ovsdb_conn._accept_peer(new_socket, self.fake_ip)
+        keepalive.assert_called_once_with(new_socket, 10, 5, 3)
+
+    def test_on_inactive(self):
+        with mock.patch.object(self.l2gw_ovsdb_conn,
+                               'disconnect') as mock_disconnect:
+            self.l2gw_ovsdb_conn._on_inactive('unknown_ip')
+            self.assertFalse(mock_disconnect.called)
+            self.l2gw_ovsdb_conn._on_inactive(self.fake_ip)
+            mock_disconnect.assert_called_once_with(self.fake_ip)
+
+    def test_on_peer_messages(self):
+        self.l2gw_ovsdb_conn.ovsdb_conn_list = set()
+        self.l2gw_ovsdb_conn.handshakes.start(self.fake_ip)
+        self.addCleanup(self.l2gw_ovsdb_conn.handshakes.abort, self.fake_ip)
+        fake_echo = {"method": "echo", "params": [], "id": "echo"}
+        fake_update = {"method": "update", "params": [], "id": None}
+        with mock.patch.object(self.fakesocket, 'send',
+                               side_effect=len) as mock_send, \
+                mock.patch.object(self.l2gw_ovsdb_conn,
+                                  '_send_monitor_msg_to_ovsdb_connection'
+                                  ) as mock_monitor:
+            # Messages before the first echo are dropped.
+            self.assertEqual([], self.l2gw_ovsdb_conn._on_peer_messages(
+                self.fake_ip, [fake_update]))
+            self.assertFalse(mock_send.called)
+            self.assertEqual(
+                [fake_update], self.l2gw_ovsdb_conn._on_peer_messages(
+                    self.fake_ip, [fake_echo, fake_update]))
+            self.assertEqual(handshake.AWAITING_MONITOR,
+                             self.l2gw_ovsdb_conn.handshakes.state(
+                                 self.fake_ip))
+            mock_send.assert_called_once_with(jsonutils.dump_as_bytes(
+                {"result": [], "error": None, "id": "echo"}))
+            mock_monitor.assert_called_once_with(self.fake_ip)
+            self.assertIn(self.fake_ip,
+                          self.l2gw_ovsdb_conn.ovsdb_conn_list)
+            self.assertEqual([fake_echo],
+                             self.l2gw_ovsdb_conn._on_peer_messages(
+                                 self.fake_ip, [fake_echo]))
+            self.assertEqual(1, mock_send.call_count)
+
     def test_get_ovsdb_ip_mapping(self):
         expected_ovsdb_ip_mapping = {'10.10.10.10': 'ovsdb1'}
         cfg.CONF.set_override('ovsdb_hosts',
@@ -295,21 +615,19 @@ class TestBaseConnection_with_enable_manager(base.BaseTestCase):
         cfg.CONF.set_override('l2_gw_agent_ca_cert_base_path',
                               '/home',
                               'ovsdb')
-        with mock.patch.object(os.path, 'isfile', return_value=True) as mock_isfile, \
-                mock.patch.object(base_connection.LOG, 'error') as mock_error, \
-                mock.patch.object(ssl, 'wrap_socket') as mock_wrap_sock:
-            self.l2gw_ovsdb_conn._is_ssl_configured('10.10.10.10',
-                                                    self.mock_sock)
-            self.assertTrue(mock_isfile.called)
-            self.assertTrue(mock_wrap_sock.called)
+        with mock.patch.object(os.path, 'isfile') as mock_isfile, \
+                mock.patch.object(base_connection.LOG, 'error') as mock_error:
+            ssl_sock = self.l2gw_ovsdb_conn._is_ssl_configured(
+                '10.10.10.10', self.mock_sock)
+            self.assertFalse(mock_isfile.called)
             self.assertFalse(mock_error.called)
-            mock_wrap_sock.assert_called_with(
-                self.mock_sock,
-                server_side=True,
-                keyfile='/home/ovsdb1.key',
-                certfile='/home/ovsdb1.cert',
-                ssl_version=ssl.PROTOCOL_SSLv23,
-                ca_certs='/home/ovsdb1.ca_cert')
+            self.ssl_contexts.wrap_socket.assert_called_with(
+                self.mock_sock, 'ovsdb1', '/home/ovsdb1.key',
+                '/home/ovsdb1.cert', '/home/ovsdb1.ca_cert',
+                server_side=True)
+            self.assertEqual(self.ssl_contexts.wrap_socket.return_value,
+                             ssl_sock)
+            self.ssl_contexts.handshake.assert_called_with('ovsdb1', ssl_sock)
 
     def test_is_ssl_configured_for_certs_not_found(self):
         self.l2gw_ovsdb_conn.ip_ovsdb_mapping = {'10.10.10.10': 'ovsdb1'}
@@ -322,11 +640,12 @@ class TestBaseConnection_with_enable_manager(base.BaseTestCase):
         cfg.CONF.set_override('l2_gw_agent_ca_cert_base_path',
                               '/home/',
                               'ovsdb')
+        self.ssl_contexts.wrap_socket.side_effect = IOError
         with mock.patch.object(os.path, 'isfile', return_value=False) as mock_isfile, \
-                mock.patch.object(base_connection.LOG, 'error') as mock_error, \
-                mock.patch.object(ssl, 'wrap_socket') as mock_wrap_sock:
-            self.l2gw_ovsdb_conn._is_ssl_configured('10.10.10.10',
-                                                    self.mock_sock)
+                mock.patch.object(base_connection.LOG, 'error') as mock_error:
+            self.assertEqual(self.mock_sock,
+                             self.l2gw_ovsdb_conn._is_ssl_configured(
+                                 '10.10.10.10', self.mock_sock))
             self.assertTrue(mock_isfile.called)
-            self.assertFalse(mock_wrap_sock.called)
+            self.assertFalse(self.ssl_contexts.handshake.called)
             self.assertTrue(mock_error.called)
@@ -0,0 +1,94 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.tests import base
+
+from networking_l2gw.services.l2gateway.agent import l2gateway_config as conf
+from networking_l2gw.services.l2gateway.agent.ovsdb import cluster
+from networking_l2gw.services.l2gateway.common import constants as n_const
+
+
+def database_update(leader, connected=True, name='hardware_vtep'):
+    return {'Database': {'fake_uuid': {'new': {
+        'name': name, 'model': 'clustered', 'connected': connected,
+        'leader': leader}}}}
+
+
+class TestCluster(base.BaseTestCase):
+    def setUp(self):
+        super(TestCluster, self).setUp()
+        self.gw_config = conf.L2GatewayConfig(
+            {n_const.OVSDB_IDENTIFIER: 'ovsdb1', 'ovsdb_ip': '1.1.1.1',
+             'ovsdb_port': '6641'})
+        self.gw_config.add_endpoint('1.1.1.2', '6641')
+        self.gw_config.add_endpoint('1.1.1.3', '6641')
+
+    def test_role(self):
+        """Test case to test the role read from the _Server database."""
+        self.assertEqual(cluster.LEADER,
+                         cluster.role(database_update(True)))
+        self.assertEqual(cluster.FOLLOWER,
+                         cluster.role(database_update(False)))
+        self.assertEqual(cluster.FOLLOWER,
+                         cluster.role(database_update(True, False)))
+        self.assertIsNone(cluster.role(database_update(True,
+                                                       name='_Server')))
+        self.assertIsNone(cluster.role({}))
+
+    def test_candidates(self):
+        """Test case to test the order the members are tried in."""
+        self.assertTrue(cluster.is_clustered(self.gw_config))
+        self.assertEqual([0, 1, 2], cluster.candidates(self.gw_config,
+                                                       cluster.LEADER))
+        self.gw_config.leader = 1
+        self.assertEqual([1, 0, 2], cluster.candidates(self.gw_config,
+                                                       cluster.LEADER))
+        self.assertEqual([0, 2, 1], cluster.candidates(self.gw_config,
+                                                       cluster.FOLLOWER))
+
+    def test_member(self):
+        """Test case to test the configuration of a member."""
+        self.gw_config.add_endpoint('unix:/run/db.sock', None)
+        self.gw_config.use_ssl = True
+        member = self.gw_config.member(1)
+        self.assertEqual(('1.1.1.2', '6641'),
+                         (member.ovsdb_ip, member.ovsdb_port))
+        self.assertTrue(member.use_ssl)
+        self.assertFalse(self.gw_config.member(3).use_ssl)
+        self.assertEqual('1.1.1.1', self.gw_config.ovsdb_ip)
+
+    def test_leadership_change(self):
+        """Test case to test the sessions used after a leadership change."""
+        session = mock.Mock(endpoint=0)
+        cluster.set_role(session, self.gw_config, cluster.LEADER)
+        self.assertEqual(0, self.gw_config.leader)
+        self.assertTrue(cluster.can_write(session, self.gw_config))
+        other = mock.Mock(endpoint=0)
+        cluster.set_role(other, self.gw_config, cluster.LEADER)
+        self.assertEqual(1, self.gw_config.leader_epoch)
+        # The session which sees its member lose the leadership makes the
+        # other sessions to that member stale.
+        cluster.set_role(other, self.gw_config, cluster.FOLLOWER)
+        self.assertIsNone(self.gw_config.leader)
+        self.assertFalse(cluster.can_write(other, self.gw_config))
+        self.assertFalse(cluster.can_write(session, self.gw_config))
+        new_leader = mock.Mock(endpoint=2)
+        cluster.set_role(new_leader, self.gw_config, cluster.LEADER)
+        self.assertEqual(2, self.gw_config.leader)
+        self.assertTrue(cluster.can_write(new_leader, self.gw_config))
+        self.assertTrue(cluster.can_write(mock.Mock(endpoint=None),
+                                          self.gw_config))
@@ -0,0 +1,124 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import mock
+
+from neutron.tests import base
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import coalescer
+from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_monitor
+from networking_l2gw.services.l2gateway.common import constants as n_const
+
+INITIAL = ovsdb_monitor.Activity.Initial
+UPDATE = ovsdb_monitor.Activity.Update
+
+
+def update(**rows):
+    ovsdb_data = {n_const.OVSDB_IDENTIFIER: 'ovsdb1'}
+    ovsdb_data.update(rows)
+    return ovsdb_data
+
+
+def mac(uuid, locator='loc1'):
+    return {'uuid': uuid, 'mac': 'fa:16:3e:00:00:01',
+            'logical_switch_id': 'ls1', 'physical_locator_id': locator}
+
+
+class TestUpdateCoalescer(base.BaseTestCase):
+    def setUp(self):
+        super(TestUpdateCoalescer, self).setUp()
+        self.send = mock.Mock()
+        self.spawn_after_patch = mock.patch.object(eventlet, 'spawn_after')
+        self.spawn_after = self.spawn_after_patch.start()
+        self.addCleanup(mock.patch.stopall)
+        self.coalescer = coalescer.UpdateCoalescer(self.send, 0.2, 10)
+
+    def test_merge(self):
+        """Test case to test the updates merged within a window."""
+        port = {'uuid': 'port1', 'name': 'port1', 'port_fault_status': None,
+                'physical_switch_id': 'ps1',
+                'vlan_bindings': [{'vlan': 100,
+                                   'logical_switch_uuid': 'ls1'}]}
+        self.coalescer.submit(UPDATE, update(new_local_macs=[mac('mac1')],
+                                             new_physical_ports=[port]))
+        self.coalescer.submit(UPDATE, update(
+            new_local_macs=[mac('mac2')],
+            modified_local_macs=[mac('mac1', 'loc2')],
+            modified_physical_ports=[dict(port, port_fault_status='DOWN',
+                                          physical_switch_id=None,
+                                          vlan_bindings=None)]))
+        self.coalescer.submit(UPDATE, update(deleted_local_macs=[
+            mac('mac2')]))
+        self.assertFalse(self.send.called)
+        self.assertEqual(1, self.spawn_after.call_count)
+        self.coalescer.flush('ovsdb1')
+        self.send.assert_called_once_with(UPDATE, mock.ANY)
+        ovsdb_data = self.send.call_args[0][1]
+        self.assertEqual([mac('mac1', 'loc2')],
+                         ovsdb_data['new_local_macs'])
+        self.assertNotIn('deleted_local_macs', ovsdb_data)
+        self.assertEqual([dict(port, port_fault_status='DOWN')],
+                         ovsdb_data['new_physical_ports'])
+        self.assertNotIn('modified_physical_ports', ovsdb_data)
+        self.assertEqual('ovsdb1', ovsdb_data[n_const.OVSDB_IDENTIFIER])
+        self.assertEqual(3, len(ovsdb_data))
+        self.spawn_after.return_value.cancel.assert_called_once_with()
+
+    def test_send_at_once(self):
+        """Test case to test the updates which are not held."""
+        self.coalescer.submit(UPDATE, update(new_local_macs=[mac('mac1')]))
+        initial = update(new_local_macs=[mac('mac2')])
+        # The initial dump holds the pending changes.
+        self.coalescer.submit(INITIAL, initial)
+        self.send.assert_called_once_with(INITIAL, initial)
+        self.coalescer.flush('ovsdb1')
+        self.assertEqual(1, self.send.call_count)
+        self.coalescer.window = 0
+        self.coalescer.submit(UPDATE, initial)
+        self.send.assert_called_with(UPDATE, initial)
+
+    def test_flush_early(self):
+        """Test case to test the updates sent before the window ends."""
+        self.coalescer.submit(UPDATE, update(
+            deleted_remote_macs=[mac('mac1')]))
+        # The row is created again after its deletion.
+        self.coalescer.submit(UPDATE, update(new_remote_macs=[mac('mac1')]))
+        self.assertEqual([mac('mac1')],
+                         self.send.call_args[0][1]['deleted_remote_macs'])
+        self.coalescer.submit(UPDATE, update(new_remote_macs=[
+            mac('mac%d' % index) for index in range(2, 11)]))
+        self.assertEqual(2, self.send.call_count)
+        self.assertEqual(10, len(self.send.call_args[0][1][
+            'new_remote_macs']))
+
+    def test_window_expiry(self):
+        """Test case to test the updates sent when the window ends."""
+        self.spawn_after_patch.stop()
+        self.coalescer.window = 0.01
+        self.coalescer.submit(UPDATE, update(new_local_macs=[mac('mac1')]))
+        with eventlet.Timeout(5):
+            while not self.send.called:
+                eventlet.sleep(0.01)
+        self.assertEqual([mac('mac1')],
+                         self.send.call_args[0][1]['new_local_macs'])
+
+    def test_clear(self):
+        """Test case to test the pending updates dropped."""
+        self.coalescer.submit(UPDATE, update(new_local_macs=[mac('mac1')]))
+        self.coalescer.clear()
+        self.spawn_after.return_value.cancel.assert_called_once_with()
+        self.coalescer.flush('ovsdb1')
+        self.assertFalse(self.send.called)
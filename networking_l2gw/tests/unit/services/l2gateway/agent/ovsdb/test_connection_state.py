@@ -0,0 +1,68 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import random
+
+import mock
+
+from neutron.tests import base
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import connection_state
+
+
+class TestConnectionState(base.BaseTestCase):
+    def setUp(self):
+        super(TestConnectionState, self).setUp()
+        self.conn_state = connection_state.ConnectionState(1, 8)
+
+    def test_backoff_delay(self):
+        """Test case to test the bounds of backoff_delay."""
+        for attempt, delay in ((0, 1), (1, 2), (2, 4), (3, 8), (10, 8)):
+            for _ in range(20):
+                result = connection_state.backoff_delay(attempt, 1, 8)
+                self.assertTrue(delay / 2.0 <= result <= delay)
+
+    def test_initial_state(self):
+        """Test case to test that a first attempt is due at once."""
+        self.assertEqual(connection_state.DISCONNECTED,
+                         self.conn_state.state)
+        self.assertTrue(self.conn_state.is_due())
+
+    def test_set_failed(self):
+        """Test case to test the backoff after failed attempts."""
+        with mock.patch.object(random, 'uniform',
+                               side_effect=lambda low, high: high):
+            self.assertEqual(1, self.conn_state.set_failed(now=100))
+            self.assertFalse(self.conn_state.is_due(now=100.5))
+            self.assertTrue(self.conn_state.is_due(now=101))
+            self.assertEqual(2, self.conn_state.set_failed(now=101))
+            self.assertEqual(103, self.conn_state.next_attempt)
+            self.assertEqual(2, self.conn_state.failures)
+
+    def test_set_connected(self):
+        """Test case to test that a connection resets the backoff."""
+        self.conn_state.set_connecting()
+        self.assertFalse(self.conn_state.is_due())
+        self.conn_state.set_failed()
+        self.conn_state.set_connected()
+        self.assertEqual(connection_state.CONNECTED, self.conn_state.state)
+        self.assertEqual(0, self.conn_state.failures)
+        self.assertFalse(self.conn_state.is_due())
+
+    def test_set_lost(self):
+        """Test case to test that a lost connection is retried at once."""
+        self.conn_state.set_connected()
+        self.conn_state.set_lost()
+        self.assertTrue(self.conn_state.is_due())
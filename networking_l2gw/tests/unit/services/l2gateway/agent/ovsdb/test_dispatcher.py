@@ -0,0 +1,107 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+from eventlet import event
+import mock
+
+from neutron.tests import base
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import dispatcher
+
+
+class TestDispatcher(base.BaseTestCase):
+    def setUp(self):
+        super(TestDispatcher, self).setUp()
+        self.connection = mock.Mock()
+        self.handled = []
+        self.connection._on_remote_message.side_effect = (
+            lambda message, addr: self.handled.append((addr, message)))
+        self.dispatcher = dispatcher.Dispatcher(self.connection, 2, 3)
+
+    def _wait_for(self, condition):
+        with eventlet.Timeout(5):
+            while not condition():
+                eventlet.sleep(0.01)
+
+    def test_dispatch_in_order(self):
+        """Test case to test that messages are processed in order."""
+        self.dispatcher.dispatch('ip1', [1, 2])
+        self.dispatcher.dispatch('ip2', [1])
+        self.dispatcher.dispatch('ip1', [3])
+        self.dispatcher.dispatch('ip1', [])
+        self._wait_for(lambda: len(self.handled) == 4)
+        self.assertEqual([1, 2, 3], [message for addr, message
+                                     in self.handled if addr == 'ip1'])
+        self.assertEqual(0, self.dispatcher.queue_depth())
+        self.assertEqual(4, self.dispatcher.stats['dispatched'])
+        self.assertEqual(3, self.dispatcher.stats['max_queue_depth'])
+
+    def test_fixed_worker_pool(self):
+        """Test case to test that one worker drains a connection."""
+        release = event.Event()
+        running = []
+        peak = []
+
+        def _handle(message, addr):
+            running.append(addr)
+            peak.append(len(running))
+            release.wait()
+            running.remove(addr)
+
+        self.connection._on_remote_message.side_effect = _handle
+        for addr in ('ip1', 'ip2'):
+            self.dispatcher.dispatch(addr, [1, 2])
+        # The reader waits for a free worker.
+        reader = eventlet.spawn(self.dispatcher.dispatch, 'ip3', [1, 2])
+        eventlet.sleep(0)
+        self.assertEqual(2, max(peak))
+        self.assertFalse(reader.dead)
+        self.assertEqual(6, self.dispatcher.queue_depth() + len(running))
+        release.send()
+        with eventlet.Timeout(5):
+            reader.wait()
+        self._wait_for(lambda: not self.dispatcher.queue_depth())
+        self.assertEqual(2, max(peak))
+
+    def test_wait_for_room(self):
+        """Test case to test that a full queue throttles its reader."""
+        release = event.Event()
+        self.connection._on_remote_message.side_effect = (
+            lambda message, addr: release.wait())
+        self.dispatcher.dispatch('ip1', [1, 2, 3, 4])
+        eventlet.sleep(0)
+        self.assertTrue(self.dispatcher.is_full('ip1'))
+        self.assertFalse(self.dispatcher.is_full('ip2'))
+        reader = eventlet.spawn(self.dispatcher.wait_for_room, 'ip1')
+        eventlet.sleep(0)
+        self.assertFalse(reader.dead)
+        release.send()
+        with eventlet.Timeout(5):
+            reader.wait()
+        self.assertEqual(1, self.dispatcher.stats['throttled'])
+
+    def test_handler_failure(self):
+        """Test case to test that a failing message is skipped."""
+        def _handle(message, addr):
+            if message == 1:
+                raise Exception
+            self.handled.append(message)
+
+        self.connection._on_remote_message.side_effect = _handle
+        with mock.patch.object(dispatcher.LOG, 'exception') as logger_call:
+            self.dispatcher.dispatch('ip1', [1, 2])
+            self._wait_for(lambda: self.handled == [2])
+            self.assertTrue(logger_call.called)
@@ -0,0 +1,153 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from neutron.tests import base
+from oslo_serialization import jsonutils
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import framer
+from networking_l2gw.services.l2gateway import exceptions
+
+
+class FakeSocket(object):
+    def __init__(self, *chunks):
+        self.chunks = list(chunks)
+
+    def recv_into(self, buffer):
+        if not self.chunks:
+            return 0
+        chunk = self.chunks.pop(0)
+        size = min(len(chunk), len(buffer))
+        buffer[:size] = chunk[:size]
+        if size < len(chunk):
+            self.chunks.insert(0, chunk[size:])
+        return size
+
+
+class TestMessageFramer(base.BaseTestCase):
+    def setUp(self):
+        super(TestMessageFramer, self).setUp()
+        self.framer = framer.MessageFramer()
+        self.echo = {"method": "echo", "params": [], "id": "echo"}
+        self.update = {"method": "update",
+                       "params": [None,
+                                  {"Logical_Switch": {
+                                      "ls-uuid": {"new": {
+                                          "name": "ls{1}",
+                                          "description": "}\"{"}}}}],
+                       "id": None}
+
+    def _encode(self, *messages):
+        return b''.join(jsonutils.dumps(message).encode('utf-8')
+                        for message in messages)
+
+    def test_feed_single_message(self):
+        self.assertEqual([self.echo],
+                         self.framer.feed(self._encode(self.echo)))
+
+    def test_feed_back_to_back_messages(self):
+        data = self._encode(self.echo, self.update, self.echo)
+        self.assertEqual([self.echo, self.update, self.echo],
+                         self.framer.feed(data))
+
+    def test_feed_byte_by_byte(self):
+        data = self._encode(self.update, self.echo)
+        messages = []
+        for i in range(len(data)):
+            messages.extend(self.framer.feed(data[i:i + 1]))
+        self.assertEqual([self.update, self.echo], messages)
+
+    def test_feed_braces_inside_strings(self):
+        data = self._encode(self.update)
+        self.assertEqual([], self.framer.feed(data[:-1]))
+        self.assertEqual([self.update], self.framer.feed(data[-1:]))
+
+    def test_feed_split_inside_string(self):
+        data = b'{"id":1,"result":[{"description":"port {a"}],"error":null}'
+        self.assertEqual([], self.framer.feed(data[:40]))
+        self.assertEqual([{"id": 1, "result": [{"description": "port {a"}],
+                           "error": None}],
+                         self.framer.feed(data[40:]))
+
+    def test_feed_split_escape_sequence(self):
+        message = {"id": "1", "result": [{"name": "{\"\\{"}],
+                   "error": None}
+        data = jsonutils.dumps(message).encode('utf-8')
+        for split in range(1, len(data)):
+            msg_framer = framer.MessageFramer()
+            self.assertEqual([], msg_framer.feed(data[:split]))
+            self.assertEqual([message], msg_framer.feed(data[split:]))
+
+    def test_feed_split_utf8_sequence(self):
+        message = {"id": "1",
+                   "result": [{"description": u"caf\u00e9 \u2603"}],
+                   "error": None}
+        data = jsonutils.dumps(message, ensure_ascii=False).encode('utf-8')
+        split = data.index(u'\u2603'.encode('utf-8')) + 1
+        self.assertEqual([], self.framer.feed(data[:split]))
+        self.assertEqual([message], self.framer.feed(data[split:]))
+
+    def test_feed_whitespace_between_messages(self):
+        data = b'\n' + self._encode(self.echo) + b' \r\n'
+        self.assertEqual([self.echo], self.framer.feed(data))
+        self.assertEqual([self.echo],
+                         self.framer.feed(self._encode(self.echo)))
+
+    def test_feed_invalid_data(self):
+        self.assertRaises(exceptions.OVSDBError, self.framer.feed,
+                          b'[1, 2]')
+
+    def test_feed_invalid_json(self):
+        self.assertEqual([], self.framer.feed(b'{"id": 1, "result": tr'))
+        self.assertRaises(exceptions.OVSDBError, self.framer.feed,
+                          b'u}' + self._encode(self.echo))
+        self.assertEqual([self.echo],
+                         self.framer.feed(self._encode(self.echo)))
+
+    def test_feed_message_too_large(self):
+        msg_framer = framer.MessageFramer(max_message_size=16)
+        self.assertRaises(exceptions.OVSDBError, msg_framer.feed,
+                          b'{"id": "1", "result": ["0123456789"')
+
+    def test_reset(self):
+        data = self._encode(self.echo)
+        self.framer.feed(data[:5])
+        self.framer.reset()
+        self.assertEqual([self.echo], self.framer.feed(data))
+
+    def test_recv(self):
+        data = self._encode(self.update, self.echo)
+        sock = FakeSocket(data[:10], data[10:])
+        self.assertEqual([], self.framer.recv(sock))
+        self.assertEqual([self.update, self.echo], self.framer.recv(sock))
+        self.assertIsNone(self.framer.recv(sock))
+
+    def test_recv_message_larger_than_buffer(self):
+        msg_framer = framer.MessageFramer(buffer_size=16)
+        sock = FakeSocket(self._encode(self.update))
+        messages = []
+        while sock.chunks:
+            messages.extend(msg_framer.recv(sock))
+        self.assertEqual([self.update], messages)
+        self.assertGreater(len(msg_framer._buffer), 16)
+
+    def test_recv_reuses_buffer(self):
+        msg_framer = framer.MessageFramer(buffer_size=256)
+        data = self._encode(*[self.echo] * 50)
+        sock = FakeSocket(*[data[i:i + 20] for i in range(0, len(data), 20)])
+        messages = []
+        while sock.chunks:
+            messages.extend(msg_framer.recv(sock))
+        self.assertEqual([self.echo] * 50, messages)
+        self.assertEqual(256, len(msg_framer._buffer))
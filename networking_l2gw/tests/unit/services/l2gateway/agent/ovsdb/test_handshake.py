@@ -0,0 +1,90 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import mock
+
+from neutron.tests import base
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import handshake
+
+
+class TestHandshakes(base.BaseTestCase):
+    def setUp(self):
+        super(TestHandshakes, self).setUp()
+        self.wheel = mock.Mock()
+        self.on_expired = mock.Mock()
+        self.handshakes = handshake.Handshakes(self.wheel, 2, 5,
+                                               self.on_expired)
+
+    def test_states(self):
+        """Test case to test the states of a handshake."""
+        self.handshakes.start('fake_ip')
+        self.assertEqual(handshake.ACCEPTED,
+                         self.handshakes.state('fake_ip'))
+        self.wheel.schedule.assert_called_once_with(
+            (self.handshakes, 'fake_ip'), 5, mock.ANY)
+        self.handshakes.advance('fake_ip', handshake.AWAITING_ECHO)
+        self.assertEqual(handshake.AWAITING_ECHO,
+                         self.handshakes.state('fake_ip'))
+        # Each state has its own deadline.
+        self.assertEqual(2, self.wheel.schedule.call_count)
+        with mock.patch.object(handshake.time, 'time',
+                               return_value=(self.handshakes._handshakes[
+                                   'fake_ip'].accepted_at + 0.25)):
+            self.handshakes.finish('fake_ip')
+        self.wheel.cancel.assert_called_once_with(
+            (self.handshakes, 'fake_ip'))
+        self.assertNotIn('fake_ip', self.handshakes)
+        self.assertEqual({'count': 1, 'median': 0.25, 'p99': 0.25,
+                          'max': 0.25}, self.handshakes.latency_summary())
+        self.assertEqual(1, self.handshakes.stats['handshakes_completed'])
+        # Finishing or aborting an unknown handshake does nothing.
+        self.handshakes.finish('fake_ip')
+        self.handshakes.abort('fake_ip')
+        self.handshakes.advance('fake_ip', handshake.AWAITING_MONITOR)
+        self.assertEqual(1, self.wheel.cancel.call_count)
+        self.assertFalse(self.handshakes.stats['handshakes_failed'])
+
+    def test_concurrency_limit(self):
+        """Test case to test the handshakes in progress at once."""
+        self.handshakes.start('fake_ip1')
+        self.handshakes.start('fake_ip2')
+        self.assertFalse(self.handshakes.has_room())
+        waiter = eventlet.spawn(self.handshakes.wait_for_room)
+        eventlet.sleep(0)
+        self.assertFalse(waiter.dead)
+        # A new connection from the same address takes no other slot.
+        self.handshakes.start('fake_ip2')
+        self.assertEqual(2, len(self.handshakes))
+        self.handshakes.abort('fake_ip1')
+        with eventlet.Timeout(5):
+            waiter.wait()
+        self.assertTrue(self.handshakes.has_room())
+        self.assertEqual(1, self.handshakes.stats['handshakes_failed'])
+
+    def test_expired(self):
+        """Test case to test a handshake not completed in time."""
+        self.handshakes.start('fake_ip')
+        stale = self.wheel.schedule.call_args[0][2]
+        self.handshakes.start('fake_ip')
+        # The deadline of the replaced connection is ignored.
+        stale()
+        self.assertFalse(self.on_expired.called)
+        self.wheel.schedule.call_args[0][2]()
+        self.on_expired.assert_called_once_with('fake_ip')
+        self.assertNotIn('fake_ip', self.handshakes)
+        self.assertEqual(1, self.handshakes.stats['handshakes_expired'])
+        self.assertEqual({}, self.handshakes.latency_summary())
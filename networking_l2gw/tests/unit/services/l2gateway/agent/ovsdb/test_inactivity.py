@@ -0,0 +1,156 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+import time
+
+import eventlet
+import mock
+
+from neutron.tests import base
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import inactivity
+
+
+class TestTimerWheel(base.BaseTestCase):
+    def setUp(self):
+        super(TestTimerWheel, self).setUp()
+        self.wheel = inactivity.TimerWheel(tick=1.0, slots=4)
+        # The wheel is advanced by the test cases.
+        self.spawn = mock.patch.object(eventlet, 'spawn').start()
+        mock.patch.object(eventlet, 'spawn_n',
+                          side_effect=lambda callback: callback()).start()
+        self.addCleanup(mock.patch.stopall)
+        self.fired = []
+
+    def _schedule(self, key, delay):
+        self.wheel.schedule(key, delay, lambda: self.fired.append(key))
+
+    def _advance(self, ticks):
+        for _i in range(ticks):
+            self.wheel._advance()
+
+    def test_schedule(self):
+        """Test case to test that timers fire after their delay."""
+        self._schedule('a', 2)
+        self._schedule('b', 0.5)
+        self._schedule('c', 6)
+        self.assertEqual(1, self.spawn.call_count)
+        self._advance(1)
+        self.assertEqual(['b'], self.fired)
+        self._advance(1)
+        self.assertEqual(['b', 'a'], self.fired)
+        # The timer further than a turn of the wheel waits for a turn.
+        self._advance(3)
+        self.assertEqual(['b', 'a'], self.fired)
+        self._advance(1)
+        self.assertEqual(['b', 'a', 'c'], self.fired)
+        self.assertEqual(0, len(self.wheel))
+
+    def test_cancel_and_reschedule(self):
+        """Test case to test the cancelled and rescheduled timers."""
+        self._schedule('a', 1)
+        self._schedule('b', 1)
+        self.wheel.cancel('a')
+        self._schedule('b', 3)
+        self._advance(1)
+        self.assertEqual([], self.fired)
+        self._advance(2)
+        self.assertEqual(['b'], self.fired)
+
+    def test_run(self):
+        """Test case to test that the greenthread ends with the timers."""
+        self.wheel.tick = 0.01
+        self._schedule('a', 0.02)
+        with mock.patch.object(eventlet, 'sleep'):
+            self.wheel._run()
+        self.assertEqual(['a'], self.fired)
+        self.assertIsNone(self.wheel._thread)
+
+
+class TestInactivityProbes(base.BaseTestCase):
+    def setUp(self):
+        super(TestInactivityProbes, self).setUp()
+        self.wheel = mock.Mock()
+        self.send_probe = mock.Mock()
+        self.on_dead = mock.Mock()
+        self.busy = False
+        self.probes = inactivity.InactivityProbes(
+            self.wheel, 5, 2, self.send_probe, self.on_dead,
+            lambda addr: self.busy)
+        self.now = 100.0
+        mock.patch.object(time, 'time', side_effect=lambda: self.now).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _check(self, delay):
+        self.now += delay
+        self.probes._check('ip1')
+
+    def test_active_session_not_probed(self):
+        """Test case to test that an active session is not probed."""
+        self.probes.add('ip1')
+        self.wheel.schedule.assert_called_with((self.probes, 'ip1'), 5,
+                                               mock.ANY)
+        self.now += 3
+        self.probes.touch('ip1')
+        self._check(2)
+        self.assertFalse(self.send_probe.called)
+        self.assertEqual(3, self.wheel.schedule.call_args[0][1])
+
+    def test_dead_session(self):
+        """Test case to test that unanswered probes close a session."""
+        self.probes.add('ip1')
+        with mock.patch.object(inactivity.LOG, 'warning') as logger_call:
+            for count in (1, 2):
+                self._check(5)
+                self.assertEqual(count, self.send_probe.call_count)
+            self._check(5)
+            self.on_dead.assert_called_once_with('ip1')
+            self.assertTrue(logger_call.called)
+        self.assertNotIn('ip1', self.probes)
+        self.wheel.cancel.assert_called_with((self.probes, 'ip1'))
+
+    def test_answered_probe(self):
+        """Test case to test that any message answers the probes."""
+        self.probes.add('ip1')
+        self._check(5)
+        self._check(5)
+        self.probes.touch('ip1')
+        self._check(5)
+        self.assertEqual(3, self.send_probe.call_count)
+        self.assertFalse(self.on_dead.called)
+
+    def test_busy_session_not_probed(self):
+        """Test case to test that a session being processed is spared."""
+        self.probes.add('ip1')
+        self.busy = True
+        for _i in range(4):
+            self._check(5)
+        self.assertFalse(self.send_probe.called)
+        self.assertFalse(self.on_dead.called)
+
+
+class TestTCPKeepalive(base.BaseTestCase):
+    def test_enable_tcp_keepalive(self):
+        """Test case to test the TCP keepalive options."""
+        sock = mock.Mock()
+        inactivity.enable_tcp_keepalive(sock, 10, 5, 3)
+        sock.setsockopt.assert_any_call(socket.SOL_SOCKET,
+                                        socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            sock.setsockopt.assert_any_call(socket.IPPROTO_TCP,
+                                            socket.TCP_KEEPIDLE, 10)
+            sock.setsockopt.assert_any_call(socket.IPPROTO_TCP,
+                                            socket.TCP_KEEPCNT, 3)
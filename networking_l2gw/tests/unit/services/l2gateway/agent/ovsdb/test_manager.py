@@ -15,6 +15,7 @@
 
 import os.path
 import socket
+import time
 
 import eventlet
 import mock
@@ -31,7 +32,11 @@ from oslo_service import loopingcall
 from networking_l2gw.services.l2gateway.agent import agent_api
 from networking_l2gw.services.l2gateway.agent import base_agent_manager
 from networking_l2gw.services.l2gateway.agent import l2gateway_config
+from networking_l2gw.services.l2gateway.agent.ovsdb import asyncio_engine
+from networking_l2gw.services.l2gateway.agent.ovsdb import cluster
+from networking_l2gw.services.l2gateway.agent.ovsdb import base_connection
 from networking_l2gw.services.l2gateway.agent.ovsdb import manager
+from networking_l2gw.services.l2gateway.agent.ovsdb import monitor_cond
 from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_common_class
 from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_monitor
 from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_writer
@@ -59,6 +64,8 @@ class TestManager(base.BaseTestCase):
         self.mock_looping_call = mock.patch.object(loopingcall,
                                                    'FixedIntervalLoopingCall'
                                                    ).start()
+        # The manager mode would otherwise listen for OVSDB servers.
+        mock.patch.object(ovsdb_common_class, 'OVSDB_commom_class').start()
         self.l2gw_agent_manager = manager.OVSDBManager(
             self.conf)
         self.l2gw_agent_manager.plugin_rpc = self.plugin_rpc
@@ -89,6 +96,28 @@ class TestManager(base.BaseTestCase):
             self.assertTrue(mock_isfile.called)
             self.assertFalse(mock_log_exc.called)
 
+    def test_process_ovsdb_host_unix_socket(self):
+        fake_host = "ovsdb1:unix:/var/run/openvswitch/db.sock"
+        cfg.CONF.set_override('l2_gw_agent_priv_key_base_path',
+                              '/home/someuser/fakedir',
+                              'ovsdb')
+        cfg.CONF.set_override('l2_gw_agent_cert_base_path',
+                              '/home/someuser/fakedir',
+                              'ovsdb')
+        cfg.CONF.set_override('l2_gw_agent_ca_cert_base_path',
+                              '/home/someuser/fakedir',
+                              'ovsdb')
+        with mock.patch.object(os.path, 'isfile') as mock_isfile:
+            self.l2gw_agent_manager._process_ovsdb_host(fake_host)
+            self.assertFalse(mock_isfile.called)
+        gw = self.l2gw_agent_manager.gateways.get('ovsdb1')
+        self.assertEqual('unix:/var/run/openvswitch/db.sock', gw.ovsdb_ip)
+        self.assertIsNone(gw.ovsdb_port)
+        self.assertFalse(gw.use_ssl)
+        self.assertEqual('/var/run/openvswitch/db.sock',
+                         l2gateway_config.unix_socket_path(gw.ovsdb_ip))
+        self.assertIsNone(l2gateway_config.unix_socket_path('10.10.10.10'))
+
     def test_process_ovsdb_host_for_certs_not_found(self):
         fake_host = "ovsdb1:10.10.10.10:6632"
         cfg.CONF.set_override('l2_gw_agent_priv_key_base_path',
@@ -107,6 +136,18 @@ class TestManager(base.BaseTestCase):
             self.assertTrue(mock_isfile.called)
             self.assertTrue(mock_log_exc.called)
 
+    def test_process_ovsdb_host_cluster_members(self):
+        self.l2gw_agent_manager.gateways = {}
+        self.l2gw_agent_manager._process_ovsdb_host("ovsdb1:10.10.10.1:6641")
+        self.l2gw_agent_manager._process_ovsdb_host("ovsdb1:10.10.10.2:6641")
+        self.l2gw_agent_manager._process_ovsdb_host(
+            "ovsdb1:unix:/var/run/openvswitch/db.sock")
+        gw = self.l2gw_agent_manager.gateways['ovsdb1']
+        self.assertEqual([('10.10.10.1', '6641'), ('10.10.10.2', '6641'),
+                          ('unix:/var/run/openvswitch/db.sock', None)],
+                         gw.endpoints)
+        self.assertEqual('10.10.10.1', gw.ovsdb_ip)
+
     def test_extract_ovsdb_config(self):
         fake_ovsdb_config = {n_const.OVSDB_IDENTIFIER: 'host2',
                              'ovsdb_ip': '10.10.10.10',
@@ -153,20 +194,84 @@ class TestManager(base.BaseTestCase):
         gateway = l2gateway_config.L2GatewayConfig(self.fake_config_json)
         ovsdb_ident = self.fake_config_json.get(n_const.OVSDB_IDENTIFIER)
         self.l2gw_agent_manager.gateways[ovsdb_ident] = gateway
-        with mock.patch.object(ovsdb_monitor,
-                               'OVSDBMonitor') as ovsdb_connection, \
-                mock.patch.object(eventlet.greenthread,
-                                  'spawn_n') as event_spawn, \
+        with mock.patch.object(ovsdb_common_class,
+                               'OVSDB_commom_class') as ovsdb_connection, \
                 mock.patch.object(manager.OVSDBManager,
                                   'agent_to_plugin_rpc') as call_back, \
                 mock.patch.object(self.plugin_rpc,
                                   'notify_ovsdb_states') as notify:
             self.l2gw_agent_manager._connect_to_ovsdb_server()
-            self.assertTrue(event_spawn.called)
             self.assertTrue(ovsdb_connection.called)
+            ovsdb_fd = ovsdb_connection.return_value
+            ovsdb_fd.set_monitor_response_handler.assert_called_once_with()
             ovsdb_connection.assert_called_with(
-                self.conf.ovsdb, gateway, call_back)
-            notify.assert_called_once_with(mock.ANY, mock.ANY)
+                self.conf.ovsdb, gateway, call_back, connect_retries=0)
+            self.assertIs(
+                self.plugin_rpc.can_send_compact_payload.return_value,
+                ovsdb_fd.compact_rows)
+            notify.assert_called_once_with(mock.ANY,
+                                           {ovsdb_ident: 'connected'})
+
+    def test_connect_to_ovsdb_server_with_asyncio_engine(self):
+        self.l2gw_agent_manager.gateways = {}
+        self.l2gw_agent_manager.l2gw_agent_type = n_const.MONITOR
+        self.l2gw_agent_manager.ovsdb_engine = 'asyncio'
+        gateway = l2gateway_config.L2GatewayConfig(self.fake_config_json)
+        ovsdb_ident = self.fake_config_json.get(n_const.OVSDB_IDENTIFIER)
+        self.l2gw_agent_manager.gateways[ovsdb_ident] = gateway
+        with mock.patch.object(asyncio_engine,
+                               'AsyncioOVSDBSession') as ovsdb_connection, \
+                mock.patch.object(manager.OVSDBManager,
+                                  'agent_to_plugin_rpc') as call_back, \
+                mock.patch.object(self.plugin_rpc, 'notify_ovsdb_states'):
+            self.l2gw_agent_manager._connect_to_ovsdb_server()
+            ovsdb_connection.assert_called_with(
+                self.conf.ovsdb, gateway, call_back, connect_retries=0)
+            self.assertEqual(ovsdb_connection.return_value, gateway.ovsdb_fd)
+
+    def test_init_with_asyncio_engine_unsupported(self):
+        cfg.CONF.set_override('ovsdb_engine', 'asyncio', 'ovsdb')
+        with mock.patch.object(asyncio_engine, 'is_supported',
+                               return_value=False), \
+                mock.patch.object(manager.LOG, 'warning') as logger_call:
+            l2gw_agent_manager = manager.OVSDBManager(self.conf)
+        self.assertEqual('eventlet', l2gw_agent_manager.ovsdb_engine)
+        self.assertTrue(logger_call.called)
+
+    def test_report_dispatch_queue_depth(self):
+        connections = [mock.Mock(), None, mock.Mock()]
+        connections[0].dispatcher.queue_depth.return_value = 3
+        connections[2].dispatcher.queue_depth.return_value = 4
+        self.l2gw_agent_manager._report_dispatch_queue_depth(connections)
+        self.assertEqual(7, self.l2gw_agent_manager.agent_state.get(
+            'configurations')['dispatch_queue_depth'])
+
+    def test_report_handshake_latency(self):
+        self.l2gw_agent_manager.ovsdb_fd = mock.Mock()
+        handshakes = self.l2gw_agent_manager.ovsdb_fd.handshakes
+        handshakes.latency_summary.return_value = {}
+        self.l2gw_agent_manager._report_handshake_latency()
+        self.assertNotIn('handshake_latency',
+                         self.l2gw_agent_manager.agent_state.get(
+                             'configurations'))
+        latency = {'count': 2, 'median': 0.2, 'p99': 0.5, 'max': 0.5}
+        handshakes.latency_summary.return_value = latency
+        self.l2gw_agent_manager._report_handshake_latency()
+        self.assertEqual(latency, self.l2gw_agent_manager.agent_state.get(
+            'configurations')['handshake_latency'])
+
+    def test_agent_to_plugin_rpc(self):
+        """Test case to test the changes sent through the coalescer."""
+        ovsdb_data = {n_const.OVSDB_IDENTIFIER: 'fake_ovsdb_id',
+                      'new_local_macs': [{'uuid': 'mac1'}]}
+        with mock.patch.object(eventlet, 'spawn_after'):
+            self.l2gw_agent_manager.agent_to_plugin_rpc(
+                ovsdb_monitor.Activity.Update, ovsdb_data)
+            self.assertFalse(self.plugin_rpc.update_ovsdb_changes.called)
+            self.l2gw_agent_manager.agent_to_plugin_rpc(
+                ovsdb_monitor.Activity.Initial, ovsdb_data)
+            self.plugin_rpc.update_ovsdb_changes.assert_called_once_with(
+                mock.ANY, ovsdb_monitor.Activity.Initial, ovsdb_data)
 
     def test_connect_to_ovsdb_server_with_exc(self):
         self.l2gw_agent_manager.gateways = {}
@@ -174,15 +279,137 @@ class TestManager(base.BaseTestCase):
         gateway = l2gateway_config.L2GatewayConfig(self.fake_config_json)
         ovsdb_ident = self.fake_config_json.get(n_const.OVSDB_IDENTIFIER)
         self.l2gw_agent_manager.gateways[ovsdb_ident] = gateway
-        with mock.patch.object(ovsdb_monitor.OVSDBMonitor,
-                               '__init__',
+        with mock.patch.object(ovsdb_common_class, 'OVSDB_commom_class',
                                side_effect=socket.error
-                               ), \
-                mock.patch.object(eventlet.greenthread,
-                                  'spawn_n') as event_spawn, \
+                               ) as ovsdb_connection, \
                 mock.patch.object(manager.LOG, 'error'):
             self.l2gw_agent_manager._connect_to_ovsdb_server()
-            event_spawn.assert_not_called()
+            self.assertTrue(ovsdb_connection.called)
+            self.assertIsNone(gateway.ovsdb_fd)
+
+    def test_connect_to_ovsdb_server_with_backoff(self):
+        self.l2gw_agent_manager.gateways = {}
+        self.l2gw_agent_manager.l2gw_agent_type = n_const.MONITOR
+        gateway = l2gateway_config.L2GatewayConfig(self.fake_config_json)
+        ovsdb_ident = self.fake_config_json.get(n_const.OVSDB_IDENTIFIER)
+        self.l2gw_agent_manager.gateways[ovsdb_ident] = gateway
+        with mock.patch.object(ovsdb_common_class, 'OVSDB_commom_class',
+                               side_effect=socket.error) as ovsdb_connection, \
+                mock.patch.object(manager.LOG, 'error'), \
+                mock.patch.object(self.plugin_rpc,
+                                  'notify_ovsdb_states') as notify:
+            self.l2gw_agent_manager._connect_to_ovsdb_server()
+            notify.assert_called_with(mock.ANY,
+                                      {ovsdb_ident: 'disconnected'})
+            # The next attempt is not due before the backoff delay.
+            self.l2gw_agent_manager._connect_to_ovsdb_server()
+            self.assertEqual(1, ovsdb_connection.call_count)
+            conn_state = self.l2gw_agent_manager.connection_states[
+                ovsdb_ident]
+            self.assertEqual(1, conn_state.failures)
+            conn_state.next_attempt = 0
+            self.l2gw_agent_manager._connect_to_ovsdb_server()
+            self.assertEqual(2, ovsdb_connection.call_count)
+            self.assertEqual(2, conn_state.failures)
+
+    def test_connect_to_ovsdb_server_connection_lost(self):
+        self.l2gw_agent_manager.gateways = {}
+        self.l2gw_agent_manager.l2gw_agent_type = n_const.MONITOR
+        gateway = l2gateway_config.L2GatewayConfig(self.fake_config_json)
+        ovsdb_ident = self.fake_config_json.get(n_const.OVSDB_IDENTIFIER)
+        self.l2gw_agent_manager.gateways[ovsdb_ident] = gateway
+        with mock.patch.object(ovsdb_common_class,
+                               'OVSDB_commom_class') as ovsdb_connection, \
+                mock.patch.object(self.plugin_rpc, 'notify_ovsdb_states'):
+            self.l2gw_agent_manager._connect_to_ovsdb_server()
+            self.l2gw_agent_manager._connect_to_ovsdb_server()
+            self.assertEqual(1, ovsdb_connection.call_count)
+            gateway.ovsdb_fd.connected = False
+            self.l2gw_agent_manager._connect_to_ovsdb_server()
+            self.assertEqual(2, ovsdb_connection.call_count)
+
+    def test_connect_to_ovsdb_server_monitor_failure(self):
+        self.l2gw_agent_manager.gateways = {}
+        self.l2gw_agent_manager.l2gw_agent_type = n_const.MONITOR
+        gateway = l2gateway_config.L2GatewayConfig(self.fake_config_json)
+        ovsdb_ident = self.fake_config_json.get(n_const.OVSDB_IDENTIFIER)
+        self.l2gw_agent_manager.gateways[ovsdb_ident] = gateway
+        with mock.patch.object(ovsdb_common_class,
+                               'OVSDB_commom_class') as ovsdb_connection, \
+                mock.patch.object(manager.LOG, 'error') as logger_call, \
+                mock.patch.object(self.plugin_rpc,
+                                  'notify_ovsdb_states') as notify:
+            ovsdb_fd = ovsdb_connection.return_value
+            ovsdb_fd.connected = True
+
+            def _disconnect():
+                ovsdb_fd.connected = False
+
+            ovsdb_fd.disconnect.side_effect = _disconnect
+            ovsdb_fd.set_monitor_response_handler.side_effect = (
+                socket.timeout)
+            self.l2gw_agent_manager._connect_to_ovsdb_server()
+            self.assertTrue(ovsdb_fd.disconnect.called)
+            self.assertTrue(logger_call.called)
+            notify.assert_called_once_with(mock.ANY,
+                                           {ovsdb_ident: 'disconnected'})
+            self.assertEqual(1, self.l2gw_agent_manager.connection_states[
+                ovsdb_ident].failures)
+
+    def test_connect_to_ovsdb_server_concurrently(self):
+        self.l2gw_agent_manager.gateways = {}
+        self.l2gw_agent_manager.l2gw_agent_type = n_const.MONITOR
+        cfg.CONF.set_override('connection_concurrency', 2, 'ovsdb')
+        for ident in ('ovsdb1', 'ovsdb2', 'ovsdb3'):
+            self.l2gw_agent_manager.gateways[ident] = mock.Mock(
+                ovsdb_fd=None)
+        running = []
+        peak = []
+
+        def _connect(ovsdb_identifier, gateway):
+            running.append(ovsdb_identifier)
+            peak.append(len(running))
+            eventlet.sleep(0)
+            running.remove(ovsdb_identifier)
+            return ('connected' if ovsdb_identifier != 'ovsdb2'
+                    else 'disconnected')
+
+        with mock.patch.object(self.l2gw_agent_manager,
+                               '_connect_to_gateway',
+                               side_effect=_connect), \
+                mock.patch.object(self.plugin_rpc,
+                                  'notify_ovsdb_states') as notify:
+            self.l2gw_agent_manager._connect_to_ovsdb_server()
+            self.assertEqual(2, max(peak))
+            notify.assert_called_once_with(mock.ANY,
+                                           {'ovsdb1': 'connected',
+                                            'ovsdb2': 'disconnected',
+                                            'ovsdb3': 'connected'})
+
+    def test_time_to_all_monitored(self):
+        self.l2gw_agent_manager.gateways = {
+            'ovsdb1': mock.Mock(ovsdb_fd=None),
+            'ovsdb2': mock.Mock(ovsdb_fd=None)}
+        self.l2gw_agent_manager.l2gw_agent_type = n_const.MONITOR
+        self.l2gw_agent_manager.looping_task._running = False
+        states = {'ovsdb1': 'connected', 'ovsdb2': 'disconnected'}
+        with mock.patch.object(time, 'time', return_value=100.0):
+            self.l2gw_agent_manager._start_looping_task()
+        with mock.patch.object(self.l2gw_agent_manager,
+                               '_connect_to_gateway',
+                               side_effect=lambda key, gw: states[key]), \
+                mock.patch.object(self.plugin_rpc, 'notify_ovsdb_states'), \
+                mock.patch.object(time, 'time', return_value=102.5), \
+                mock.patch.object(manager.LOG, 'info') as logger_call:
+            self.l2gw_agent_manager._connect_to_ovsdb_server()
+            self.assertIsNone(self.l2gw_agent_manager.time_to_all_monitored)
+            states['ovsdb2'] = 'connected'
+            self.l2gw_agent_manager._connect_to_ovsdb_server()
+            self.assertEqual(2.5,
+                             self.l2gw_agent_manager.time_to_all_monitored)
+            self.assertEqual(2.5, self.l2gw_agent_manager.agent_state[
+                'configurations']['time_to_all_monitored'])
+            self.assertTrue(logger_call.called)
 
     def test_handle_report_state_failure(self):
         self.l2gw_agent_manager.l2gw_agent_type = n_const.MONITOR
@@ -207,6 +434,50 @@ class TestManager(base.BaseTestCase):
             self.assertTrue(mock_disconnect_ovsdb_servers.called)
             self.assertTrue(mock_stop_looping.called)
 
+    def test_monitor_after_report_state_failure(self):
+        """Test case to test all the rows sent after a report failure."""
+        gateway = l2gateway_config.L2GatewayConfig(self.fake_config_json)
+        self.l2gw_agent_manager.gateways = {'fake_ovsdb_identifier': gateway}
+        self.l2gw_agent_manager.l2gw_agent_type = n_const.MONITOR
+        rows = monitor_cond.MonitoredRows()
+        rows.last_txn_id = 'txn1'
+        gateway.monitored_rows[None] = rows
+        with mock.patch.object(eventlet, 'spawn_after') as spawn_after:
+            self.l2gw_agent_manager.update_coalescer.submit(
+                ovsdb_monitor.Activity.Update,
+                {n_const.OVSDB_IDENTIFIER: 'fake_ovsdb_identifier',
+                 'new_logical_switches': [{'uuid': 'ls1'}]})
+        with mock.patch.object(self.l2gw_agent_manager,
+                               '_stop_looping_task'), \
+                mock.patch.object(self.l2gw_agent_manager,
+                                  '_send_ovsdb_changes') as send_changes:
+            self.l2gw_agent_manager.handle_report_state_failure()
+            self.l2gw_agent_manager.update_coalescer.flush(
+                'fake_ovsdb_identifier')
+        self.assertEqual({}, gateway.monitored_rows)
+        self.assertFalse(send_changes.called)
+        spawn_after.return_value.cancel.assert_called_once_with()
+        callback = mock.Mock()
+        reply = {'result': [False, 'txn2', {'Logical_Switch': {
+            'ls1': {'initial': {'name': 'net1'}}}}]}
+        with mock.patch('socket.socket'), \
+                mock.patch.object(base_connection.BaseConnection,
+                                  'ssl_contexts'), \
+                mock.patch.object(eventlet.greenthread, 'spawn_n'), \
+                mock.patch.object(ovsdb_monitor.OVSDBMonitor, 'send',
+                                  return_value=True) as send, \
+                mock.patch.object(ovsdb_monitor.OVSDBMonitor, '_response',
+                                  return_value=reply):
+            monitor = ovsdb_monitor.OVSDBMonitor(self.conf.ovsdb, gateway,
+                                                 callback)
+            monitor.connected = True
+            monitor.set_monitor_response_handler()
+        self.assertEqual(monitor_cond.ZERO_TXN_ID,
+                         send.call_args_list[0][0][0]['params'][3])
+        activity, data = callback.call_args[0]
+        self.assertEqual(ovsdb_monitor.Activity.Initial, activity)
+        self.assertEqual('ls1', data['new_logical_switches'][0]['uuid'])
+
     def test_is_valid_request_fails(self):
         self.l2gw_agent_manager.gateways = {}
         fake_ovsdb_identifier = 'fake_ovsdb_identifier_2'
@@ -235,6 +506,42 @@ class TestManager(base.BaseTestCase):
                     self.assertEqual(0, logger_call.call_count)
                     self.assertTrue(ovsdb_connection.called)
 
+    def test_open_connection_shares_monitor_session(self):
+        self.l2gw_agent_manager.gateways = {}
+        gateway = l2gateway_config.L2GatewayConfig(self.fake_config_json)
+        gateway.ovsdb_fd = mock.Mock(connected=True, endpoint=None)
+        self.l2gw_agent_manager.gateways['fake_ovsdb_identifier'] = gateway
+        with mock.patch.object(ovsdb_writer,
+                               'OVSDBWriter') as ovsdb_connection:
+            with self.l2gw_agent_manager._open_connection(
+                    'fake_ovsdb_identifier') as ovsdb_fd:
+                self.assertEqual(gateway.ovsdb_fd, ovsdb_fd)
+            self.assertFalse(ovsdb_connection.called)
+            # The writer pool is used once the monitor session is lost.
+            gateway.ovsdb_fd.connected = False
+            with self.l2gw_agent_manager._open_connection(
+                    'fake_ovsdb_identifier') as ovsdb_fd:
+                self.assertEqual(ovsdb_connection.return_value, ovsdb_fd)
+
+    def test_open_connection_with_follower_monitor_session(self):
+        self.l2gw_agent_manager.gateways = {}
+        gateway = l2gateway_config.L2GatewayConfig(self.fake_config_json)
+        gateway.add_endpoint('5.5.5.6', '6632')
+        gateway.ovsdb_fd = mock.Mock(connected=True, endpoint=0,
+                                     cluster_role=cluster.FOLLOWER,
+                                     leader_epoch=0)
+        self.l2gw_agent_manager.gateways['fake_ovsdb_identifier'] = gateway
+        with mock.patch.object(ovsdb_writer,
+                               'OVSDBWriter') as ovsdb_connection:
+            # The transactions go to the leader.
+            with self.l2gw_agent_manager._open_connection(
+                    'fake_ovsdb_identifier') as ovsdb_fd:
+                self.assertEqual(ovsdb_connection.return_value, ovsdb_fd)
+            gateway.ovsdb_fd.cluster_role = cluster.LEADER
+            with self.l2gw_agent_manager._open_connection(
+                    'fake_ovsdb_identifier') as ovsdb_fd:
+                self.assertEqual(gateway.ovsdb_fd, ovsdb_fd)
+
     def test_open_connection_with_socket_error(self):
         self.l2gw_agent_manager.gateways = {}
         gateway = l2gateway_config.L2GatewayConfig(self.fake_config_json)
@@ -295,7 +602,7 @@ class TestManager(base.BaseTestCase):
             self.l2gw_agent_manager.ovsdb_fd = mock_ovsdb_common.return_value
             self.l2gw_agent_manager.ovsdb_fd.check_monitor_table_thread = False
             self.l2gw_agent_manager.ovsdb_fd.check_sock_rcv = True
-            self.l2gw_agent_manager.ovsdb_fd.ovsdb_conn_list = ["fake_ip"]
+            self.l2gw_agent_manager.ovsdb_fd.ovsdb_conn_list = {"fake_ip"}
             self.l2gw_agent_manager.ovsdb_fd.ovsdb_dicts = {
                 "fake_ip": "fake_sock"}
             self.l2gw_agent_manager.set_monitor_agent(self.context,
@@ -335,7 +642,7 @@ class TestManager(base.BaseTestCase):
                 mock.patch.object(manager.OVSDBManager,
                                   '_sock_open_connection') as mock_open_conn:
             self.l2gw_agent_manager.ovsdb_fd = mock_ovsdb_common.return_value
-            self.l2gw_agent_manager.ovsdb_fd.ovsdb_conn_list = ['fake_ip']
+            self.l2gw_agent_manager.ovsdb_fd.ovsdb_conn_list = {'fake_ip'}
             self.l2gw_agent_manager.update_connection_to_gateway(
                 self.context, 'fake_ip', mock.Mock(), mock.Mock(),
                 mock.Mock(), mock.Mock(), fake_op_method)
@@ -406,7 +713,7 @@ class TestManager(base.BaseTestCase):
                 mock.patch.object(manager.OVSDBManager,
                                   '_sock_open_connection') as mock_open_conn:
             self.l2gw_agent_manager.ovsdb_fd = mock_ovsdb_common.return_value
-            self.l2gw_agent_manager.ovsdb_fd.ovsdb_conn_list = ['fake_ip']
+            self.l2gw_agent_manager.ovsdb_fd.ovsdb_conn_list = {'fake_ip'}
             self.l2gw_agent_manager.delete_network(
                 self.context, 'fake_ip', "fake_logical_switch_uuid")
             self.assertTrue(mock_open_conn.called)
@@ -439,7 +746,7 @@ class TestManager(base.BaseTestCase):
                                   '_sock_open_connection') as mock_open_conn:
             self.l2gw_agent_manager.ovsdb_fd = mock_ovsdb_common.return_value
             self.l2gw_agent_manager.ovsdb_fd.check_c_sock = True
-            self.l2gw_agent_manager.ovsdb_fd.ovsdb_conn_list = ['fake_ip']
+            self.l2gw_agent_manager.ovsdb_fd.ovsdb_conn_list = {'fake_ip'}
             self.l2gw_agent_manager.add_vif_to_gateway(
                 self.context, 'fake_ip', "fake_logical_switch_dict",
                 "fake_locator_dict", "fake_mac_dict")
@@ -496,7 +803,7 @@ class TestManager(base.BaseTestCase):
                 mock.patch.object(manager.OVSDBManager,
                                   '_sock_open_connection') as mock_open_conn:
             self.l2gw_agent_manager.ovsdb_fd = mock_ovsdb_common.return_value
-            self.l2gw_agent_manager.ovsdb_fd.ovsdb_conn_list = ['fake_ip']
+            self.l2gw_agent_manager.ovsdb_fd.ovsdb_conn_list = {'fake_ip'}
             self.l2gw_agent_manager.delete_vif_from_gateway(
                 self.context, 'fake_ip', "fake_logical_switch_uuid",
                 "fake_mac")
@@ -553,7 +860,7 @@ class TestManager(base.BaseTestCase):
                 mock.patch.object(manager.OVSDBManager,
                                   '_sock_open_connection') as mock_open_conn:
             self.l2gw_agent_manager.ovsdb_fd = mock_ovsdb_common.return_value
-            self.l2gw_agent_manager.ovsdb_fd.ovsdb_conn_list = ['fake_ip']
+            self.l2gw_agent_manager.ovsdb_fd.ovsdb_conn_list = {'fake_ip'}
             self.l2gw_agent_manager.update_vif_to_gateway(
                 self.context, 'fake_ip', "fake_logical_switch_uuid",
                 "fake_mac")
@@ -0,0 +1,109 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from neutron.tests import base
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import monitor_cond
+from networking_l2gw.services.l2gateway.agent.ovsdb import schema
+
+
+class TestMonitorCond(base.BaseTestCase):
+    def test_monitor_request(self):
+        """Test case to test the conditions of the monitor request."""
+        request = monitor_cond.monitor_request('op', monitor_cond.MONITOR_COND,
+                                               ['ls2', 'ls1'])
+        self.assertEqual(monitor_cond.MONITOR_ID, request['params'][1])
+        tables = request['params'][2]
+        self.assertEqual(set(monitor_cond.MONITORED_TABLES), set(tables))
+        self.assertEqual([['logical_switch', '==', ['uuid', 'ls1']],
+                          ['logical_switch', '==', ['uuid', 'ls2']]],
+                         tables['Ucast_Macs_Remote'][0]['where'])
+        self.assertNotIn('where', tables['Physical_Locator'][0])
+        request = monitor_cond.monitor_request('op', monitor_cond.MONITOR)
+        self.assertIsNone(request['params'][1])
+        self.assertNotIn('where', request['params'][2]['Ucast_Macs_Local'][0])
+        self.assertEqual([False], monitor_cond.condition(()))
+        self.assertEqual([True], monitor_cond.condition(None))
+        self.assertEqual(['name', 'vlan_bindings', 'port_fault_status'],
+                         request['params'][2]['Physical_Port'][0]['columns'])
+        request = monitor_cond.monitor_request(
+            'op', monitor_cond.MONITOR_COND_SINCE, (), last_txn_id='txn1')
+        self.assertEqual('txn1', request['params'][3])
+        self.assertEqual([False],
+                         request['params'][2]['Mcast_Macs_Local'][0]['where'])
+        # The MAC tables are monitored whole until the bindings are known.
+        request = monitor_cond.monitor_request('op',
+                                               monitor_cond.MONITOR_COND)
+        self.assertEqual([True],
+                         request['params'][2]['Ucast_Macs_Local'][0]['where'])
+
+    def test_apply_diff(self):
+        """Test case to test the columns modified by update2 diffs."""
+        columns = schema.columns('Physical_Switch')
+        self.assertEqual('sw2', monitor_cond.apply_diff(
+            columns['name'], 'sw1', 'sw2'))
+        ports = ['set', [['uuid', 'p1'], ['uuid', 'p2']]]
+        self.assertEqual(['uuid', 'p2'], monitor_cond.apply_diff(
+            columns['ports'], ports, ['uuid', 'p1']))
+        self.assertEqual(['set', [['uuid', 'p1'], ['uuid', 'p3']]],
+                         monitor_cond.apply_diff(
+                             columns['ports'], ports,
+                             ['set', [['uuid', 'p2'], ['uuid', 'p3']]]))
+        bindings = ['map', [[100, ['uuid', 'ls1']], [200, ['uuid', 'ls2']]]]
+        self.assertEqual(
+            ['map', [[200, ['uuid', 'ls3']], [300, ['uuid', 'ls1']]]],
+            monitor_cond.apply_diff(
+                schema.columns('Physical_Port')['vlan_bindings'], bindings,
+                ['map', [[100, ['uuid', 'ls1']], [200, ['uuid', 'ls3']],
+                         [300, ['uuid', 'ls1']]]]))
+        # Optional columns are sets of at most one element.
+        self.assertEqual(7, monitor_cond.apply_diff(
+            schema.columns('Logical_Switch')['tunnel_key'], 5,
+            ['set', [5, 7]]))
+
+    def test_monitored_rows(self):
+        """Test case to test the rows kept for the conditional monitor."""
+        rows = monitor_cond.MonitoredRows(['ls1'])
+        self.assertEqual(frozenset(['ls1']), rows.switches)
+        updates = rows.apply({'Physical_Port': {'port1': {'insert': {
+            'name': 'port1', 'other_config': ['map', [['k', 'v']]],
+            'vlan_bindings': ['map', [[100, ['uuid', 'ls1']]]]}}}})
+        new_row = updates['Physical_Port']['port1']['new']
+        # The columns holding their default value are filled in, the
+        # columns not monitored are dropped.
+        self.assertEqual(['set', []], new_row['port_fault_status'])
+        self.assertEqual(set(monitor_cond.MONITORED_COLUMNS['Physical_Port']),
+                         set(new_row))
+        self.assertEqual(frozenset(['ls1']), rows.connected_switches())
+        updates = rows.apply({'Physical_Port': {'port1': {'modify': {
+            'port_fault_status': 'down', 'description': 'uplink'}}}})
+        self.assertEqual({'port_fault_status': ['set', []]},
+                         updates['Physical_Port']['port1']['old'])
+        new_row = updates['Physical_Port']['port1']['new']
+        self.assertEqual('down', new_row['port_fault_status'])
+        # The columns not changed are not copied.
+        self.assertIs(rows.rows['Physical_Port']['port1']['vlan_bindings'],
+                      new_row['vlan_bindings'])
+        # Nothing is processed for modifications without effect.
+        self.assertEqual({}, rows.apply({'Physical_Port': {'port1': {
+            'modify': {'name': 'port1', 'description': 'uplink'}}}}))
+        self.assertEqual(frozenset(['ls1']), rows.connected_switches())
+        updates = rows.apply({'Physical_Port': {
+            'port1': {'delete': None}, 'unknown': {'delete': None}}})
+        self.assertEqual('port1', updates['Physical_Port']['port1']['old'][
+            'name'])
+        self.assertNotIn('unknown', updates['Physical_Port'])
+        self.assertEqual(frozenset(), rows.connected_switches())
@@ -0,0 +1,165 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+
+import eventlet
+from eventlet import event
+from eventlet.green import socket as green_socket
+import mock
+import testtools
+
+from neutron.tests import base
+from oslo_serialization import jsonutils
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import dispatcher
+from networking_l2gw.services.l2gateway.agent.ovsdb import framer
+from networking_l2gw.services.l2gateway.agent.ovsdb import handshake
+from networking_l2gw.services.l2gateway.agent.ovsdb import multiplexer
+
+
+@testtools.skipUnless(multiplexer.is_supported(),
+                      'epoll is not available')
+class TestMultiplexer(base.BaseTestCase):
+    def setUp(self):
+        super(TestMultiplexer, self).setUp()
+        self.connection = mock.Mock()
+        self.connection._get_framer.side_effect = (
+            lambda addr: framer.MessageFramer())
+        self.connection._on_peer_messages.side_effect = (
+            lambda addr, messages: messages)
+        self.connection.dispatcher = dispatcher.Dispatcher(
+            self.connection, 4, 2)
+        self.mux = multiplexer.Multiplexer(self.connection)
+        self.connection._admit_peer.side_effect = self._admit_peer
+        self.connection._on_peer_closed.side_effect = self.mux.remove_peer
+
+    def _admit_peer(self, sock, addr):
+        self.addCleanup(sock.close)
+        self.mux.add_peer(addr, sock)
+
+    def _wait_for(self, condition):
+        with eventlet.Timeout(5):
+            while not condition():
+                eventlet.sleep(0.01)
+
+    def test_peer_read(self):
+        """Test case to test the reads of a peer which do not block."""
+        sock, remote = socket.socketpair()
+        self.addCleanup(sock.close)
+        peer = multiplexer.Peer('fake_ip', sock, framer.MessageFramer())
+        self.assertEqual([], peer.read())
+        remote.sendall(b'{"id": 1}{"id"')
+        self.assertEqual([{'id': 1}], peer.read())
+        remote.close()
+        self.assertIsNone(peer.read())
+
+    def test_add_and_remove_peer(self):
+        """Test case to test that peers are indexed by address."""
+        sock1, remote1 = socket.socketpair()
+        sock2, remote2 = socket.socketpair()
+        for sock in (sock1, remote1, sock2, remote2):
+            self.addCleanup(sock.close)
+        self.mux.add_peer('fake_ip', sock1)
+        peer = self.mux.add_peer('fake_ip', sock2)
+        self.assertEqual({'fake_ip': peer}, self.mux.peers)
+        self.assertEqual(peer, self.mux.remove_peer('fake_ip'))
+        self.assertIsNone(self.mux.remove_peer('fake_ip'))
+        self.assertFalse(self.mux.peers)
+
+    def test_run(self):
+        """Test case to test that every connection is read by one loop."""
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.addCleanup(listener.close)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(5)
+        loop = eventlet.spawn(self.mux.run, listener)
+        self.addCleanup(loop.kill)
+        received = []
+        self.connection._on_remote_message.side_effect = (
+            lambda message, addr: received.append(message['id']))
+        clients = []
+        for index in range(3):
+            client = green_socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            client.connect(listener.getsockname())
+            clients.append(client)
+            client.sendall(jsonutils.dumps(
+                {'method': 'echo', 'params': [], 'id': index}).encode())
+            self._wait_for(lambda: len(received) == index + 1)
+        self.assertEqual([0, 1, 2], received)
+        # All the clients share the address, the latest replaced the others.
+        self.assertEqual(['127.0.0.1'], list(self.mux.peers))
+        clients[-1].close()
+        self._wait_for(lambda: self.connection._on_peer_closed.called)
+        self.connection._on_peer_closed.assert_called_once_with('127.0.0.1')
+        self.mux.stop()
+        for client in clients[:-1]:
+            client.close()
+
+    def test_read_failure_closes_peer(self):
+        """Test case to test that a failing handler closes the peer."""
+        sock, remote = socket.socketpair()
+        self.addCleanup(sock.close)
+        self.addCleanup(remote.close)
+        peer = self.mux.add_peer('fake_ip', sock)
+        self.connection._on_peer_messages.side_effect = Exception
+        remote.sendall(b'{"id": 1}')
+        with mock.patch.object(multiplexer.LOG, 'exception') as logger_call:
+            self.mux._read(peer)
+            self.assertTrue(logger_call.called)
+        self.connection._on_peer_closed.assert_called_once_with('fake_ip')
+        self.assertFalse(self.connection._on_remote_message.called)
+
+    def test_read_pauses_peer(self):
+        """Test case to test that a peer is not polled while throttled."""
+        sock, remote = socket.socketpair()
+        self.addCleanup(sock.close)
+        self.addCleanup(remote.close)
+        peer = self.mux.add_peer('fake_ip', sock)
+        self.mux._epoll = mock.Mock()
+        release = event.Event()
+        self.connection._on_remote_message.side_effect = (
+            lambda message, addr: release.wait())
+        remote.sendall(b'{"id": 1}{"id": 2}{"id": 3}')
+        self.mux._read(peer)
+        self.mux._epoll.unregister.assert_called_once_with(peer.fileno)
+        eventlet.sleep(0)
+        self.assertFalse(self.mux._epoll.register.called)
+        release.send()
+        self._wait_for(lambda: self.mux._epoll.register.called)
+        self.mux._epoll.register.assert_called_once_with(
+            peer.fileno, multiplexer.select.EPOLLIN)
+        self._wait_for(
+            lambda: self.connection._on_remote_message.call_count == 3)
+
+    def test_accept_paused_without_room(self):
+        """Test case to test that the listener is not polled when full."""
+        handshakes = handshake.Handshakes(mock.Mock(), 1, 5, mock.Mock())
+        self.connection.handshakes = handshakes
+        handshakes.start('other_ip')
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.addCleanup(listener.close)
+        self.mux._listener = listener
+        self.mux._running = True
+        self.mux._epoll = mock.Mock()
+        self.mux._accept()
+        self.mux._epoll.unregister.assert_called_once_with(listener.fileno())
+        self.assertFalse(self.connection._admit_peer.called)
+        eventlet.sleep(0)
+        self.assertFalse(self.mux._epoll.register.called)
+        handshakes.finish('other_ip')
+        self._wait_for(lambda: self.mux._epoll.register.called)
+        self.mux._epoll.register.assert_called_once_with(
+            listener.fileno(), multiplexer.select.EPOLLIN)
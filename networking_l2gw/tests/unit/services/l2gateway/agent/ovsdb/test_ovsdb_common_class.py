@@ -0,0 +1,229 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os.path
+import shutil
+import tempfile
+
+import eventlet
+from eventlet.green import socket
+import mock
+
+from neutron.tests import base
+from oslo_config import cfg
+from oslo_serialization import jsonutils
+
+from networking_l2gw.services.l2gateway.agent import l2gateway_config as conf
+from networking_l2gw.services.l2gateway.agent.ovsdb import base_connection
+from networking_l2gw.services.l2gateway.agent.ovsdb import cluster
+from networking_l2gw.services.l2gateway.agent.ovsdb import framer
+from networking_l2gw.services.l2gateway.agent.ovsdb import (
+    ovsdb_common_class)
+from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_monitor
+from networking_l2gw.services.l2gateway.common import config
+from networking_l2gw.services.l2gateway.common import constants as n_const
+from networking_l2gw.services.l2gateway import exceptions
+
+
+class TestOVSDBCommonClass(base.BaseTestCase):
+    def setUp(self):
+        super(TestOVSDBCommonClass, self).setUp()
+        config.register_ovsdb_opts_helper(cfg.CONF)
+        cfg.CONF.set_override('response_timeout', 5, 'ovsdb')
+        sock, self.remote = socket.socketpair()
+        self.callback = mock.Mock()
+        # The session connects the local end of the socket pair.
+        with mock.patch('socket.socket', return_value=sock), \
+                mock.patch.object(base_connection.BaseConnection,
+                                  '_connect'):
+            self.session = ovsdb_common_class.OVSDB_commom_class(
+                mock.Mock(), self._gw_config(), self.callback)
+        self.addCleanup(self._disconnect)
+        self.framer = framer.MessageFramer()
+
+    def _gw_config(self):
+        return conf.L2GatewayConfig(
+            {n_const.OVSDB_IDENTIFIER: 'ovsdb1', 'ovsdb_ip': '1.1.1.1',
+             'ovsdb_port': '6632'})
+
+    def _disconnect(self):
+        # The receive thread of the session ends on the end of file.
+        self.remote.close()
+        with eventlet.Timeout(5):
+            while self.session.connected:
+                eventlet.sleep(0.01)
+
+    def _receive(self):
+        with eventlet.Timeout(5):
+            messages = self.framer.recv(self.remote)
+        self.assertEqual(1, len(messages))
+        return messages[0]
+
+    def _send(self, *messages):
+        self.remote.sendall(b''.join(
+            jsonutils.dump_as_bytes(message) for message in messages))
+
+    def test_transact_on_monitor_session(self):
+        """Test case to test transactions on the monitor session."""
+        self.session._set_handler('update',
+                                  self.session._update_event_handler)
+        writer = eventlet.spawn(self.session.delete_logical_switch,
+                                'fake_uuid', None)
+        request = self._receive()
+        self.assertEqual('transact', request['method'])
+        update = {'method': 'update', 'id': None,
+                  'params': [None, {}]}
+        echo = {'method': 'echo', 'params': [], 'id': 'echo'}
+        # Updates and echo requests may come before the reply.
+        self._send(update, echo, {'id': request['id'], 'error': None,
+                                  'result': [{}, {}]})
+        with eventlet.Timeout(5):
+            writer.wait()
+        self.assertEqual({'id': 'echo', 'result': [], 'error': None},
+                         self._receive())
+        self.callback.assert_called_once_with(ovsdb_monitor.Activity.Update,
+                                              mock.ANY)
+        self.assertEqual({}, self.session.requests)
+        self.assertTrue(self.session.connected)
+
+    def test_transact_error(self):
+        """Test case to test the error of an operation of a transaction."""
+        writer = eventlet.spawn(self.session.delete_logical_switch,
+                                'fake_uuid', None)
+        request = self._receive()
+        self._send({'id': request['id'], 'error': None,
+                    'result': [{'error': 'constraint violation'}]})
+        with eventlet.Timeout(5):
+            self.assertRaises(exceptions.OVSDBError, writer.wait)
+        self.assertTrue(self.session.connected)
+
+    def test_transact_connection_lost(self):
+        """Test case to test the transactions failed by a disconnection."""
+        writer = eventlet.spawn(self.session.delete_logical_switch,
+                                'fake_uuid', None)
+        self._receive()
+        with mock.patch.object(ovsdb_monitor.LOG, 'exception'):
+            self.remote.close()
+            with eventlet.Timeout(5):
+                self.assertRaises(exceptions.OVSDBError, writer.wait)
+        self.assertFalse(self.session.connected)
+
+
+class TestClusteredOVSDBSession(base.BaseTestCase):
+    def setUp(self):
+        super(TestClusteredOVSDBSession, self).setUp()
+        config.register_ovsdb_opts_helper(cfg.CONF)
+        cfg.CONF.set_override('response_timeout', 5, 'ovsdb')
+        # As in the agent, which is monkey patched.
+        green_socket = mock.patch('socket.socket', socket.socket)
+        green_socket.start()
+        self.addCleanup(green_socket.stop)
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        self.gw_config = None
+        # Whether each member is the leader.
+        self.leaders = [False, True, False]
+        self.remotes = {}
+        for index in range(len(self.leaders)):
+            sock_path = os.path.join(path, 'db%d.sock' % index)
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(sock_path)
+            listener.listen(5)
+            self.addCleanup(listener.close)
+            self.addCleanup(eventlet.spawn(self._serve, listener,
+                                           index).kill)
+            ovsdb_ip = conf.UNIX_SOCKET_PREFIX + sock_path
+            if self.gw_config is None:
+                self.gw_config = conf.L2GatewayConfig(
+                    {n_const.OVSDB_IDENTIFIER: 'ovsdb1',
+                     'ovsdb_ip': ovsdb_ip, 'ovsdb_port': None})
+            else:
+                self.gw_config.add_endpoint(ovsdb_ip, None)
+
+    def _serve(self, listener, index):
+        while True:
+            sock = listener.accept()[0]
+            messages = framer.MessageFramer().recv(sock)
+            if not messages:
+                sock.close()
+                continue
+            self.assertEqual('_Server', messages[0]['params'][0])
+            sock.sendall(jsonutils.dump_as_bytes(
+                {'id': messages[0]['id'], 'error': None,
+                 'result': self._database(self.leaders[index])}))
+            self.remotes[index] = sock
+
+    def _database(self, leader):
+        return {'Database': {'fake_uuid': {'new': {
+            'name': 'hardware_vtep', 'model': 'clustered',
+            'connected': True, 'leader': leader}}}}
+
+    def _session(self):
+        session = ovsdb_common_class.OVSDB_commom_class(
+            mock.Mock(), self.gw_config, mock.Mock(), connect_retries=0)
+        self.addCleanup(self._disconnect, session)
+        return session
+
+    def _disconnect(self, session):
+        for remote in self.remotes.values():
+            remote.close()
+        with eventlet.Timeout(5):
+            while session.connected:
+                eventlet.sleep(0.01)
+
+    def test_connects_to_leader(self):
+        """Test case to test a session connected to the leader."""
+        session = self._session()
+        self.assertEqual(1, session.endpoint)
+        self.assertEqual(cluster.LEADER, session.cluster_role)
+        self.assertEqual(1, self.gw_config.leader)
+        self.assertTrue(cluster.can_write(session, self.gw_config))
+        # The members are tried in turn until the leader is found.
+        self.assertEqual(set([0, 1]), set(self.remotes))
+
+    def test_monitor_from_follower(self):
+        """Test case to test a session monitoring a follower."""
+        cfg.CONF.set_override('monitor_from_follower', True, 'ovsdb')
+        self.gw_config.leader = 1
+        session = self._session()
+        self.assertEqual(0, session.endpoint)
+        self.assertEqual(cluster.FOLLOWER, session.cluster_role)
+        self.assertFalse(cluster.can_write(session, self.gw_config))
+
+    def test_leadership_lost(self):
+        """Test case to test the update of a member losing the leadership."""
+        session = self._session()
+        self.remotes[1].sendall(jsonutils.dump_as_bytes(
+            {'method': 'update', 'id': None,
+             'params': [cluster.SERVER_MONITOR_ID, self._database(False)]}))
+        with eventlet.Timeout(5):
+            while session.cluster_role == cluster.LEADER:
+                eventlet.sleep(0.01)
+        self.assertEqual(cluster.FOLLOWER, session.cluster_role)
+        self.assertIsNone(self.gw_config.leader)
+        self.assertFalse(cluster.can_write(session, self.gw_config))
+        # The session keeps monitoring the member.
+        self.assertTrue(session.connected)
+
+    def test_no_member_reachable(self):
+        """Test case to test a cluster with no member reachable."""
+        self.gw_config.endpoints = [('unix:/nonexistent/db%d.sock' % index,
+                                     None) for index in range(2)]
+        with mock.patch.object(base_connection.LOG, 'warning'), \
+                mock.patch.object(base_connection.LOG, 'exception'):
+            self.assertRaises(exceptions.OVSDBError,
+                              ovsdb_common_class.OVSDB_commom_class,
+                              mock.Mock(), self.gw_config, mock.Mock(),
+                              connect_retries=0)
@@ -13,8 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import socket
-import ssl
 
 import eventlet
 import mock
@@ -22,7 +22,10 @@ import mock
 from neutron.tests import base
 
 from networking_l2gw.services.l2gateway.agent import l2gateway_config as conf
+from networking_l2gw.services.l2gateway.agent.ovsdb import base_connection
+from networking_l2gw.services.l2gateway.agent.ovsdb import monitor_cond
 from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_monitor
+from networking_l2gw.services.l2gateway.agent.ovsdb import schema
 from networking_l2gw.services.l2gateway.common import config
 from networking_l2gw.services.l2gateway.common import constants as n_const
 from networking_l2gw.services.l2gateway.common import ovsdb_schema
@@ -37,17 +40,34 @@ from oslo_serialization import jsonutils
 LOG = logging.getLogger(__name__)
 
 
+class RecordingRow(dict):
+    """Row recording the columns read."""
+    def __init__(self, *args):
+        super(RecordingRow, self).__init__(*args)
+        self.read = set()
+
+    def get(self, key, default=None):
+        self.read.add(key)
+        return super(RecordingRow, self).get(key, default)
+
+    def __getitem__(self, key):
+        self.read.add(key)
+        return super(RecordingRow, self).__getitem__(key)
+
+
 class TestOVSDBMonitor(base.BaseTestCase):
     def setUp(self):
         super(TestOVSDBMonitor, self).setUp()
 
         self.conf = mock.patch.object(conf, 'L2GatewayConfig').start()
+        self.conf.monitored_rows = {}
         config.register_ovsdb_opts_helper(cfg.CONF)
         self.callback = mock.Mock()
         cfg.CONF.set_override('max_connection_retries', 0, 'ovsdb')
 
         self.sock = mock.patch('socket.socket').start()
-        self.ssl_sock = mock.patch.object(ssl, 'wrap_socket').start()
+        self.ssl_contexts = mock.patch.object(
+            base_connection.BaseConnection, 'ssl_contexts').start()
         self.greenthread = mock.patch.object(eventlet.greenthread,
                                              'spawn_n').start()
         self.l2gw_ovsdb = ovsdb_monitor.OVSDBMonitor(mock.Mock(),
@@ -84,7 +104,6 @@ class TestOVSDBMonitor(base.BaseTestCase):
         self.msg1 = {'result': fake_message}
         self.msg2 = {'method': 'update',
                      'params': ['', fake_message]}
-        self.l2gw_ovsdb.responses = [self.monitor_message]
 
     def test_init(self):
         """Test case to test __init__."""
@@ -103,6 +122,8 @@ class TestOVSDBMonitor(base.BaseTestCase):
     def test_setup_dispatch_table(self):
         expected_dict = {'Logical_Switch':
                          self.l2gw_ovsdb._process_logical_switch,
+                         'Physical_Switch':
+                         self.l2gw_ovsdb._process_physical_switch,
                          'Ucast_Macs_Local':
                          self.l2gw_ovsdb._process_ucast_macs_local,
                          'Physical_Locator':
@@ -118,23 +139,58 @@ class TestOVSDBMonitor(base.BaseTestCase):
         self.assertEqual(expected_dict, self.l2gw_ovsdb.dispatch_table)
 
     def test_set_monitor_response_handler(self):
-        """Test case to test _set_monitor_response_handler with error_msg."""
+        """Test case to test _set_monitor_response_handler."""
         self.l2gw_ovsdb.connected = True
         with mock.patch.object(ovsdb_monitor.OVSDBMonitor,
                                '_set_handler') as set_handler, \
                 mock.patch.object(ovsdb_monitor.OVSDBMonitor,
                                   'send', return_value=True) as send, \
                 mock.patch.object(ovsdb_monitor.OVSDBMonitor,
-                                  '_process_response',
-                                  return_value=(mock.ANY, False)) as process_resp, \
+                                  '_response',
+                                  return_value={'result': [False, 'txn1',
+                                                           {}]}) as resp, \
                 mock.patch.object(ovsdb_monitor.OVSDBMonitor,
-                                  '_process_monitor_msg') as process_monitor_msg, \
-                mock.patch.object(ovsdb_monitor.LOG, 'warning'):
+                                  '_process_monitor_cond_msg'
+                                  ) as process_monitor_msg:
             self.l2gw_ovsdb.set_monitor_response_handler()
-            self.assertTrue(set_handler.called)
-            self.assertTrue(send.called)
-            self.assertTrue(process_monitor_msg.called)
-            self.assertTrue(process_resp.called)
+            set_handler.assert_any_call(
+                'update2', self.l2gw_ovsdb._update2_event_handler)
+            set_handler.assert_any_call(
+                'update3', self.l2gw_ovsdb._update3_event_handler)
+            request = send.call_args[0][0]
+            self.assertEqual(monitor_cond.MONITOR_COND_SINCE,
+                             request['method'])
+            self.assertEqual(monitor_cond.ZERO_TXN_ID, request['params'][3])
+            process_monitor_msg.assert_called_once_with(
+                {'result': [False, 'txn1', {}]}, None,
+                monitor_cond.MONITOR_COND_SINCE)
+            self.assertTrue(resp.called)
+            self.assertIn(None, self.l2gw_ovsdb.monitored_rows)
+
+    def test_set_monitor_response_handler_fallback(self):
+        """Test case to test the fallback to the unconditional monitor."""
+        self.l2gw_ovsdb.connected = True
+        with mock.patch.object(ovsdb_monitor.OVSDBMonitor,
+                               'send', return_value=True) as send, \
+                mock.patch.object(ovsdb_monitor.OVSDBMonitor, '_response',
+                                  side_effect=[{'error': 'unknown method'},
+                                               {'error': 'unknown method'},
+                                               {'result': {}},
+                                               {'result': {}}]), \
+                mock.patch.object(ovsdb_monitor.OVSDBMonitor,
+                                  '_process_monitor_msg') as process_msg:
+            self.l2gw_ovsdb.set_monitor_response_handler()
+            self.assertEqual([monitor_cond.MONITOR_COND_SINCE,
+                              monitor_cond.MONITOR_COND,
+                              monitor_cond.MONITOR],
+                             [call[0][0]['method']
+                              for call in send.call_args_list])
+            process_msg.assert_called_once_with({'result': {}}, None)
+            self.assertNotIn(None, self.l2gw_ovsdb.monitored_rows)
+            # The OVSDB server is not asked again after a reconnect.
+            self.l2gw_ovsdb.set_monitor_response_handler()
+            self.assertEqual(monitor_cond.MONITOR,
+                             send.call_args[0][0]['method'])
 
     def test_set_monitor_response_handler_with_error_in_send(self):
         """Test case to test _set_monitor_response_handler."""
@@ -144,18 +200,192 @@ class TestOVSDBMonitor(base.BaseTestCase):
                 mock.patch.object(ovsdb_monitor.OVSDBMonitor,
                                   'send', return_value=False) as send, \
                 mock.patch.object(ovsdb_monitor.OVSDBMonitor,
-                                  '_process_response',
-                                  return_value=(mock.ANY, True)) as process_resp, \
+                                  '_response') as resp, \
                 mock.patch.object(ovsdb_monitor.OVSDBMonitor,
-                                  '_process_monitor_msg') as process_monitor_msg, \
+                                  '_process_monitor_cond_msg'
+                                  ) as process_monitor_msg, \
                 mock.patch.object(ovsdb_monitor.LOG,
                                   'warning'):
             self.l2gw_ovsdb.set_monitor_response_handler()
             self.assertTrue(set_handler.called)
             self.assertTrue(send.called)
-            self.assertFalse(process_resp.called)
+            self.assertFalse(resp.called)
             self.assertFalse(process_monitor_msg.called)
 
+    def test_conditional_monitor(self):
+        """Test case to test the monitor scoped to the logical switches."""
+        port = {'name': 'port1',
+                'vlan_bindings': ['map', [[100, ['uuid', 'ls1']]]]}
+        mac = {'MAC': 'fa:16:3e:00:00:01',
+               'logical_switch': ['uuid', 'ls1'],
+               'locator': ['uuid', 'loc1'], 'ipaddr': '10.0.0.1'}
+        rows = monitor_cond.MonitoredRows()
+        self.l2gw_ovsdb.monitored_rows[None] = rows
+        with mock.patch.object(ovsdb_monitor.OVSDBMonitor, 'send',
+                               return_value=True) as send:
+            # Received before the reply to the monitor request.
+            self.l2gw_ovsdb._update2_event_handler(
+                {'method': 'update2',
+                 'params': [monitor_cond.MONITOR_ID, {'Ucast_Macs_Local': {
+                     'mac1': {'insert': mac}}}]}, None)
+            self.assertFalse(self.callback.called)
+            self.l2gw_ovsdb._process_monitor_cond_msg(
+                {'result': {'Physical_Port': {'port1': {'initial': port}},
+                            'Logical_Switch': {'ls1': {'initial': {
+                                'name': 'net1'}}}}})
+            initial = self.callback.call_args_list[0][0]
+            self.assertEqual(ovsdb_monitor.Activity.Initial, initial[0])
+            self.assertEqual('net1', initial[1]['new_logical_switches'][0][
+                'name'])
+            self.assertEqual('fa:16:3e:00:00:01', self.callback.call_args[0][
+                1]['new_local_macs'][0]['mac'])
+            self.assertTrue(rows.loaded)
+            # The MAC tables are scoped to the logical switch bound.
+            send.assert_called_once_with(mock.ANY, addr=None)
+            request = send.call_args[0][0]
+            self.assertEqual('monitor_cond_change', request['method'])
+            self.assertEqual(
+                [['logical_switch', '==', ['uuid', 'ls1']]],
+                request['params'][2]['Ucast_Macs_Local'][0]['where'])
+            self.assertEqual(frozenset(['ls1']), rows.switches)
+            # The binding is removed, so is the row out of the condition.
+            self.l2gw_ovsdb._update2_event_handler(
+                {'method': 'update2',
+                 'params': [monitor_cond.MONITOR_ID, {
+                     'Physical_Port': {'port1': {'modify': {
+                         'vlan_bindings': ['map', [[100, ['uuid',
+                                                          'ls1']]]]}}},
+                     'Ucast_Macs_Local': {'mac1': {'delete': None}}}]},
+                None)
+            data = self.callback.call_args[0][1]
+            self.assertEqual([], data['modified_physical_ports'][0][
+                'vlan_bindings'])
+            self.assertEqual('ls1', data['deleted_local_macs'][0][
+                'logical_switch_id'])
+            self.assertEqual([False], send.call_args[0][0]['params'][2][
+                'Mcast_Macs_Local'][0]['where'])
+
+    def test_conditional_monitor_initial(self):
+        """Test case to test all the MACs sent in the initial update."""
+        self.l2gw_ovsdb.connected = True
+        port = {'name': 'port1',
+                'vlan_bindings': ['map', [[100, ['uuid', 'ls1']]]]}
+        reply = {'result': [False, 'txn1', {
+            'Physical_Port': {'port1': {'initial': port}},
+            'Ucast_Macs_Local': dict(
+                ('mac%d' % index, {'initial': {
+                    'MAC': 'fa:16:3e:00:00:0%d' % index,
+                    'logical_switch': ['uuid', 'ls%d' % index]}})
+                for index in (1, 2))}]}
+        with mock.patch.object(ovsdb_monitor.OVSDBMonitor, 'send',
+                               return_value=True) as send, \
+                mock.patch.object(ovsdb_monitor.OVSDBMonitor, '_response',
+                                  return_value=reply):
+            self.l2gw_ovsdb.set_monitor_response_handler()
+            request = send.call_args_list[0][0][0]
+            self.assertEqual([True], request['params'][2][
+                'Ucast_Macs_Local'][0]['where'])
+            activity, data = self.callback.call_args[0]
+            self.assertEqual(ovsdb_monitor.Activity.Initial, activity)
+            self.assertEqual(['mac1', 'mac2'],
+                             sorted(mac['uuid']
+                                    for mac in data['new_local_macs']))
+            # The condition is narrowed once the bindings are known.
+            request = send.call_args[0][0]
+            self.assertEqual('monitor_cond_change', request['method'])
+            self.assertEqual(
+                [['logical_switch', '==', ['uuid', 'ls1']]],
+                request['params'][2]['Ucast_Macs_Local'][0]['where'])
+
+    def test_monitor_cond_since(self):
+        """Test case to test the resync after a reconnection."""
+        self.l2gw_ovsdb.connected = True
+        rows = monitor_cond.MonitoredRows(())
+        rows.apply({'Logical_Switch': {'ls1': {'initial': {'name': 'net1'}},
+                                       'ls2': {'initial': {'name': 'net2'}}}})
+        rows.last_txn_id = 'txn1'
+        rows.loaded = True
+        self.l2gw_ovsdb.monitored_rows[None] = rows
+        found = {'result': [True, 'txn2', {'Logical_Switch': {
+            'ls2': {'delete': None}}}]}
+        not_found = {'result': [False, 'txn4', {'Logical_Switch': {
+            'ls3': {'initial': {'name': 'net3'}}}}]}
+        with mock.patch.object(ovsdb_monitor.OVSDBMonitor, 'send',
+                               return_value=True) as send, \
+                mock.patch.object(ovsdb_monitor.OVSDBMonitor, '_response',
+                                  side_effect=[found, not_found]):
+            self.l2gw_ovsdb.set_monitor_response_handler()
+            self.assertEqual('txn1', send.call_args[0][0]['params'][3])
+            # Only the changes missed are sent, to the same rows.
+            self.assertIs(rows, self.l2gw_ovsdb.monitored_rows[None])
+            activity, data = self.callback.call_args[0]
+            self.assertEqual(ovsdb_monitor.Activity.Update, activity)
+            self.assertNotIn('new_logical_switches', data)
+            self.assertEqual('ls2', data['deleted_logical_switches'][0][
+                'uuid'])
+            self.assertEqual(['ls1'], list(rows.rows['Logical_Switch']))
+            self.assertEqual('txn2', rows.last_txn_id)
+            self.l2gw_ovsdb._update3_event_handler(
+                {'method': 'update3',
+                 'params': [monitor_cond.MONITOR_ID, 'txn3', {}]}, None)
+            self.assertEqual('txn3', rows.last_txn_id)
+            # The transaction is not in the history of the OVSDB server
+            # any more, all the rows are sent again.
+            self.l2gw_ovsdb.set_monitor_response_handler()
+            self.assertEqual('txn3', send.call_args[0][0]['params'][3])
+            activity, data = self.callback.call_args[0]
+            self.assertEqual(ovsdb_monitor.Activity.Initial, activity)
+            self.assertEqual(['ls3'], list(rows.rows['Logical_Switch']))
+            self.assertEqual('txn4', rows.last_txn_id)
+
+    def test_monitored_columns(self):
+        """Test case to test the columns requested are those processed."""
+        rows = dict(
+            (table_name, RecordingRow(
+                (column_name, column_type.default())
+                for column_name, column_type in
+                schema.columns(table_name).items()))
+            for table_name in monitor_cond.MONITORED_TABLES)
+        self.l2gw_ovsdb._process_tables(
+            dict((table_name, {'uuid1': {'new': row}})
+                 for table_name, row in rows.items()),
+            self.l2gw_ovsdb._initialize_data_dict())
+        for table_name, row in rows.items():
+            self.assertEqual(
+                set(monitor_cond.MONITORED_COLUMNS[table_name]), row.read,
+                table_name)
+
+    def test_process_tables_ports_of_switches(self):
+        """Test case to test the switches of the ports in any table order."""
+        switches = {
+            'ps1': {'new': {'name': 'ps1', 'tunnel_ips': '10.0.0.1',
+                            'switch_fault_status': ['set', []],
+                            'ports': ['set', [['uuid', 'port1'],
+                                              ['uuid', 'port2']]]}},
+            'ps2': {'new': {'name': 'ps2', 'tunnel_ips': '10.0.0.2',
+                            'switch_fault_status': ['set', []],
+                            'ports': ['uuid', 'port3']}}}
+        ports = dict(
+            (uuid, {'new': {'name': uuid, 'port_fault_status': ['set', []],
+                            'vlan_bindings': ['map', []]}})
+            for uuid in ('port1', 'port2', 'port3', 'port4'))
+        ports['port2']['old'] = {'port_fault_status': 'DOWN'}
+        for tables in (collections.OrderedDict([('Physical_Switch', switches),
+                                                ('Physical_Port', ports)]),
+                       collections.OrderedDict([('Physical_Port', ports),
+                                                ('Physical_Switch', switches)
+                                                ])):
+            data_dict = self.l2gw_ovsdb._initialize_data_dict()
+            self.l2gw_ovsdb._process_tables(tables, data_dict)
+            self.assertEqual(
+                {'port1': 'ps1', 'port3': 'ps2', 'port4': None},
+                dict((port.uuid, port.physical_switch_id)
+                     for port in data_dict['new_physical_ports']))
+            self.assertEqual(
+                ['ps1'], [port.physical_switch_id
+                          for port in data_dict['modified_physical_ports']])
+            self.assertEqual(2, len(data_dict['new_physical_switches']))
+
     def test_update_event_handler(self):
         """Test case to test _update_event_handler."""
         with mock.patch.object(ovsdb_monitor.OVSDBMonitor,
@@ -237,17 +467,53 @@ class TestOVSDBMonitor(base.BaseTestCase):
         """Test case to test _on_remote_message."""
         self.l2gw_ovsdb.handlers = mock.Mock()
         with mock.patch.object(ovsdb_monitor.LOG, 'debug'):
-            with mock.patch.object(jsonutils, 'loads') as json_load:
-                self.l2gw_ovsdb._on_remote_message(self.msg)
-                self.assertTrue(json_load.called)
-                handler_method = json_load.return_value
-                handler_method.get.assert_called_once_with(mock.ANY, mock.ANY)
+            self.l2gw_ovsdb._on_remote_message(self.msg)
+            self.l2gw_ovsdb.handlers.get.assert_called_once_with('monitor')
+            handler = self.l2gw_ovsdb.handlers.get.return_value
+            handler.assert_called_once_with(self.msg, None)
+
+    def test_on_remote_message_response(self):
+        """Test case to test _on_remote_message with a response."""
+        response = {'id': self.op_id, 'result': {}, 'error': None}
+        self.l2gw_ovsdb._register_request(self.op_id)
+        self.l2gw_ovsdb._on_remote_message(response)
+        self.assertEqual(response, self.l2gw_ovsdb._response(self.op_id))
+
+    def test_process_response_timeout(self):
+        """Test case to test _process_response without a reply."""
+        with mock.patch.object(ovsdb_monitor.OVSDBMonitor,
+                               '_response', return_value=None):
+            self.assertRaises(exceptions.OVSDBError,
+                              self.l2gw_ovsdb._process_response,
+                              self.op_id)
+
+    def test_rcv_thread_split_messages(self):
+        """Test case to test _rcv_thread with messages split by recv."""
+        data = jsonutils.dumps(self.msg2).encode('utf-8') + jsonutils.dumps(
+            self.msg1).encode('utf-8')
+        chunks = [data[:7], data[7:], b'']
+
+        def _recv_into(buffer):
+            chunk = chunks.pop(0)
+            buffer[:len(chunk)] = chunk
+            return len(chunk)
+
+        with mock.patch.object(self.l2gw_ovsdb.socket, 'recv_into',
+                               side_effect=_recv_into), \
+                mock.patch.object(self.l2gw_ovsdb.dispatcher,
+                                  'dispatch') as dispatch:
+            self.l2gw_ovsdb._rcv_thread()
+            dispatched = []
+            for call in dispatch.call_args_list:
+                self.assertIsNone(call[0][0])
+                dispatched.extend(call[0][1])
+            self.assertEqual([self.msg2, self.msg1], dispatched)
 
     def test_rcv_thread_none(self):
         """Test case to test _rcv_thread receives None from socket."""
         self.assertTrue(self.l2gw_ovsdb.read_on)
         with mock.patch.object(self.l2gw_ovsdb.socket,
-                               'recv', return_value=None) as sock_recv:
+                               'recv_into', return_value=0) as sock_recv:
             with mock.patch.object(self.l2gw_ovsdb.socket,
                                    'close') as sock_close:
                 self.l2gw_ovsdb._rcv_thread()
@@ -258,7 +524,7 @@ class TestOVSDBMonitor(base.BaseTestCase):
 
     def test_rcv_thread_exception(self):
         """Test case to test _rcv_thread with exception."""
-        with mock.patch.object(self.l2gw_ovsdb.socket, 'recv',
+        with mock.patch.object(self.l2gw_ovsdb.socket, 'recv_into',
                                side_effect=Exception,
                                return_value=None) as sock_recv, \
                 mock.patch.object(self.l2gw_ovsdb.socket,
@@ -306,6 +572,16 @@ class TestOVSDBMonitor(base.BaseTestCase):
             result = self.l2gw_ovsdb._form_ovsdb_data(mock.Mock(), mock.ANY)
             self.assertEqual(expect, result)
 
+    def test_form_ovsdb_data_sparse(self):
+        """Test case to test the kinds of rows left out when unchanged."""
+        port = ovsdb_schema.PhysicalPort('port1', 'port1', 'ps1', None, None)
+        result = self.l2gw_ovsdb._form_ovsdb_data(
+            {'modified_physical_ports': [port], 'new_local_macs': []},
+            mock.ANY)
+        self.assertEqual({n_const.OVSDB_IDENTIFIER: self.conf.ovsdb_identifier,
+                          'modified_physical_ports': [port.__dict__]},
+                         result)
+
     def test_process_physical_port(self):
         """Test case to process new physical_port."""
         fake_id = 'fake_id'
@@ -352,6 +628,37 @@ class TestOVSDBMonitor(base.BaseTestCase):
                 self.assertIn(phy_port.return_value,
                               data_dict.get('deleted_physical_ports'))
 
+    def test_process_physical_port_status(self):
+        """Test case to process a change of the fault status of a port."""
+        data_dict = self.l2gw_ovsdb._initialize_data_dict()
+        bindings = ['map', [[100, ['uuid', 'ls1']]]]
+        status_change = {'new': {'name': 'port1',
+                                 'port_fault_status': 'DOWN',
+                                 'vlan_bindings': bindings},
+                         'old': {'port_fault_status': ['set', []]}}
+        # The plugins older than 1.1 are sent all the bindings.
+        self.l2gw_ovsdb._process_physical_port('port1', status_change, {},
+                                               data_dict)
+        port = data_dict['modified_physical_ports'].pop()
+        self.assertEqual('DOWN', port.port_fault_status)
+        self.assertEqual([{'vlan': 100, 'logical_switch_uuid': 'ls1'}],
+                         port.vlan_bindings)
+        self.l2gw_ovsdb.compact_rows = True
+        self.l2gw_ovsdb._process_physical_port('port1', status_change, {},
+                                               data_dict)
+        port = data_dict['modified_physical_ports'][0]
+        self.assertEqual('DOWN', port.port_fault_status)
+        self.assertIsNone(port.vlan_bindings)
+        self.l2gw_ovsdb._process_physical_port(
+            'port1', {'new': {'name': 'port1', 'port_fault_status': 'DOWN',
+                              'vlan_bindings': bindings},
+                      'old': {'vlan_bindings': ['map', []]}},
+            {}, data_dict)
+        self.assertEqual([{'vlan': 100, 'logical_switch_uuid': 'ls1'}],
+                         data_dict['modified_physical_ports'][1].vlan_bindings)
+        # The row is left as received.
+        self.assertEqual(['map', [[100, ['uuid', 'ls1']]]], bindings)
+
     def test_process_physical_port_with_empty_fault_status(self):
         """Test case to process new physical_port with empty fault status."""
         fake_id = 'fake_id'
@@ -379,22 +686,20 @@ class TestOVSDBMonitor(base.BaseTestCase):
 
     def test_process_physical_switch(self):
         """Test case to process new physical_switch."""
-        port_map = {'fake_id': 'fake_switch_id'}
-        with mock.patch.object(ovsdb_schema, 'PhysicalPort') as phy_port:
+        with mock.patch.object(ovsdb_schema, 'PhysicalPort'):
             with mock.patch.object(ovsdb_schema,
                                    'PhysicalSwitch') as phy_switch:
-                physical_port = phy_port.return_value
                 fake_id = 'fake_id'
                 add = {'new': {'uuid': 'fake_id',
                                'name': 'fake_name',
                                'tunnel_ips': 'fake_tunnel_ip',
                                'switch_fault_status': 'fake_status',
-                               'ports': ['set', 'set',
-                                         physical_port]}}
+                               'ports': ['set', [['uuid', 'fake_port1'],
+                                                 ['uuid', 'fake_port2']]]}}
                 delete = {'old': {'uuid': 'fake_id_old',
                                   'name': 'fake_name_old',
                                   'tunnel_ips': 'fake_tunnel_ip_old',
-                                  'ports': ['', physical_port]}}
+                                  'ports': ['uuid', 'fake_port1']}}
                 modify = {}
                 modify.update(add)
                 modify.update(delete)
@@ -405,7 +710,6 @@ class TestOVSDBMonitor(base.BaseTestCase):
                 # test add
                 self.l2gw_ovsdb._process_physical_switch(fake_id,
                                                          add,
-                                                         port_map,
                                                          data_dict)
                 self.assertIn(phy_switch.return_value,
                               data_dict['new_physical_switches'])
@@ -415,32 +719,28 @@ class TestOVSDBMonitor(base.BaseTestCase):
                 # test modify
                 self.l2gw_ovsdb._process_physical_switch(fake_id,
                                                          modify,
-                                                         port_map,
                                                          data_dict)
                 self.assertIn(phy_switch.return_value,
                               data_dict['modified_physical_switches'])
                 # test delete
                 self.l2gw_ovsdb._process_physical_switch(fake_id,
                                                          delete,
-                                                         port_map,
                                                          data_dict)
                 self.assertIn(phy_switch.return_value,
                               data_dict['deleted_physical_switches'])
 
     def test_process_physical_switch_with_empty_fault_status(self):
         """Test case to process new physical_switch with empty fault status."""
-        port_map = {'fake_id': 'fake_switch_id'}
-        with mock.patch.object(ovsdb_schema, 'PhysicalPort') as phy_port:
+        with mock.patch.object(ovsdb_schema, 'PhysicalPort'):
             with mock.patch.object(ovsdb_schema,
                                    'PhysicalSwitch') as phy_switch:
-                physical_port = phy_port.return_value
                 fake_id = 'fake_id'
                 add = {'new': {'uuid': 'fake_id',
                                'name': 'fake_name',
                                'tunnel_ips': 'fake_tunnel_ip',
                                'switch_fault_status': ['set', []],
-                               'ports': ['set', 'set',
-                                         physical_port]}}
+                               'ports': ['set', [['uuid', 'fake_port1'],
+                                                 ['uuid', 'fake_port2']]]}}
                 data_dict = {'new_physical_switches': [],
                              'modified_physical_switches': [],
                              'deleted_physical_switches': [],
@@ -448,13 +748,32 @@ class TestOVSDBMonitor(base.BaseTestCase):
                 # test add
                 self.l2gw_ovsdb._process_physical_switch(fake_id,
                                                          add,
-                                                         port_map,
                                                          data_dict)
                 self.assertIn(phy_switch.return_value,
                               data_dict['new_physical_switches'])
                 phy_switch.assert_called_once_with('fake_id', 'fake_name',
                                                    'fake_tunnel_ip', None)
 
+    def test_process_physical_switch_without_tunnel_ip(self):
+        """Test case to process new physical_switch without tunnel ip."""
+        add = {'new': {'name': 'fake_name',
+                       'tunnel_ips': ['set', []],
+                       'switch_fault_status': ['set', []],
+                       'ports': ['set', []]}}
+        with mock.patch.object(ovsdb_schema,
+                               'PhysicalSwitch') as phy_switch:
+            data_dict = {'new_physical_switches': []}
+            self.l2gw_ovsdb._process_physical_switch('fake_id', add,
+                                                     data_dict)
+            phy_switch.assert_called_once_with('fake_id', 'fake_name',
+                                               ['set', []], None)
+            phy_switch.reset_mock()
+            self.l2gw_ovsdb.compact_rows = True
+            self.l2gw_ovsdb._process_physical_switch('fake_id', add,
+                                                     data_dict)
+            phy_switch.assert_called_once_with('fake_id', 'fake_name',
+                                               None, None)
+
     def test_process_logical_switch(self):
         """Test case to process new logical_switch."""
         fake_id = 'fake_id'
@@ -711,6 +1030,9 @@ class SocketClass(object):
         if self.connect_error:
             raise self.connect_error
 
+    def settimeout(self, timeout):
+        pass
+
     def send(self, data):
         if self.send_error:
             raise self.send_error
@@ -721,6 +1043,13 @@ class SocketClass(object):
             raise self.recv_error
         return self.rcv_data
 
+    def recv_into(self, buffer):
+        data = self.recv(len(buffer))
+        if not data:
+            return 0
+        buffer[:len(data)] = data
+        return len(data)
+
     def bind(self, host_port):
         pass
 
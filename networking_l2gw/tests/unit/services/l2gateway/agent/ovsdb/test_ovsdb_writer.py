@@ -15,8 +15,8 @@
 
 import random
 import socket
-import ssl
 
+import eventlet
 import mock
 
 from neutron.tests import base
@@ -47,15 +47,14 @@ class TestOVSDBWriter(base.BaseTestCase):
         cfg.CONF.set_override('max_connection_retries', 0, 'ovsdb')
 
         self.sock = mock.patch('socket.socket').start()
-        self.ssl_sock = mock.patch.object(ssl, 'wrap_socket').start()
+        self.ssl_contexts = mock.patch.object(
+            base_connection.BaseConnection, 'ssl_contexts').start()
         self.op_id = 'abcd'
         self.l2gw_ovsdb = ovsdb_writer.OVSDBWriter(mock.Mock(),
                                                    self.conf)
         self.fake_message = {'id': self.op_id,
                              'fake_key': 'fake_value'}
 
-        self.l2gw_ovsdb.responses = [self.fake_message]
-
     def test_process_response(self):
         """Test case to test _process_response."""
         expected_result = {'fake_key': 'fake_value'}
@@ -114,17 +113,58 @@ class TestOVSDBWriter(base.BaseTestCase):
         with mock.patch.object(
             ovsdb_writer.OVSDBWriter,
             '_recv_data',
-            return_value=jsonutils.dumps({self.op_id:
-                                          'foo_value'})) as recv_data, \
+            return_value={'id': self.op_id,
+                          'result': 'foo_value'}) as recv_data, \
             mock.patch.object(ovsdb_writer.OVSDBWriter,
                               '_process_response',
                               return_value=(ret_value, None)) as proc_response, \
             mock.patch.object(ovsdb_writer.LOG,
                               'debug'):
+            self.l2gw_ovsdb._register_request(self.op_id)
             self.l2gw_ovsdb._get_reply(self.op_id, mock.ANY)
             self.assertTrue(recv_data.called)
             self.assertTrue(proc_response.called)
 
+    def test_get_reply_skips_other_replies(self):
+        """Test case to test _get_reply with a reply to another request."""
+        other_reply = {'id': 'other_id', 'result': [], 'error': None}
+        reply = {'id': self.op_id, 'result': [], 'error': None}
+        self.l2gw_ovsdb._register_request('other_id')
+        self.l2gw_ovsdb._register_request(self.op_id)
+        with mock.patch.object(ovsdb_writer.OVSDBWriter, '_recv_data',
+                               side_effect=[other_reply, reply]):
+            self.assertTrue(self.l2gw_ovsdb._get_reply(self.op_id,
+                                                       mock.ANY))
+            self.assertTrue(
+                self.l2gw_ovsdb._is_request_complete('other_id'))
+            self.assertNotIn(self.op_id, self.l2gw_ovsdb.requests)
+
+    def test_get_reply_answers_echo(self):
+        """Test case to test _get_reply with an echo from the server."""
+        echo = {'method': 'echo', 'params': ['probe'], 'id': 'echo'}
+        reply = {'id': self.op_id, 'result': [], 'error': None}
+        self.l2gw_ovsdb._register_request(self.op_id)
+        with mock.patch.object(ovsdb_writer.OVSDBWriter, '_recv_data',
+                               side_effect=[echo, reply]), \
+                mock.patch.object(base_connection.BaseConnection,
+                                  'send', return_value=True) as mock_send:
+            self.assertTrue(self.l2gw_ovsdb._get_reply(self.op_id, None))
+            mock_send.assert_called_with({'result': ['probe'],
+                                          'error': None, 'id': 'echo'})
+
+    def test_echo(self):
+        """Test case to test echo."""
+        query = {"method": "echo",
+                 "params": [],
+                 "id": self.op_id}
+        with mock.patch.object(random, 'getrandbits',
+                               return_value=self.op_id), \
+                mock.patch.object(ovsdb_writer.OVSDBWriter,
+                                  '_send_and_receive') as send_n_receive:
+            self.l2gw_ovsdb.echo(mock.ANY)
+            send_n_receive.assert_called_with(query, self.op_id,
+                                              mock.ANY, True)
+
     def test_send_and_receive(self):
         """Test case to test _send_and_receive."""
         with mock.patch.object(base_connection.BaseConnection,
@@ -149,6 +189,70 @@ class TestOVSDBWriter(base.BaseTestCase):
                 mock_send.assert_called_with('some_query', addr=mock.ANY)
                 mock_reply.assert_not_called()
 
+    def test_send_and_receive_pipelined(self):
+        """Test case to test pipelined requests answered out of order."""
+        cfg.CONF.set_override('transact_window', 2, 'ovsdb')
+        writer = ovsdb_writer.OVSDBWriter(mock.Mock(), self.conf)
+        with mock.patch.object(base_connection.BaseConnection,
+                               'send', return_value=True) as mock_send, \
+                mock.patch.object(writer, '_start_reader') as mock_reader:
+            first = eventlet.spawn(writer._send_and_receive, 'query1',
+                                   'id1', None, True)
+            second = eventlet.spawn(writer._send_and_receive, 'query2',
+                                    'id2', None, True)
+            eventlet.sleep(0)
+            self.assertEqual(2, mock_send.call_count)
+            self.assertTrue(mock_reader.called)
+            writer._complete_request({'id': 'id2', 'result': [],
+                                      'error': None})
+            writer._complete_request({'id': 'id1', 'result': [],
+                                      'error': None})
+            first.wait()
+            second.wait()
+            self.assertEqual({}, writer.requests)
+
+    def test_send_and_receive_pipelined_window(self):
+        """Test case to test the in-flight window of pipelined requests."""
+        cfg.CONF.set_override('transact_window', 2, 'ovsdb')
+        writer = ovsdb_writer.OVSDBWriter(mock.Mock(), self.conf)
+        with mock.patch.object(base_connection.BaseConnection,
+                               'send', return_value=True) as mock_send, \
+                mock.patch.object(writer, '_start_reader'):
+            threads = [eventlet.spawn(writer._send_and_receive, 'query',
+                                      op_id, None, True)
+                       for op_id in ('id1', 'id2', 'id3')]
+            eventlet.sleep(0)
+            self.assertEqual(2, mock_send.call_count)
+            writer._complete_request({'id': 'id1', 'result': [],
+                                      'error': None})
+            threads[0].wait()
+            eventlet.sleep(0)
+            self.assertEqual(3, mock_send.call_count)
+            for op_id in ('id2', 'id3'):
+                writer._complete_request({'id': op_id, 'result': [],
+                                          'error': None})
+            for thread in threads[1:]:
+                thread.wait()
+
+    def test_read_replies(self):
+        """Test case to test _read_replies."""
+        echo = {'method': 'echo', 'params': [], 'id': 'echo'}
+        reply = {'id': self.op_id, 'result': [], 'error': None}
+        self.l2gw_ovsdb.connected = True
+        self.l2gw_ovsdb._register_request(self.op_id)
+        with mock.patch.object(ovsdb_writer.OVSDBWriter, '_recv_data',
+                               side_effect=[reply, echo, None]), \
+                mock.patch.object(base_connection.BaseConnection,
+                                  'send') as mock_send, \
+                mock.patch.object(ovsdb_writer.OVSDBWriter,
+                                  'disconnect') as mock_disconnect:
+            self.l2gw_ovsdb._read_replies()
+            self.assertTrue(self.l2gw_ovsdb._is_request_complete(self.op_id))
+            mock_send.assert_called_with({'result': [], 'error': None,
+                                          'id': 'echo'})
+            self.assertTrue(mock_disconnect.called)
+            self.assertIsNone(self.l2gw_ovsdb._reader)
+
     def test_delete_logical_switch(self):
         """Test case to test delete_logical_switch."""
         commit_dict = {"op": "commit", "durable": True}
@@ -433,14 +537,30 @@ class TestOVSDBWriter(base.BaseTestCase):
         fake_socket = base_test.SocketClass(None,
                                             None,
                                             None,
-                                            base_test.FakeDecodeClass(
-                                                jsonutils.dumps(fake_data)))
+                                            jsonutils.dumps(
+                                                fake_data).encode('utf-8'))
         with mock.patch.object(socket, 'socket', return_value=fake_socket):
                 ovsdb_conf = base_test.FakeConf()
                 l2gw_obj = ovsdb_writer.OVSDBWriter(
                     cfg.CONF.ovsdb, ovsdb_conf)
                 result = l2gw_obj._recv_data(mock.ANY)
-                self.assertEqual(jsonutils.dumps(fake_data), result)
+                self.assertEqual(fake_data, result)
+
+    def test_recv_data_with_pending_messages(self):
+        """Test case to test _recv_data with two messages in one read."""
+        first = {"id": "1", "result": []}
+        second = {"id": "2", "result": []}
+        fake_socket = base_test.SocketClass(
+            None, None, None,
+            (jsonutils.dumps(first) + jsonutils.dumps(second)).encode('utf-8'))
+        with mock.patch.object(socket, 'socket', return_value=fake_socket):
+            l2gw_obj = ovsdb_writer.OVSDBWriter(cfg.CONF.ovsdb,
+                                                base_test.FakeConf())
+            with mock.patch.object(fake_socket, 'recv',
+                                   wraps=fake_socket.recv) as sock_recv:
+                self.assertEqual(first, l2gw_obj._recv_data(mock.ANY))
+                self.assertEqual(second, l2gw_obj._recv_data(mock.ANY))
+                self.assertEqual(1, sock_recv.call_count)
 
     def test_recv_data_with_empty_data(self):
         """Test case to test _recv_data with empty data."""
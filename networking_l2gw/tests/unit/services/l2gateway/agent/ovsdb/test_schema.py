@@ -0,0 +1,70 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from neutron.tests import base
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import schema
+
+
+class TestSchema(base.BaseTestCase):
+    def test_column_types(self):
+        """Test case to test the column types read from the schema."""
+        columns = schema.columns('Physical_Port')
+        self.assertTrue(columns['name'].is_scalar())
+        self.assertEqual('', columns['name'].default())
+        self.assertTrue(columns['vlan_bindings'].is_map())
+        self.assertEqual(['map', []], columns['vlan_bindings'].default())
+        self.assertFalse(columns['port_fault_status'].is_scalar())
+        self.assertEqual(['set', []], columns['port_fault_status'].default())
+        locator = schema.columns('Ucast_Macs_Local')['locator']
+        self.assertTrue(locator.is_scalar())
+        self.assertEqual('uuid', locator.key)
+        self.assertEqual({}, schema.columns('Unknown_Table'))
+
+    def test_row_decoder(self):
+        """Test case to test the values decoded by the column types."""
+        decode_row = schema.row_decoder(
+            'Physical_Port', ('name', 'port_fault_status', 'vlan_bindings'))
+        self.assertIs(decode_row, schema.row_decoder(
+            'Physical_Port', ('name', 'port_fault_status', 'vlan_bindings')))
+        self.assertEqual(
+            ('port1', ['DOWN'], [(100, 'ls1'), (200, 'ls2')]),
+            decode_row({'name': 'port1', 'port_fault_status': 'DOWN',
+                        'vlan_bindings': ['map', [[100, ['uuid', 'ls1']],
+                                                  [200, ['uuid', 'ls2']]]],
+                        'description': ''}))
+        # Only the columns which changed are in the old rows.
+        self.assertEqual((None, [], None),
+                         decode_row({'port_fault_status': ['set', []]}))
+        decode_row = schema.row_decoder(
+            'Physical_Switch', ('ports', 'tunnel_ips', 'switch_fault_status'))
+        self.assertEqual(
+            (['port1', 'port2'], [], ['down', 'unknown']),
+            decode_row({'tunnel_ips': ['set', []],
+                        'ports': ['set', [['uuid', 'port1'],
+                                          ['uuid', 'port2']]],
+                        'switch_fault_status': ['set', ['down',
+                                                        'unknown']]}))
+        self.assertEqual((['port1'], ['10.0.0.1'], []), decode_row(
+            {'ports': ['uuid', 'port1'], 'tunnel_ips': '10.0.0.1',
+             'switch_fault_status': ['set', []]}))
+        decode_row = schema.row_decoder('Logical_Switch', ('tunnel_key',))
+        self.assertEqual((None,), decode_row({'tunnel_key': ['set', []]}))
+        self.assertEqual((5000,), decode_row({'tunnel_key': 5000}))
+        decode_row = schema.row_decoder('Ucast_Macs_Local',
+                                        ('logical_switch', 'locator'))
+        self.assertEqual(('ls1', 'loc1'), decode_row(
+            {'locator': ['uuid', 'loc1'], 'logical_switch': ['uuid', 'ls1']}))
@@ -0,0 +1,94 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from neutron.tests import base
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import ssl_context
+
+
+class TestSSLContextCache(base.BaseTestCase):
+    def setUp(self):
+        super(TestSSLContextCache, self).setUp()
+        self.cache = ssl_context.SSLContextCache()
+        self.create_context = mock.patch.object(
+            ssl_context, '_create_context',
+            side_effect=lambda *args: mock.Mock()).start()
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        self.files = []
+        for name in ('ovsdb1.key', 'ovsdb1.cert', 'ovsdb1.ca_cert'):
+            self.files.append(os.path.join(path, name))
+            with open(self.files[-1], 'w') as f:
+                f.write(name)
+
+    def _get_context(self, server_side=False):
+        return self.cache.get_context('ovsdb1', *self.files,
+                                      server_side=server_side)
+
+    def test_context_is_cached(self):
+        """Test case to test that the files are loaded once."""
+        context = self._get_context()
+        self.assertEqual(context, self._get_context())
+        self.create_context.assert_called_once_with(
+            self.files[0], self.files[1], self.files[2], False)
+        self.assertNotEqual(context, self._get_context(server_side=True))
+        self.assertEqual(2, self.cache.stats['context_loads'])
+
+    def test_context_is_reloaded_on_change(self):
+        """Test case to test that a changed certificate is reloaded."""
+        context = self._get_context()
+        self.cache._sessions['ovsdb1'] = 'fake_session'
+        with open(self.files[1], 'w') as f:
+            f.write('renewed certificate')
+        self.assertNotEqual(context, self._get_context())
+        self.assertEqual(2, self.create_context.call_count)
+        self.assertNotIn('ovsdb1', self.cache._sessions)
+
+    def test_missing_file(self):
+        """Test case to test that a missing file raises an error."""
+        os.remove(self.files[0])
+        self.assertRaises(OSError, self._get_context)
+        self.assertFalse(self.create_context.called)
+
+    def test_wrap_socket_resumes_session(self):
+        """Test case to test that the last session is resumed."""
+        sock = mock.Mock()
+        context = self._get_context()
+        self.cache.wrap_socket(sock, 'ovsdb1', *self.files)
+        context.wrap_socket.assert_called_with(
+            sock, server_side=False, do_handshake_on_connect=False)
+        self.cache.save_session('ovsdb1', mock.Mock(session='fake_session'))
+        self.cache.wrap_socket(sock, 'ovsdb1', *self.files)
+        context.wrap_socket.assert_called_with(
+            sock, server_side=False, do_handshake_on_connect=False,
+            session='fake_session')
+
+    def test_handshake_counters(self):
+        """Test case to test the handshake latency counters."""
+        full = mock.Mock(session_reused=False)
+        resumed = mock.Mock(session_reused=True)
+        self.cache.handshake('ovsdb1', full)
+        self.cache.handshake('ovsdb1', resumed)
+        self.assertTrue(full.do_handshake.called)
+        self.assertTrue(resumed.do_handshake.called)
+        self.assertEqual(2, self.cache.stats['handshakes'])
+        self.assertEqual(1, self.cache.stats['resumed_handshakes'])
+        self.assertGreaterEqual(self.cache.stats['handshake_seconds'], 0)
@@ -0,0 +1,216 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+import eventlet
+import mock
+
+from neutron.tests import base
+from oslo_config import cfg
+from oslo_service import loopingcall
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import cluster
+from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_writer
+from networking_l2gw.services.l2gateway.agent.ovsdb import writer_pool
+from networking_l2gw.services.l2gateway.common import config
+from networking_l2gw.services.l2gateway import exceptions
+
+
+class TestOVSDBWriterPool(base.BaseTestCase):
+    def setUp(self):
+        super(TestOVSDBWriterPool, self).setUp()
+        config.register_ovsdb_opts_helper(cfg.CONF)
+        cfg.CONF.set_override('writer_pool_size', 2, 'ovsdb')
+        self.pool = writer_pool.OVSDBWriterPool(cfg.CONF.ovsdb)
+        self.gw_config = mock.Mock()
+        self.mock_loop = mock.patch.object(
+            loopingcall, 'FixedIntervalLoopingCall').start()
+        self.mock_writer = mock.patch.object(
+            ovsdb_writer, 'OVSDBWriter',
+            side_effect=lambda *args, **kwargs: mock.Mock(
+                connected=True, endpoint=None)).start()
+
+    def _session(self, ovsdb_identifier='fake_ovsdb_id'):
+        with self.pool.session(ovsdb_identifier,
+                               self.gw_config) as ovsdb_fd:
+            return ovsdb_fd
+
+    def test_session_is_reused(self):
+        """Test case to test that a session is reused."""
+        ovsdb_fd = self._session()
+        self.assertEqual(ovsdb_fd, self._session())
+        self.mock_writer.assert_called_once_with(
+            cfg.CONF.ovsdb, self.gw_config,
+            connect_retries=writer_pool.WRITER_CONNECT_RETRIES)
+        self.assertFalse(ovsdb_fd.disconnect.called)
+        self.assertTrue(self.mock_loop.return_value.start.called)
+
+    def test_sessions_are_per_ovsdb_identifier(self):
+        """Test case to test a session per ovsdb_identifier."""
+        self.assertNotEqual(self._session('fake_ovsdb_id_1'),
+                            self._session('fake_ovsdb_id_2'))
+        self.assertEqual(2, self.mock_writer.call_count)
+
+    def test_session_closed_on_exception(self):
+        """Test case to test that a failed session is not reused."""
+        def _fail():
+            with self.pool.session('fake_ovsdb_id',
+                                   self.gw_config) as ovsdb_fd:
+                self.failed_fd = ovsdb_fd
+                raise exceptions.OVSDBError(message='fake error')
+        self.assertRaises(exceptions.OVSDBError, _fail)
+        self.assertTrue(self.failed_fd.disconnect.called)
+        self.assertNotEqual(self.failed_fd, self._session())
+
+    def test_disconnected_session_is_replaced(self):
+        """Test case to test the lazy reconnection of a session."""
+        ovsdb_fd = self._session()
+        ovsdb_fd.connected = False
+        self.assertNotEqual(ovsdb_fd, self._session())
+        self.assertEqual(2, self.mock_writer.call_count)
+
+    def test_idle_sessions_are_bounded(self):
+        """Test case to test that at most writer_pool_size are kept."""
+        with self.pool.session('fake_ovsdb_id', self.gw_config) as fd1:
+            with self.pool.session('fake_ovsdb_id', self.gw_config) as fd2:
+                pass
+        self.assertNotEqual(fd1, fd2)
+        self.assertEqual(2, len(self.pool._idle_sessions['fake_ovsdb_id']))
+        cfg.CONF.set_override('writer_pool_size', 1, 'ovsdb')
+        self.pool = writer_pool.OVSDBWriterPool(cfg.CONF.ovsdb)
+        with self.pool.session('fake_ovsdb_id', self.gw_config) as fd1:
+            self.pool._release('fake_ovsdb_id',
+                               mock.Mock(connected=True, endpoint=None))
+        self.assertTrue(fd1.disconnect.called)
+
+    def test_keepalive_idle_sessions(self):
+        """Test case to test the echo keepalive of idle sessions."""
+        ovsdb_fd = self._session()
+        self.pool._keepalive_idle_sessions()
+        ovsdb_fd.echo.assert_called_with('fake_ovsdb_id')
+        self.assertEqual(ovsdb_fd, self._session())
+
+    def test_keepalive_closes_broken_sessions(self):
+        """Test case to test that unresponsive sessions are closed."""
+        ovsdb_fd = self._session()
+        ovsdb_fd.echo.side_effect = exceptions.OVSDBError(
+            message='fake error')
+        with mock.patch.object(writer_pool.LOG, 'warning') as logger_call:
+            self.pool._keepalive_idle_sessions()
+            self.assertTrue(logger_call.called)
+        self.assertTrue(ovsdb_fd.disconnect.called)
+        self.assertFalse(self.pool._idle_sessions['fake_ovsdb_id'])
+
+    def test_keepalive_echo_timeout(self):
+        """Test case to test a session whose echo is never answered."""
+        cfg.CONF.set_override('response_timeout', 0, 'ovsdb')
+        ovsdb_fd = self._session()
+        ovsdb_fd.echo.side_effect = lambda ovsdb_identifier: eventlet.sleep(
+            60)
+        other_fd = self._session('fake_ovsdb_id2')
+        with mock.patch.object(writer_pool.LOG, 'warning') as logger_call:
+            self.pool._keepalive_idle_sessions()
+            self.assertTrue(logger_call.called)
+        self.assertTrue(ovsdb_fd.disconnect.called)
+        self.assertFalse(self.pool._idle_sessions['fake_ovsdb_id'])
+        other_fd.echo.assert_called_once_with('fake_ovsdb_id2')
+
+    def test_keepalive_evicts_idle_sessions(self):
+        """Test case to test the eviction of expired idle sessions."""
+        ovsdb_fd = self._session()
+        with mock.patch.object(time, 'time',
+                               return_value=time.time() + 300):
+            self.pool._keepalive_idle_sessions()
+        self.assertFalse(ovsdb_fd.echo.called)
+        self.assertTrue(ovsdb_fd.disconnect.called)
+        self.assertFalse(self.pool._idle_sessions['fake_ovsdb_id'])
+
+    def test_close(self):
+        """Test case to test that close disconnects idle sessions."""
+        ovsdb_fd = self._session()
+        self.pool.close()
+        self.assertTrue(ovsdb_fd.disconnect.called)
+        self.assertTrue(self.mock_loop.return_value.stop.called)
+
+    def test_pipelined_session_is_shared(self):
+        """Test case to test the shared session of pipelined writes."""
+        cfg.CONF.set_override('transact_window', 8, 'ovsdb')
+        self.pool = writer_pool.OVSDBWriterPool(cfg.CONF.ovsdb)
+        with self.pool.session('fake_ovsdb_id', self.gw_config) as fd1:
+            with self.pool.session('fake_ovsdb_id',
+                                   self.gw_config) as fd2:
+                self.assertEqual(fd1, fd2)
+                self.assertEqual(
+                    2, self.pool._shared_sessions['fake_ovsdb_id'][1])
+        self.mock_writer.assert_called_once_with(
+            cfg.CONF.ovsdb, self.gw_config,
+            connect_retries=writer_pool.WRITER_CONNECT_RETRIES)
+        self.assertEqual(0, self.pool._shared_sessions['fake_ovsdb_id'][1])
+        fd1.connected = False
+        self.assertNotEqual(fd1, self._session())
+
+    def test_session_replaced_after_leadership_change(self):
+        """Test case to test the sessions to a former leader."""
+        cfg.CONF.set_override('transact_window', 8, 'ovsdb')
+        self.pool = writer_pool.OVSDBWriterPool(cfg.CONF.ovsdb)
+        self.gw_config.leader_epoch = 1
+        self.mock_writer.side_effect = lambda *args, **kwargs: mock.Mock(
+            connected=True, endpoint=0, cluster_role=cluster.LEADER,
+            leader_epoch=self.gw_config.leader_epoch)
+        with self.pool.session('fake_ovsdb_id', self.gw_config) as fd1:
+            self.assertEqual(fd1, self._session())
+            self.gw_config.leader_epoch = 2
+            fd2 = self._session()
+            self.assertNotEqual(fd1, fd2)
+            self.assertFalse(fd1.disconnect.called)
+        # The session is closed once no longer in use.
+        self.assertTrue(fd1.disconnect.called)
+        self.assertEqual(fd2, self._session())
+
+    def test_keepalive_shared_sessions(self):
+        """Test case to test the keepalive of shared sessions."""
+        cfg.CONF.set_override('transact_window', 8, 'ovsdb')
+        self.pool = writer_pool.OVSDBWriterPool(cfg.CONF.ovsdb)
+        ovsdb_fd = self._session()
+        self.pool._keepalive_idle_sessions()
+        ovsdb_fd.echo.assert_called_with('fake_ovsdb_id')
+        with mock.patch.object(time, 'time',
+                               return_value=time.time() + 300):
+            self.pool._keepalive_idle_sessions()
+        self.assertTrue(ovsdb_fd.disconnect.called)
+        self.assertNotIn('fake_ovsdb_id', self.pool._shared_sessions)
+
+    def test_keepalive_shared_session_borrowed_during_echo(self):
+        """Test case to test a shared session borrowed during its echo."""
+        cfg.CONF.set_override('transact_window', 8, 'ovsdb')
+        self.pool = writer_pool.OVSDBWriterPool(cfg.CONF.ovsdb)
+        ovsdb_fd = self._session()
+        borrowed = self.pool.session('fake_ovsdb_id', self.gw_config)
+
+        def echo(ovsdb_identifier):
+            self.assertIs(ovsdb_fd, borrowed.__enter__())
+            raise exceptions.OVSDBError(message='fake error')
+
+        ovsdb_fd.echo.side_effect = echo
+        with mock.patch.object(writer_pool.LOG, 'warning'):
+            self.pool._keepalive_idle_sessions()
+        # The borrower's transaction is not cut short, the next users get
+        # a new session.
+        self.assertFalse(ovsdb_fd.disconnect.called)
+        self.assertNotIn('fake_ovsdb_id', self.pool._shared_sessions)
+        borrowed.__exit__(None, None, None)
+        self.assertTrue(ovsdb_fd.disconnect.called)
+        self.assertIsNot(ovsdb_fd, self._session())
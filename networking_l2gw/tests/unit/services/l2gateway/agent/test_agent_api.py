@@ -18,6 +18,8 @@ import mock
 from neutron.tests import base
 
 from networking_l2gw.services.l2gateway.agent import agent_api
+from networking_l2gw.services.l2gateway.common import constants as n_const
+from networking_l2gw.services.l2gateway.common import ovsdb_payload
 
 
 class L2GatewayAgentApiTestCase(base.BaseTestCase):
@@ -42,6 +44,41 @@ class L2GatewayAgentApiTestCase(base.BaseTestCase):
             context, 'update_ovsdb_changes',
             activity=fake_activity, ovsdb_data=mock.ANY)
 
+    def test_update_ovsdb_changes_compact_payload(self):
+        """Test case to test the compact payload sent to a 1.1 plugin."""
+        cctxt = mock.Mock()
+        context = mock.Mock()
+        ovsdb_data = {n_const.OVSDB_IDENTIFIER: 'fake_ovsdb_id',
+                      'new_local_macs': [{'uuid': 'mac1'}]}
+        self.agent_rpc.compact_payload = True
+        self.agent_rpc.client.can_send_version.return_value = True
+        self.agent_rpc.client.prepare.return_value = cctxt
+        self.assertTrue(self.agent_rpc.can_send_compact_payload())
+        self.agent_rpc.update_ovsdb_changes(context, 1, ovsdb_data)
+        self.agent_rpc.client.prepare.assert_called_once_with(
+            version=agent_api.L2GatewayAgentApi.COMPACT_PAYLOAD_VERSION)
+        cctxt.cast.assert_called_with(
+            context, 'update_ovsdb_changes', activity=1,
+            ovsdb_data=ovsdb_payload.encode(ovsdb_data))
+
+    def test_update_ovsdb_changes_compact_payload_fallback(self):
+        """Test case to test the rows sent to a plugin older than 1.1."""
+        context = mock.Mock()
+        ovsdb_data = {n_const.OVSDB_IDENTIFIER: 'fake_ovsdb_id',
+                      'new_local_macs': [{'uuid': 'mac1'}]}
+        for compact_payload, can_send in ((True, False), (False, True)):
+            cctxt = mock.Mock()
+            self.agent_rpc.compact_payload = compact_payload
+            self.agent_rpc.client.can_send_version.return_value = can_send
+            self.agent_rpc.client.prepare.reset_mock()
+            self.agent_rpc.client.prepare.return_value = cctxt
+            self.assertFalse(self.agent_rpc.can_send_compact_payload())
+            self.agent_rpc.update_ovsdb_changes(context, 0, ovsdb_data)
+            self.agent_rpc.client.prepare.assert_called_once_with()
+            cctxt.cast.assert_called_once_with(
+                context, 'update_ovsdb_changes', activity=0,
+                ovsdb_data=ovsdb_data)
+
     def test_notify_ovsdb_states(self):
         cctxt = mock.Mock()
         context = mock.Mock()
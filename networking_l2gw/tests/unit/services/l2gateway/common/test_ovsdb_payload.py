@@ -0,0 +1,69 @@
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from neutron.tests import base
+
+from networking_l2gw.services.l2gateway.common import constants as n_const
+from networking_l2gw.services.l2gateway.common import ovsdb_payload
+
+
+class TestOVSDBPayload(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestOVSDBPayload, self).setUp()
+        self.ovsdb_data = {
+            n_const.OVSDB_IDENTIFIER: 'ovsdb1',
+            'new_local_macs': [
+                {'uuid': 'mac1', 'mac': 'fa:16:3e:00:00:01',
+                 'logical_switch_id': 'ls1', 'ip_address': '10.0.0.1'},
+                {'uuid': 'mac2', 'mac': 'fa:16:3e:00:00:02',
+                 'logical_switch_id': 'ls1', 'ip_address': None}],
+            'deleted_local_macs': [{'uuid': 'mac3',
+                                    'mac': 'fa:16:3e:00:00:03',
+                                    'logical_switch_id': 'ls1',
+                                    'ip_address': None}],
+            'modified_physical_ports': [{'uuid': 'port1', 'name': 'port1',
+                                         'port_fault_status': 'DOWN'}],
+            'new_remote_macs': [],
+            'deleted_logical_switches': []}
+
+    def test_encode(self):
+        """Test case to test the rows sent once per kind as values."""
+        payload = ovsdb_payload.encode(self.ovsdb_data)
+        self.assertEqual(ovsdb_payload.VERSION, payload['version'])
+        self.assertEqual('ovsdb1', payload[n_const.OVSDB_IDENTIFIER])
+        self.assertEqual(['local_macs', 'physical_ports'],
+                         sorted(payload['tables']))
+        local_macs = payload['tables']['local_macs']
+        self.assertEqual(['ip_address', 'logical_switch_id', 'mac', 'uuid'],
+                         local_macs['columns'])
+        self.assertEqual([[None, 'ls1', 'fa:16:3e:00:00:02', 'mac2']],
+                         local_macs['new'][1:])
+        self.assertNotIn('modified', local_macs)
+        self.assertEqual(['modified'],
+                         sorted(set(payload['tables']['physical_ports']) -
+                                set(['columns'])))
+
+    def test_decode(self):
+        """Test case to test the decoding of both versions of payload."""
+        payload = ovsdb_payload.encode(self.ovsdb_data)
+        expected = dict((key, value)
+                        for key, value in self.ovsdb_data.items() if value)
+        self.assertEqual(expected, ovsdb_payload.decode(payload))
+        self.assertIs(self.ovsdb_data,
+                      ovsdb_payload.decode(self.ovsdb_data))
+        self.assertEqual({n_const.OVSDB_IDENTIFIER: 'ovsdb1'},
+                         ovsdb_payload.decode(ovsdb_payload.encode(
+                             {n_const.OVSDB_IDENTIFIER: 'ovsdb1'})))
@@ -25,6 +25,7 @@ from neutron_lib.plugins import directory
 from networking_l2gw.db.l2gateway import l2gateway_db
 from networking_l2gw.db.l2gateway.ovsdb import lib
 from networking_l2gw.services.l2gateway.common import constants as n_const
+from networking_l2gw.services.l2gateway.common import ovsdb_payload
 from networking_l2gw.services.l2gateway.common import ovsdb_schema
 from networking_l2gw.services.l2gateway.common import tunnel_calls
 from networking_l2gw.services.l2gateway.ovsdb import data
@@ -48,6 +49,19 @@ class TestL2GatewayOVSDBCallbacks(object):
             ovsdb_return_value.update_ovsdb_changes.assert_called_with(
                 self.context, fake_activity, fake_ovsdb_data)
 
+    def test_update_ovsdb_changes_versioned(self):
+        """Test case to test the decoding of a versioned payload."""
+        fake_ovsdb_data = {n_const.OVSDB_IDENTIFIER: 'fake_id',
+                           'new_local_macs': [{'uuid': 'mac1',
+                                               'mac': 'mac123'}]}
+        with mock.patch.object(data, 'OVSDBData') as ovs_data:
+            self.l2gw_callbacks.update_ovsdb_changes(
+                self.context, 1, ovsdb_payload.encode(fake_ovsdb_data))
+            ovs_data.assert_called_with('fake_id')
+            ovsdb_return_value = ovs_data.return_value
+            ovsdb_return_value.update_ovsdb_changes.assert_called_with(
+                self.context, 1, fake_ovsdb_data)
+
     def test_notify_ovsdb_states(self):
         fake_ovsdb_states = {'ovsdb1': 'connected'}
         with mock.patch.object(data, 'OVSDBData') as ovs_data:
@@ -620,3 +634,19 @@ class TestOVSDBData(base.BaseTestCase):
         self.assertIn(n_const.OVSDB_IDENTIFIER, fake_dict1)
         self.assertIn('port_uuid', fake_dict1)
         add_vlan.assert_called_with(self.context, fake_dict1)
+
+    @mock.patch.object(lib, 'get_physical_port')
+    @mock.patch.object(lib, 'get_all_vlan_bindings_by_physical_port')
+    @mock.patch.object(lib, 'add_vlan_binding')
+    @mock.patch.object(lib, 'update_physical_ports_status')
+    def test_process_modified_physical_ports_status(self, update_pp_status,
+                                                    add_vlan, get_vlan,
+                                                    get_pp):
+        """Test case to test a port whose vlan bindings did not change."""
+        fake_dict = {'vlan_bindings': None, 'uuid': 'fake_uuid',
+                     'port_fault_status': 'DOWN'}
+        self.ovsdb_data._process_modified_physical_ports(
+            self.context, [fake_dict])
+        update_pp_status.assert_called_with(self.context, fake_dict)
+        self.assertFalse(get_vlan.called)
+        self.assertFalse(add_vlan.called)
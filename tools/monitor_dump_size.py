@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the initial dump of the monitored tables of a sample switch.
+
+A hardware_vtep database is generated for a top of rack switch whose
+ports are bound to logical switches, with the statistics, other_config
+and description columns filled in as a switch does. The reply to the
+monitor request is built with all the columns of the monitored tables
+and with the columns the agent requests, MONITORED_COLUMNS, in the
+format of monitor, where every column is sent, and of monitor_cond,
+where the columns holding their default value are left out. The size
+of each reply and the time taken to decode it are reported.
+
+    python tools/monitor_dump_size.py --ports 48 --vlans 100 \\
+        --macs 20000
+"""
+
+import argparse
+import json
+import time
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import monitor_cond
+from networking_l2gw.services.l2gateway.agent.ovsdb import schema
+
+KB = 1024.0
+
+
+def _uuid(kind, index):
+    return '%08x-0000-4000-8000-%012x' % (kind, index)
+
+
+def _ref(kind, index):
+    return ['uuid', _uuid(kind, index)]
+
+
+def _mac(index):
+    return '00:00:%02x:%02x:%02x:%02x' % ((index >> 24) & 0xff,
+                                          (index >> 16) & 0xff,
+                                          (index >> 8) & 0xff,
+                                          index & 0xff)
+
+
+def _mac_row(index, args):
+    return {'MAC': _mac(index),
+            'ipaddr': '10.%d.%d.%d' % ((index >> 16) & 0xff,
+                                       (index >> 8) & 0xff, index & 0xff),
+            'logical_switch': _ref(1, index % args.vlans),
+            'locator': _ref(5, index % args.vteps)}
+
+
+def sample_database(args):
+    """Returns the rows of the monitored tables, by table and uuid."""
+    vlans = range(args.vlans)
+    ports = {}
+    for port in range(args.ports):
+        ports[_uuid(3, port)] = {
+            'name': 'Ethernet%d' % port,
+            'description': 'Server port %d, rack 12 row B' % port,
+            'vlan_bindings': ['map', [[vlan + 1, _ref(1, vlan)]
+                                      for vlan in vlans]],
+            'acl_bindings': ['map', []],
+            'vlan_stats': ['map', [[vlan + 1, _ref(4, port * args.vlans +
+                                                   vlan)]
+                                   for vlan in vlans]],
+            'other_config': ['map', [['speed', '25G'], ['mtu', '9216'],
+                                     ['lldp', 'enabled']]],
+            'port_fault_status': ['set', []]}
+    return {
+        'Logical_Switch': dict(
+            (_uuid(1, vlan), {'name': 'net-%d' % vlan,
+                              'description': 'Network %d' % vlan,
+                              'tunnel_key': 5000 + vlan,
+                              'replication_mode': 'source_node',
+                              'other_config': ['map', []]})
+            for vlan in vlans),
+        'Physical_Switch': {_uuid(2, 0): {
+            'name': 'tor-12b',
+            'description': 'Top of rack switch, rack 12 row B',
+            'ports': ['set', [_ref(3, port) for port in range(args.ports)]],
+            'management_ips': '192.0.2.12',
+            'tunnel_ips': '198.51.100.12',
+            'tunnels': ['set', [_ref(7, vtep)
+                                for vtep in range(args.vteps)]],
+            'other_config': ['map', [['bfd_enabled', 'true']]],
+            'switch_fault_status': ['set', []]}},
+        'Physical_Port': ports,
+        'Ucast_Macs_Local': dict(
+            (_uuid(8, index), _mac_row(index, args))
+            for index in range(args.macs // 2)),
+        'Ucast_Macs_Remote': dict(
+            (_uuid(9, index), _mac_row(index + args.macs, args))
+            for index in range(args.macs - args.macs // 2)),
+        'Physical_Locator': dict(
+            (_uuid(5, vtep), {'encapsulation_type': 'vxlan_over_ipv4',
+                              'dst_ip': '198.51.100.%d' % (vtep + 1),
+                              'tunnel_key': ['set', []]})
+            for vtep in range(args.vteps)),
+        'Mcast_Macs_Local': dict(
+            (_uuid(10, vlan), {'MAC': 'unknown-dst',
+                               'ipaddr': '',
+                               'logical_switch': _ref(1, vlan),
+                               'locator_set': _ref(6, vlan % args.vteps)})
+            for vlan in vlans),
+        'Physical_Locator_Set': dict(
+            (_uuid(6, vtep), {'locators': _ref(5, vtep)})
+            for vtep in range(args.vteps))}
+
+
+def _project(table_name, row, projected):
+    if not projected:
+        return row
+    columns = monitor_cond.MONITORED_COLUMNS[table_name]
+    return dict((column_name, value) for column_name, value in row.items()
+                if column_name in columns)
+
+
+def monitor_reply(database, projected):
+    """Returns the reply to the monitor request, as sent by the server."""
+    return {'id': 'op', 'error': None, 'result': dict(
+        (table_name, dict(
+            (uuid, {'new': _project(table_name, row, projected)})
+            for uuid, row in rows.items()))
+        for table_name, rows in database.items())}
+
+
+def monitor_cond_reply(database, projected):
+    """Returns the reply to the monitor_cond request."""
+    result = {}
+    for table_name, rows in database.items():
+        column_types = schema.columns(table_name)
+        result[table_name] = {}
+        for uuid, row in rows.items():
+            row = _project(table_name, row, projected)
+            result[table_name][uuid] = {'initial': dict(
+                (column_name, value) for column_name, value in row.items()
+                if value != column_types[column_name].default())}
+    return {'id': 'op', 'error': None, 'result': result}
+
+
+def measure(reply, repeat):
+    data = json.dumps(reply)
+    start = time.time()
+    for _i in range(repeat):
+        json.loads(data)
+    return len(data), (time.time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ports', type=int, default=48,
+                        help='Number of physical ports of the switch')
+    parser.add_argument('--vlans', type=int, default=100,
+                        help='Number of logical switches, each bound to '
+                        'every port')
+    parser.add_argument('--vteps', type=int, default=32,
+                        help='Number of remote tunnel endpoints')
+    parser.add_argument('--macs', type=int, default=20000,
+                        help='Number of local and remote unicast MACs')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of times each reply is decoded')
+    args = parser.parse_args()
+    database = sample_database(args)
+    for method, build in (('monitor', monitor_reply),
+                          ('monitor_cond', monitor_cond_reply)):
+        size, decode = measure(build(database, False), args.repeat)
+        projected_size, projected_decode = measure(build(database, True),
+                                                   args.repeat)
+        print('%-13s all columns %9.1f KB  decoded in %7.1f ms' % (
+            method, size / KB, decode * 1000))
+        print('%-13s projected   %9.1f KB  decoded in %7.1f ms  '
+              '(%.1f%% smaller)' % ('', projected_size / KB,
+                                    projected_decode * 1000,
+                                    100.0 * (size - projected_size) / size))
+    print('Per table, monitor format:')
+    for table_name in monitor_cond.MONITORED_TABLES:
+        table = {table_name: database[table_name]}
+        size = len(json.dumps(monitor_reply(table, False)))
+        projected_size = len(json.dumps(monitor_reply(table, True)))
+        print('  %-21s %9.1f KB -> %9.1f KB' % (
+            table_name, size / KB, projected_size / KB))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the decoding of the rows of an initial dump by the monitor.
+
+A dump of the monitored tables of a hardware_vtep database, such as the
+one of a chassis holding several switches, is generated with the columns
+the agent requests and processed by OVSDBMonitor._process_tables as the
+reply to the monitor request. The number of rows processed per second is
+reported for the whole dump and for each table. The tables are processed
+in the order of the reply, which the OVSDB server chooses: by name, the
+ports before the switches, or with the switches first:
+
+    python tools/ovsdb_decode_benchmark.py --switches 40 --ports 48 \\
+        --vlans 100 --macs 50000 --switches-first
+"""
+
+import argparse
+import collections
+import time
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_monitor
+
+
+def _uuid(kind, index):
+    return '%08x-0000-4000-8000-%012x' % (kind, index)
+
+
+def _ref(kind, index):
+    return ['uuid', _uuid(kind, index)]
+
+
+def _set(atoms):
+    # A set of one element is sent as the element.
+    return atoms[0] if len(atoms) == 1 else ['set', atoms]
+
+
+def _mac_row(index, args):
+    return {'MAC': '00:00:%02x:%02x:%02x:%02x' % ((index >> 24) & 0xff,
+                                                  (index >> 16) & 0xff,
+                                                  (index >> 8) & 0xff,
+                                                  index & 0xff),
+            'ipaddr': '',
+            'logical_switch': _ref(1, index % args.vlans),
+            'locator': _ref(5, index % args.vteps)}
+
+
+def sample_dump(args):
+    """Returns the table updates of the initial dump, by table name."""
+    vlans = range(args.vlans)
+    return {
+        'Logical_Switch': dict(
+            (_uuid(1, vlan), {'new': {'name': 'net-%d' % vlan,
+                                      'description': '',
+                                      'tunnel_key': 5000 + vlan}})
+            for vlan in vlans),
+        'Physical_Switch': dict(
+            (_uuid(2, switch), {'new': {
+                'name': 'tor-%d' % switch,
+                'ports': _set([_ref(3, switch * args.ports + port)
+                               for port in range(args.ports)]),
+                'tunnel_ips': '198.51.100.1',
+                'switch_fault_status': ['set', []]}})
+            for switch in range(args.switches)),
+        'Physical_Port': dict(
+            (_uuid(3, port), {'new': {
+                'name': 'Ethernet%d' % port,
+                'vlan_bindings': ['map', [[vlan + 1, _ref(1, vlan)]
+                                          for vlan in vlans]],
+                'port_fault_status': ['set', []]}})
+            for port in range(args.switches * args.ports)),
+        'Ucast_Macs_Local': dict(
+            (_uuid(8, index), {'new': _mac_row(index, args)})
+            for index in range(args.macs // 2)),
+        'Ucast_Macs_Remote': dict(
+            (_uuid(9, index), {'new': _mac_row(index + args.macs, args)})
+            for index in range(args.macs - args.macs // 2)),
+        'Physical_Locator': dict(
+            (_uuid(5, vtep), {'new': {'dst_ip': '198.51.100.%d' % (
+                vtep + 2)}})
+            for vtep in range(args.vteps)),
+        'Mcast_Macs_Local': dict(
+            (_uuid(10, vlan), {'new': {
+                'MAC': 'unknown-dst', 'ipaddr': '',
+                'logical_switch': _ref(1, vlan),
+                'locator_set': _ref(6, vlan % args.vteps)}})
+            for vlan in vlans),
+        'Physical_Locator_Set': dict(
+            (_uuid(6, vtep), {'new': {'locators': _ref(5, vtep)}})
+            for vtep in range(args.vteps))}
+
+
+def measure(monitor, table_updates, repeat):
+    """Returns the number of rows processed per second."""
+    rows = sum(len(row_updates) for row_updates in table_updates.values())
+    best = None
+    for _i in range(repeat):
+        data_dict = monitor._initialize_data_dict()
+        start = time.time()
+        monitor._process_tables(table_updates, data_dict)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return rows, rows / best if best else float('inf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--switches', type=int, default=1,
+                        help='Number of physical switches')
+    parser.add_argument('--ports', type=int, default=48,
+                        help='Number of physical ports of each switch')
+    parser.add_argument('--vlans', type=int, default=100,
+                        help='Number of logical switches, each bound to '
+                        'every port')
+    parser.add_argument('--vteps', type=int, default=32,
+                        help='Number of remote tunnel endpoints')
+    parser.add_argument('--macs', type=int, default=50000,
+                        help='Number of local and remote unicast MACs')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of times the dump is processed, the '
+                        'best time is reported')
+    parser.add_argument('--switches-first', action='store_true',
+                        help='Process the switches before the other tables')
+    args = parser.parse_args()
+    # Only the processing of the rows is measured, no OVSDB server is
+    # connected to.
+    monitor = ovsdb_monitor.OVSDBMonitor.__new__(ovsdb_monitor.OVSDBMonitor)
+    monitor._setup_dispatch_table()
+    tables = sample_dump(args)
+    table_names = sorted(tables)
+    if args.switches_first:
+        table_names.remove('Physical_Switch')
+        table_names.insert(0, 'Physical_Switch')
+    dump = collections.OrderedDict((table_name, tables[table_name])
+                                   for table_name in table_names)
+    rows, rate = measure(monitor, dump, args.repeat)
+    print('%-21s %7d rows %10.0f rows/s' % ('All tables', rows, rate))
+    for table_name in table_names:
+        rows, rate = measure(monitor, {table_name: dump[table_name]},
+                             args.repeat)
+        print('%-21s %7d rows %10.0f rows/s' % (table_name, rows, rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compares the eventlet and asyncio OVSDB engines.
+
+A fake OVSDB server, running in a separate process, answers every
+request at once and, when a monitor request is received, streams update
+notifications, one Logical_Switch row each, as fast as it can. For each
+engine a session to the server is opened in the monkey patched process,
+as the agent does, and is measured for:
+
+  * the updates processed per second, from the monitor request until the
+    last update was handed to the callback, while transactions are sent
+    on the same session;
+  * the latency of those transactions, under the update stream;
+  * the latency of transactions sent one after the other on an otherwise
+    idle session.
+
+    python tools/ovsdb_engine_benchmark.py --updates 50000 \\
+        --transactions 5000
+"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import socket
+import threading
+import time
+
+import eventlet
+from eventlet import event
+from oslo_config import cfg
+
+from networking_l2gw.services.l2gateway.agent import l2gateway_config
+from networking_l2gw.services.l2gateway.agent.ovsdb import asyncio_engine
+from networking_l2gw.services.l2gateway.agent.ovsdb import framer
+from networking_l2gw.services.l2gateway.agent.ovsdb import (
+    ovsdb_common_class)
+from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_monitor
+from networking_l2gw.services.l2gateway.common import config
+from networking_l2gw.services.l2gateway.common import constants as n_const
+
+# Updates sent by the fake server at once.
+UPDATE_BATCH = 100
+
+
+def _update(index):
+    return json.dumps({
+        'method': 'update', 'id': None,
+        'params': [None, {'Logical_Switch': {
+            'ls-%d' % index: {'new': {'name': 'ls%d' % index,
+                                      'tunnel_key': index,
+                                      'description': ''}}}}]})
+
+
+def _stream_updates(sock, lock, updates):
+    for start in range(0, updates, UPDATE_BATCH):
+        data = ''.join(_update(index) for index in
+                       range(start, min(start + UPDATE_BATCH, updates)))
+        with lock:
+            sock.sendall(data.encode('utf-8'))
+
+
+def _serve_connection(sock, updates):
+    lock = threading.Lock()
+    msg_framer = framer.MessageFramer()
+    while True:
+        messages = msg_framer.recv(sock)
+        if messages is None:
+            break
+        for message in messages:
+            if message.get('id') is None or message.get('result', 0) != 0:
+                # Notifications and replies to the echo requests.
+                continue
+            result = [{'rows': []}]
+            error = None
+            if message.get('method') == 'echo':
+                result = message.get('params')
+            elif message.get('method') == 'monitor':
+                result = {}
+            elif message.get('method') in ('monitor_cond',
+                                           'monitor_cond_since'):
+                # The updates are streamed to unconditional monitors.
+                result, error = None, 'unknown method'
+            with lock:
+                sock.sendall(json.dumps({'id': message['id'], 'error': error,
+                                         'result': result}).encode('utf-8'))
+            if message.get('method') == 'monitor':
+                thread = threading.Thread(target=_stream_updates,
+                                          args=(sock, lock, updates))
+                thread.daemon = True
+                thread.start()
+    sock.close()
+
+
+def serve(listener, updates):
+    """Answers the requests received on the listening socket."""
+    while True:
+        sock, _addr = listener.accept()
+        thread = threading.Thread(target=_serve_connection,
+                                  args=(sock, updates))
+        thread.daemon = True
+        thread.start()
+
+
+def _transact(session):
+    op_id = str(random.getrandbits(128))
+    query = {'method': 'transact',
+             'params': [n_const.OVSDB_SCHEMA_NAME,
+                        {'op': 'select', 'table': 'Physical_Switch',
+                         'where': []}],
+             'id': op_id}
+    start = time.time()
+    session._send_and_receive(query, op_id, None, True)
+    return time.time() - start
+
+
+def _summary(latencies):
+    latencies = sorted(latencies)
+    return (sum(latencies) / len(latencies), latencies[len(latencies) // 2],
+            latencies[int(len(latencies) * 0.99)])
+
+
+def run(session_class, port, updates, transactions):
+    gw_config = l2gateway_config.L2GatewayConfig(
+        {n_const.OVSDB_IDENTIFIER: 'ovsdb1', 'ovsdb_ip': '127.0.0.1',
+         'ovsdb_port': port})
+    received = [0]
+    done = event.Event()
+
+    def callback(activity, data):
+        if activity != ovsdb_monitor.Activity.Update:
+            return
+        received[0] += 1
+        if received[0] == updates:
+            done.send(time.time())
+
+    session = session_class(cfg.CONF.ovsdb, gw_config, callback,
+                            connect_retries=0)
+    loaded_latencies = []
+
+    def write_under_load():
+        loaded_latencies.append(_transact(session))
+        while not done.ready():
+            loaded_latencies.append(_transact(session))
+
+    start = time.time()
+    session.set_monitor_response_handler()
+    writer = eventlet.spawn(write_under_load)
+    end = done.wait()
+    writer.wait()
+    idle_latencies = [_transact(session) for _i in range(transactions)]
+    session.disconnect()
+    # Lets the greenthreads of the session see the socket closed.
+    eventlet.sleep(0.1)
+    return (updates / (end - start), _summary(loaded_latencies),
+            _summary(idle_latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=20000,
+                        help='Number of updates streamed per engine')
+    parser.add_argument('--transactions', type=int, default=2000,
+                        help='Number of transactions sent per engine on '
+                        'the idle session')
+    args = parser.parse_args()
+    config.register_ovsdb_opts_helper(cfg.CONF)
+    cfg.CONF([], project='networking-l2gw')
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(5)
+    # The server is started before the process is monkey patched.
+    server = multiprocessing.Process(target=serve,
+                                     args=(listener, args.updates))
+    server.daemon = True
+    server.start()
+    eventlet.monkey_patch()
+    port = listener.getsockname()[1]
+    engines = [('eventlet', ovsdb_common_class.OVSDB_commom_class)]
+    if asyncio_engine.is_supported():
+        engines.append(('asyncio', asyncio_engine.AsyncioOVSDBSession))
+    for name, session_class in engines:
+        # Warms up the connection and the code paths.
+        run(session_class, port, 1000, 100)
+        rate, loaded, idle = run(session_class, port, args.updates,
+                                 args.transactions)
+        print('%-8s %8.0f updates/s' % (name, rate))
+        for label, (mean, median, p99) in (('loaded', loaded),
+                                           ('idle', idle)):
+            print('         %-6s write mean: %7.1f us  median: %7.1f us  '
+                  'p99: %7.1f us' % (label, mean * 1e6, median * 1e6,
+                                     p99 * 1e6))
+    server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the receive path of the OVSDB agent.
+
+Ucast_Macs_Remote rows, either as a monitor reply shaped like the initial
+dump of a large switch or as a stream of update notifications, are sent
+over a socket pair and read back by the message framer, either with
+recv() of a fixed size ("recv", how the agent used to read) or with
+recv_into() a reusable buffer ("recv_into"). For each mode the number of
+receive calls and the bytes of temporary memory allocated while
+receiving, which excludes the returned messages, are reported per
+megabyte of received data. The throughput is measured in a separate run
+without tracing.
+
+Memory allocations are measured with tracemalloc, which needs Python 3.9
+or later:
+
+    python tools/ovsdb_recv_benchmark.py --scenario updates
+"""
+
+import argparse
+import json
+import multiprocessing
+import socket
+import time
+import tracemalloc
+
+from networking_l2gw.services.l2gateway.agent.ovsdb import framer
+
+MB = 1024 * 1024
+
+
+def _mac_row(i):
+    return {'MAC': '00:00:%02x:%02x:%02x:%02x' % (
+            (i >> 24) & 0xff, (i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff),
+            'ipaddr': '',
+            'logical_switch': ['uuid',
+                               '6b1cbf4d-6a6a-4c0e-9d4c-3e6d6f9b1a%02x' % (
+                                   i % 256)],
+            'locator': ['uuid',
+                        '0d3c5b1a-2f4e-4a6b-8c7d-9e0f1a2b3c%02x' % (
+                            i % 256)]}
+
+
+def _mac_uuid(i):
+    return '%08x-0000-4000-8000-%012x' % (i, i)
+
+
+def build_dump(rows):
+    """One monitor reply holding all the rows."""
+    macs = dict((_mac_uuid(i), {'new': _mac_row(i)}) for i in range(rows))
+    message = {'id': 'monitor', 'error': None,
+               'result': {'Ucast_Macs_Remote': macs}}
+    return json.dumps(message).encode('utf-8'), 1
+
+
+def build_updates(rows):
+    """One update notification per row."""
+    messages = [json.dumps({'id': None, 'method': 'update',
+                            'params': [None, {'Ucast_Macs_Remote': {
+                                _mac_uuid(i): {'new': _mac_row(i)}}}]})
+                for i in range(rows)]
+    return ''.join(messages).encode('utf-8'), rows
+
+
+class CountingSocket(object):
+    def __init__(self, sock):
+        self.sock = sock
+        self.calls = 0
+
+    def recv(self, size):
+        self.calls += 1
+        return self.sock.recv(size)
+
+    def recv_into(self, buffer):
+        self.calls += 1
+        return self.sock.recv_into(buffer)
+
+
+def run(mode, data, count, recv_size, buffer_size, trace):
+    sender, receiver = socket.socketpair()
+    # The data is sent from another process, so that the sender does not
+    # compete with the receiver for the GIL.
+    process = multiprocessing.Process(target=sender.sendall, args=(data,))
+    sock = CountingSocket(receiver)
+    msg_framer = framer.MessageFramer(buffer_size=buffer_size)
+    received = 0
+    allocated = 0
+    if trace:
+        tracemalloc.start()
+    start = time.time()
+    process.start()
+    sender.close()
+    while received < count:
+        if trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        if mode == 'recv':
+            messages = msg_framer.feed(sock.recv(recv_size))
+        else:
+            messages = msg_framer.recv(sock)
+        if trace:
+            # Memory still in use after the call holds the messages.
+            current, peak = tracemalloc.get_traced_memory()
+            allocated += peak - max(before, current)
+        received += len(messages)
+    elapsed = time.time() - start
+    if trace:
+        tracemalloc.stop()
+    process.join()
+    receiver.close()
+    return sock.calls, allocated, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000,
+                        help='Number of Ucast_Macs_Remote rows sent')
+    parser.add_argument('--scenario', choices=['dump', 'updates'],
+                        default='dump',
+                        help='Send the rows as one initial dump or as one '
+                             'update notification per row')
+    parser.add_argument('--recv-size', type=int, default=4096,
+                        help='Size of each recv() call in "recv" mode')
+    parser.add_argument('--buffer-size', type=int,
+                        default=framer.BUFFER_SIZE,
+                        help='Initial size of the buffer in "recv_into" mode')
+    parser.add_argument('--mode', choices=['recv', 'recv_into', 'both'],
+                        default='both')
+    args = parser.parse_args()
+    if args.scenario == 'dump':
+        data, count = build_dump(args.rows)
+    else:
+        data, count = build_updates(args.rows)
+    size = float(len(data)) / MB
+    print('%s: %d messages, %.1f MB' % (args.scenario, count, size))
+    modes = ['recv', 'recv_into'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        calls, allocated, _elapsed = run(mode, data, count, args.recv_size,
+                                         args.buffer_size, True)
+        _calls, _allocated, elapsed = run(mode, data, count, args.recv_size,
+                                          args.buffer_size, False)
+        print('%-9s calls/MB: %7.1f  temporary bytes/MB: %11.0f  '
+              'throughput: %6.1f MB/s' % (mode, calls / size,
+                                          allocated / size, size / elapsed))
+
+
+if __name__ == '__main__':
+    main()
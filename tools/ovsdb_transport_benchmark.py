@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# Copyright (c) 2017 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compares the transaction latency over unix sockets and TCP loopback.
+
+A fake OVSDB server, running in a separate process, listens on a unix
+socket and on a TCP port of the loopback interface and answers every
+request at once. For each transport an OVSDBWriter connects to it and
+sends transactions one after the other, each waiting for its reply, as
+the agent does with the default transact_window. The mean, median and
+99th percentile latencies are reported:
+
+    python tools/ovsdb_transport_benchmark.py --transactions 20000
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+from oslo_config import cfg
+
+from networking_l2gw.services.l2gateway.agent import l2gateway_config
+from networking_l2gw.services.l2gateway.agent.ovsdb import framer
+from networking_l2gw.services.l2gateway.agent.ovsdb import ovsdb_writer
+from networking_l2gw.services.l2gateway.common import config
+from networking_l2gw.services.l2gateway.common import constants as n_const
+
+
+def _serve_connection(sock):
+    msg_framer = framer.MessageFramer()
+    while True:
+        messages = msg_framer.recv(sock)
+        if messages is None:
+            break
+        replies = [json.dumps({'id': message['id'], 'error': None,
+                               'result': [{'rows': []}]})
+                   for message in messages if message.get('id') is not None]
+        sock.sendall(''.join(replies).encode('utf-8'))
+    sock.close()
+
+
+def _serve(listener):
+    while True:
+        sock, _addr = listener.accept()
+        thread = threading.Thread(target=_serve_connection, args=(sock,))
+        thread.daemon = True
+        thread.start()
+
+
+def serve(listeners):
+    """Answers the requests received on the listening sockets."""
+    for listener in listeners:
+        thread = threading.Thread(target=_serve, args=(listener,))
+        thread.daemon = True
+        thread.start()
+    threading.Event().wait()
+
+
+def run(ovsdb_ip, ovsdb_port, transactions):
+    gw_config = l2gateway_config.L2GatewayConfig(
+        {n_const.OVSDB_IDENTIFIER: 'ovsdb1', 'ovsdb_ip': ovsdb_ip,
+         'ovsdb_port': ovsdb_port})
+    writer = ovsdb_writer.OVSDBWriter(cfg.CONF.ovsdb, gw_config)
+    latencies = []
+    for _i in range(transactions):
+        op_id = str(random.getrandbits(128))
+        query = {'method': 'transact',
+                 'params': [n_const.OVSDB_SCHEMA_NAME,
+                            {'op': 'select', 'table': 'Physical_Switch',
+                             'where': []}],
+                 'id': op_id}
+        start = time.time()
+        writer._send_and_receive(query, op_id, None, True)
+        latencies.append(time.time() - start)
+    writer.disconnect()
+    latencies.sort()
+    return (sum(latencies) / len(latencies),
+            latencies[len(latencies) // 2],
+            latencies[int(len(latencies) * 0.99)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=10000,
+                        help='Number of transactions sent per transport')
+    args = parser.parse_args()
+    config.register_ovsdb_opts_helper(cfg.CONF)
+    cfg.CONF([], project='networking-l2gw')
+    path = tempfile.mkdtemp()
+    try:
+        unix_path = os.path.join(path, 'db.sock')
+        unix_listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        unix_listener.bind(unix_path)
+        unix_listener.listen(5)
+        tcp_listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        tcp_listener.bind(('127.0.0.1', 0))
+        tcp_listener.listen(5)
+        server = multiprocessing.Process(
+            target=serve, args=([unix_listener, tcp_listener],))
+        server.daemon = True
+        server.start()
+        targets = [('unix', l2gateway_config.UNIX_SOCKET_PREFIX + unix_path,
+                    None),
+                   ('tcp', '127.0.0.1', tcp_listener.getsockname()[1])]
+        for name, ovsdb_ip, ovsdb_port in targets:
+            # Warms up the connection and the code paths.
+            run(ovsdb_ip, ovsdb_port, 100)
+            mean, median, p99 = run(ovsdb_ip, ovsdb_port,
+                                    args.transactions)
+            print('%-4s mean: %6.1f us  median: %6.1f us  p99: %6.1f us  '
+                  '%8.0f transactions/s' % (name, mean * 1e6, median * 1e6,
+                                            p99 * 1e6, 1 / mean))
+        server.terminate()
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()